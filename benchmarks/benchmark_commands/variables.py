@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+
+"""corollary commands for benchmarks.
+
+Besides the commands defined here, the module provides the LEMMA commands, so
+that benchmark formulas can use both.
+"""
+
+from commands.lemma import *
+from corollary import Command, Variable
+
+class DefineVariables(Command):
+    """define_variables: Define many variables at once.
+
+    The command lets benchmarks stress the variable stacks of corollary.
+    """
+
+    VARIABLE_COUNT = 100
+
+    def name(self):
+        """Command name."""
+
+        return 'define_variables'
+
+    def provided_variables(self):
+        """Provided variables."""
+
+        return [Variable('var%d' % i) for i in range(self.VARIABLE_COUNT)]
+
+    def execute(self, values):
+        """Execution logic."""
+
+        return {'var%d' % i: 'value%d' % i for i in range(self.VARIABLE_COUNT)}
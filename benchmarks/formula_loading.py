@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+
+"""Benchmark for loading formulas with corollary's YAML line loaders.
+
+The benchmark generates formulas of the given sizes and measures the time it
+takes the pure-Python and the libyaml-based loaders to load them. It also
+checks that both loaders yield the same entries.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import yaml
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+import corollary
+
+def generate_formula(lineCount):
+    """Generate a formula with approximately the given number of lines."""
+
+    lines = ['- ask_for_version']
+    groupIndex = 0
+    while len(lines) < lineCount:
+        lines.append('- group "Group %d":' % groupIndex)
+        for moduleIndex in range(100):
+            lines.append('  - module group%d.module%d:' % (groupIndex,
+                moduleIndex))
+            lines.append('    - mvn_tycho_set_version')
+            lines.append('    - update_properties_file "gradle.properties" ' \
+                '"version" version')
+        groupIndex += 1
+    return '\n'.join(lines) + '\n'
+
+def time_loader(formulaFile, loader):
+    """Load the given formula file with the loader and measure the time."""
+
+    start = time.perf_counter()
+    with open(formulaFile, 'r') as fd:
+        entries = yaml.load(fd, Loader=loader)
+    return (time.perf_counter() - start, entries)
+
+if __name__ == '__main__':
+    argumentParser = argparse.ArgumentParser(description='Benchmark for ' \
+        'loading formulas')
+    argumentParser.add_argument('sizes', nargs='*', type=int,
+        default=[10000, 100000, 1000000], help='Formula sizes in lines')
+    arguments = argumentParser.parse_args()
+
+    loaders = [('pure-Python', corollary.YamlLineLoader)]
+    if corollary._YAML_LINE_LOADER is not corollary.YamlLineLoader:
+        loaders.append(('libyaml', corollary._YAML_LINE_LOADER))
+    else:
+        print('PyYAML lacks libyaml bindings. Only benchmarking the ' \
+            'pure-Python loader.')
+
+    print('%10s  %s' % ('lines', '  '.join('%12s' % n for n, _ in loaders)))
+    for size in arguments.sizes:
+        fd, formulaFile = tempfile.mkstemp(suffix='.yaml')
+        try:
+            with os.fdopen(fd, 'w') as formulaFd:
+                formulaFd.write(generate_formula(size))
+
+            results = [time_loader(formulaFile, l) for _, l in loaders]
+        finally:
+            os.remove(formulaFile)
+
+        if any(entries != results[0][1] for _, entries in results):
+            print('Loaders yield different entries for %d lines.' % size)
+            sys.exit(1)
+        print('%10d  %s' % (size, '  '.join('%11.2fs' % t
+            for t, _ in results)))
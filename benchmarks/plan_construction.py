@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+
+"""Benchmark for the construction of execution plans.
+
+The benchmark generates formulas with the given numbers of modules and
+measures the time it takes to parse them into execution plans and to compile
+the plans, which includes validating their scoping. Both should grow linearly
+with the number of modules.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+import corollary
+
+def generate_formula(moduleCount, modulesPerGroup=100):
+    """Generate a formula with the given number of modules."""
+
+    lines = ['- read_version_from "version.properties"']
+    for moduleIndex in range(moduleCount):
+        if moduleIndex % modulesPerGroup == 0:
+            lines.append('- group "Group %d":' % \
+                (moduleIndex // modulesPerGroup))
+        lines.append('  - module module%d:' % moduleIndex)
+        lines.append('    - mvn_tycho_set_version')
+    return '\n'.join(lines) + '\n'
+
+def time_plan_construction(commands, formulaFile):
+    """Parse and compile the given formula and measure the times."""
+
+    formula = corollary.Formula(formulaFile, commands)
+    formula.get_unpacked_entries()
+    plan = corollary.ExecutionPlan(commands, formula, None, build=False)
+
+    start = time.perf_counter()
+    parsedLines = plan.parse()
+    parsed = time.perf_counter()
+    plan.compile(parsedLines)
+    compiled = time.perf_counter()
+    return (parsed - start, compiled - parsed)
+
+if __name__ == '__main__':
+    argumentParser = argparse.ArgumentParser(description='Benchmark for ' \
+        'the construction of execution plans')
+    argumentParser.add_argument('-c', '--command_directory',
+        dest='commandDirectory', default='commands', help='Directory of ' \
+            'available commands')
+    argumentParser.add_argument('moduleCounts', nargs='*', type=int,
+        default=[10000, 20000, 40000], help='Numbers of modules')
+    arguments = argumentParser.parse_args()
+
+    commands = corollary.Commands(arguments.commandDirectory)
+    print('%10s  %10s  %10s  %14s' % ('modules', 'parse', 'compile',
+        'per module'))
+    for moduleCount in arguments.moduleCounts:
+        fd, formulaFile = tempfile.mkstemp(suffix='.yaml')
+        try:
+            with os.fdopen(fd, 'w') as formulaFd:
+                formulaFd.write(generate_formula(moduleCount))
+            parseTime, compilationTime = time_plan_construction(commands,
+                formulaFile)
+        finally:
+            os.remove(formulaFile)
+
+        print('%10d  %9.2fs  %9.2fs  %12.1fus' % (moduleCount, parseTime,
+            compilationTime, (parseTime + compilationTime) / moduleCount * 1e6))
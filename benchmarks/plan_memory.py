@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+
+"""Benchmark for the memory consumption of execution plans.
+
+The benchmark generates formulas with the given numbers of lines and measures
+the memory that is allocated, by means of tracemalloc, to load them, to parse
+them into execution plans, and to compile the plans into programs. For each
+phase, it reports the memory that the phase's result retains and the peak
+memory during the phase.
+"""
+
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+import corollary
+
+def generate_formula(lineCount, modulesPerGroup=100):
+    """Generate a formula with the given number of lines."""
+
+    lines = ['- read_version_from "version.properties"']
+    moduleIndex = 0
+    while len(lines) < lineCount:
+        if moduleIndex % modulesPerGroup == 0:
+            lines.append('- group "Group %d":' % \
+                (moduleIndex // modulesPerGroup))
+        lines.append('  - module module%d:' % moduleIndex)
+        lines.append('    - mvn_tycho_set_version')
+        lines.append('    - update_properties_file "gradle.properties" ' \
+            '"version" version')
+        moduleIndex += 1
+    return '\n'.join(lines) + '\n'
+
+def measure(function):
+    """Invoke a function and measure its memory consumption.
+
+    Returns the function's result, the memory it retains, the peak memory
+    during the invocation, and the invocation's duration.
+    """
+
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = function()
+        duration = time.perf_counter() - start
+        gc.collect()
+        retained, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return (result, retained, peak, duration)
+
+def measure_plan(commands, formulaFile):
+    """Load, parse, and compile the given formula and measure the memory.
+
+    Returns a list of (phase, retained memory, peak memory, duration) tuples.
+    """
+
+    formula = corollary.Formula(formulaFile, commands)
+    _, loadRetained, loadPeak, loadTime = measure(
+        formula.get_unpacked_entries)
+    plan = corollary.ExecutionPlan(commands, formula, None, build=False)
+
+    parsedLines, parseRetained, parsePeak, parseTime = measure(plan.parse)
+    _, compileRetained, compilePeak, compileTime = measure(
+        lambda: plan.compile(parsedLines))
+    return [('load', loadRetained, loadPeak, loadTime),
+        ('parse', parseRetained, parsePeak, parseTime),
+        ('compile', compileRetained, compilePeak, compileTime)]
+
+if __name__ == '__main__':
+    argumentParser = argparse.ArgumentParser(description='Benchmark for ' \
+        'the memory consumption of execution plans')
+    argumentParser.add_argument('-c', '--command_directory',
+        dest='commandDirectory', default='commands', help='Directory of ' \
+            'available commands')
+    argumentParser.add_argument('lineCounts', nargs='*', type=int,
+        default=[1000000], help='Numbers of formula lines')
+    arguments = argumentParser.parse_args()
+
+    commands = corollary.Commands(arguments.commandDirectory)
+    print('%10s  %8s  %12s  %12s  %10s  %14s' % ('lines', 'phase',
+        'retained', 'peak', 'time', 'retained/line'))
+    for lineCount in arguments.lineCounts:
+        fd, formulaFile = tempfile.mkstemp(suffix='.yaml')
+        try:
+            with os.fdopen(fd, 'w') as formulaFd:
+                formulaFd.write(generate_formula(lineCount))
+            results = measure_plan(commands, formulaFile)
+        finally:
+            os.remove(formulaFile)
+
+        for phase, retained, peak, duration in results:
+            print('%10d  %8s  %10.1fMiB  %10.1fMiB  %9.2fs  %12.1fB' % \
+                (lineCount, phase, retained / 2**20, peak / 2**20, duration,
+                retained / lineCount))
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+
+"""Benchmark suite for loading, parsing, validating, and executing formulas.
+
+The suite generates synthetic formulas with the given numbers of groups and
+modules per group, as well as matching target directories. Each module block
+defines variables (cf. benchmark_commands/variables.py) and applies the LEMMA
+commands that directly manipulate files, so that no Maven installation is
+required. The suite measures the time it takes to
+
+  - load a formula (class Formula),
+  - parse it into an execution plan (ExecutionPlan.parse()),
+  - validate its scoping while compiling the plan (ExecutionPlan.compile()),
+  - execute the plan on the target directory.
+
+The results can be stored as a baseline and compared against a stored
+baseline. Moreover, the suite reports phases whose time per module grows with
+the size of the formula, which hints at non-linear scaling.
+"""
+
+import argparse
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+import corollary
+
+_COMMAND_DIRECTORY = 'benchmarks.benchmark_commands'
+
+_PHASES = ['load', 'parse', 'validate', 'execute']
+
+_POM = '''<?xml version="1.0" encoding="UTF-8"?>
+<project xmlns="http://maven.apache.org/POM/4.0.0">
+  <modelVersion>4.0.0</modelVersion>
+  <parent>
+    <groupId>org.example</groupId>
+    <artifactId>parent</artifactId>
+    <version>0.1.0</version>
+  </parent>
+  <groupId>org.example.%(group)s</groupId>
+  <artifactId>%(module)s</artifactId>
+  <version>0.1.0</version>
+  <packaging>jar</packaging>
+</project>
+'''
+
+_MANIFEST = '''Manifest-Version: 1.0
+Bundle-ManifestVersion: 2
+Bundle-SymbolicName: org.example.%(group)s.%(module)s
+Bundle-Version: 0.1.0
+'''
+
+_GRADLE_PROPERTIES = '''# Generated by the corollary benchmark suite
+
+version = 0.1.0
+group = org.example.%(group)s
+description = Module %(module)s
+'''
+
+def module_path(groupIndex, moduleIndex):
+    """Path of a module relative to the target directory."""
+
+    return 'group%d/module%d' % (groupIndex, moduleIndex)
+
+def generate_formula(groupCount, modulesPerGroup):
+    """Generate a formula with the given numbers of groups and modules.
+
+    Variables are defined on each scope, i.e., globally, per group, and per
+    module, so that the variables of each module are layered on those of its
+    group and the global scope. Note that corollary does not allow deeper
+    nesting than modules within groups.
+    """
+
+    lines = ['- read_version_from "version.properties"', '- define_variables']
+    for groupIndex in range(groupCount):
+        lines.append('- group "group%d":' % groupIndex)
+        lines.append('  - define_variables')
+        for moduleIndex in range(modulesPerGroup):
+            lines.append('  - module %s:' % module_path(groupIndex,
+                moduleIndex))
+            lines.append('    - define_variables')
+            lines.append('    - mvn_update_parent_version_raw')
+            lines.append('    - mvn_tycho_set_version_raw')
+            lines.append('    - osgi_update_bundle_version')
+            lines.append('    - update_properties_file "gradle.properties" ' \
+                '"version" version')
+            lines.append('    - update_properties_file_bulk ' \
+                '"gradle.properties" "group=var0,description=var1"')
+    return '\n'.join(lines) + '\n'
+
+def generate_target_tree(targetDirectory, groupCount, modulesPerGroup):
+    """Generate a target directory that matches a generated formula."""
+
+    with open(os.path.join(targetDirectory, 'version.properties'), 'w') as fd:
+        fd.write('major=1\nminor=2\npatch=3\n')
+
+    for groupIndex in range(groupCount):
+        for moduleIndex in range(modulesPerGroup):
+            moduleDirectory = os.path.join(targetDirectory,
+                module_path(groupIndex, moduleIndex))
+            os.makedirs(os.path.join(moduleDirectory, 'META-INF'))
+            values = {'group': 'group%d' % groupIndex,
+                'module': 'module%d' % moduleIndex}
+            for filepath, template in [('pom.xml', _POM),
+                (os.path.join('META-INF', 'MANIFEST.MF'), _MANIFEST),
+                ('gradle.properties', _GRADLE_PROPERTIES)]:
+                with open(os.path.join(moduleDirectory, filepath), 'w') as fd:
+                    fd.write(template % values)
+
+def time_phases(commands, formulaFile, targetDirectory):
+    """Load, parse, validate, and execute a formula and measure the times.
+
+    Returns a dict that maps the phases to their times in seconds.
+    """
+
+    times = {}
+    start = time.perf_counter()
+    formula = corollary.Formula(formulaFile, commands)
+    formula.get_unpacked_entries()
+    times['load'] = time.perf_counter() - start
+
+    plan = corollary.ExecutionPlan(commands, formula, None, build=False)
+
+    start = time.perf_counter()
+    parsedLines = plan.parse()
+    times['parse'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    plan.compile(parsedLines)
+    times['validate'] = time.perf_counter() - start
+
+    # The target directory is indexed outside of the measured phases
+    plan = plan.for_target_directory(targetDirectory)
+
+    # Command output is not part of the benchmark
+    stdout = sys.stdout
+    sys.stdout = io.StringIO()
+    start = time.perf_counter()
+    try:
+        plan.execute(workspace=corollary.TransactionalWorkspace())
+    finally:
+        sys.stdout = stdout
+    times['execute'] = time.perf_counter() - start
+    return times
+
+def run_scenario(commands, groupCount, modulesPerGroup, repetitions):
+    """Generate and benchmark a scenario with the given size.
+
+    The scenario is run the given number of times on freshly generated target
+    directories. Returns the best time of each phase.
+    """
+
+    bestTimes = {}
+    workingDirectory = tempfile.mkdtemp(prefix='corollary-benchmark-')
+    try:
+        formulaFile = os.path.join(workingDirectory, 'formula.yaml')
+        with open(formulaFile, 'w') as fd:
+            fd.write(generate_formula(groupCount, modulesPerGroup))
+
+        targetDirectory = os.path.join(workingDirectory, 'target')
+        for _ in range(repetitions):
+            os.mkdir(targetDirectory)
+            generate_target_tree(targetDirectory, groupCount, modulesPerGroup)
+            times = time_phases(commands, formulaFile, targetDirectory)
+            shutil.rmtree(targetDirectory)
+            for phase, phaseTime in times.items():
+                bestTimes[phase] = min(phaseTime, bestTimes.get(phase,
+                    phaseTime))
+    finally:
+        shutil.rmtree(workingDirectory)
+    return bestTimes
+
+def scenario_name(groupCount, modulesPerGroup):
+    """Name of a scenario."""
+
+    return '%dx%d' % (groupCount, modulesPerGroup)
+
+def parse_scenario(value):
+    """Parse a scenario of the form GROUPSxMODULES."""
+
+    groupCount, separator, modulesPerGroup = value.partition('x')
+    try:
+        if separator and int(groupCount) > 0 and int(modulesPerGroup) > 0:
+            return (int(groupCount), int(modulesPerGroup))
+    except ValueError:
+        pass
+    raise argparse.ArgumentTypeError('Scenario "%s" must have the form ' \
+        'GROUPSxMODULES, e.g., 10x50' % value)
+
+def compare_with_baseline(results, baseline, tolerance):
+    """Compare results with a baseline.
+
+    Returns a list of (scenario, phase, time, baseline time) tuples for
+    phases that are slower than the baseline by more than the tolerance.
+    """
+
+    regressions = []
+    for scenario, times in results.items():
+        for phase, phaseTime in times.items():
+            baselineTime = baseline.get(scenario, {}).get(phase)
+            if baselineTime and phaseTime > baselineTime * (1 + tolerance):
+                regressions.append((scenario, phase, phaseTime, baselineTime))
+    return regressions
+
+def find_nonlinear_phases(results, moduleCounts, tolerance):
+    """Find phases whose time per module grows with the number of modules.
+
+    Returns a list of (phase, smallest per-module time, largest per-module
+    time) tuples. Only the scenarios with the fewest and the most modules are
+    compared.
+    """
+
+    if len(results) < 2:
+        return []
+
+    smallest = min(results, key=lambda s: moduleCounts[s])
+    largest = max(results, key=lambda s: moduleCounts[s])
+    nonlinearPhases = []
+    for phase in _PHASES:
+        smallestTime = results[smallest][phase] / moduleCounts[smallest]
+        largestTime = results[largest][phase] / moduleCounts[largest]
+        if largestTime > smallestTime * (1 + tolerance):
+            nonlinearPhases.append((phase, smallestTime, largestTime))
+    return nonlinearPhases
+
+if __name__ == '__main__':
+    argumentParser = argparse.ArgumentParser(description='Benchmark suite ' \
+        'for loading, parsing, validating, and executing formulas')
+    argumentParser.add_argument('scenarios', nargs='*', type=parse_scenario,
+        default=[(10, 10), (20, 50), (40, 100)], metavar='GROUPSxMODULES',
+        help='Numbers of groups and modules per group (default: 10x10 ' \
+            '20x50 40x100)')
+    argumentParser.add_argument('-b', '--baseline', dest='baseline',
+        help='Baseline file to compare the results with')
+    argumentParser.add_argument('-s', '--save_baseline', dest='saveBaseline',
+        help='File to store the results as a baseline')
+    argumentParser.add_argument('-r', '--repetitions', dest='repetitions',
+        type=int, default=3, help='Number of runs per scenario, of which ' \
+            'the best times are reported (default: 3)')
+    argumentParser.add_argument('-t', '--tolerance', dest='tolerance',
+        type=float, default=0.25, help='Tolerated slowdown relative to the ' \
+            'baseline and between per-module times (default: 0.25)')
+    arguments = argumentParser.parse_args()
+
+    os.chdir(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+        os.pardir))
+    commands = corollary.Commands(_COMMAND_DIRECTORY)
+
+    results = {}
+    moduleCounts = {}
+    print('%10s  %10s  %s  %14s' % ('scenario', 'modules',
+        '  '.join('%10s' % p for p in _PHASES), 'per module'))
+    for groupCount, modulesPerGroup in arguments.scenarios:
+        scenario = scenario_name(groupCount, modulesPerGroup)
+        moduleCounts[scenario] = groupCount * modulesPerGroup
+        results[scenario] = run_scenario(commands, groupCount,
+            modulesPerGroup, max(1, arguments.repetitions))
+        print('%10s  %10d  %s  %12.1fus' % (scenario, moduleCounts[scenario],
+            '  '.join('%9.3fs' % results[scenario][p] for p in _PHASES),
+            sum(results[scenario].values()) / moduleCounts[scenario] * 1e6))
+
+    failed = False
+    for phase, smallestTime, largestTime in find_nonlinear_phases(results,
+        moduleCounts, arguments.tolerance):
+        print('Phase "%s" does not scale linearly: %.1fus per module for ' \
+            'the smallest, %.1fus for the largest scenario.' % (phase,
+            smallestTime * 1e6, largestTime * 1e6))
+        failed = True
+
+    if arguments.baseline:
+        with open(arguments.baseline, 'r') as fd:
+            baseline = json.load(fd)
+        for scenario, phase, phaseTime, baselineTime in \
+            compare_with_baseline(results, baseline, arguments.tolerance):
+            print('Phase "%s" of scenario %s regressed: %.3fs (baseline: ' \
+                '%.3fs).' % (phase, scenario, phaseTime, baselineTime))
+            failed = True
+
+    if arguments.saveBaseline:
+        with open(arguments.saveBaseline, 'w') as fd:
+            json.dump(results, fd, indent=2)
+
+    sys.exit(1 if failed else 0)
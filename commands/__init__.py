@@ -1,3 +1,26 @@
 #!/usr/bin/env python3
 
 __all__ = ['lemma']
+
+# Command index that lets corollary load submodules only when a formula uses
+# one of their commands
+__commands__ = {
+    'lemma': [
+        'ask_for_continuation',
+        'ask_for_snapshot',
+        'ask_for_version',
+        'delete_file',
+        'mvn_tycho_set_version',
+        'mvn_tycho_set_version_raw',
+        'mvn_update_parent_version',
+        'mvn_update_parent_version_raw',
+        'osgi_update_bundle_version',
+        'read_version_from',
+        'update_properties_file',
+        'update_properties_file_bulk'
+    ]
+}
+
+# Libraries that the commands import on demand, and which a long-running
+# corollary daemon imports in advance
+__preload__ = ['jproperties', 'lxml.etree']
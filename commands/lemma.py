@@ -4,16 +4,18 @@
 
 from abc import abstractmethod
 from corollary import Argument, Command, CommandScope, Variable
-from fileinput import FileInput
-from jproperties import Properties
-from lxml import etree
 from pathlib import Path
 
+import functools
+import io
 import os
 import re
-import subprocess
+import shutil
 import sys
 
+# The lxml and jproperties libraries are imported by the commands that use them
+# to not slow down the start of corollary for formulas without such commands
+
 class AskForVersion(Command):
     """ask_for_version: Ask user for LEMMA version."""
 
@@ -27,6 +29,11 @@ class AskForVersion(Command):
 
         return [Variable('version')]
 
+    def is_interactive(self):
+        """The user is asked via the standard input."""
+
+        return True
+
     def execute(self, values):
         """Execution logic.
 
@@ -56,6 +63,11 @@ class ReadVersionFrom(Command):
 
         return [Variable('version')]
 
+    def required_files(self, values):
+        """The properties file must exist."""
+
+        return [values['filepath']]
+
     def execute(self, values):
         """Execution logic.
 
@@ -67,9 +79,10 @@ class ReadVersionFrom(Command):
         if not os.path.isabs(filepath):
             filepath = os.path.join(self.get_target_directory(), filepath)
 
+        from jproperties import Properties
+
         p = Properties()
-        with open(filepath, 'rb') as fd:
-            p.load(fd)
+        p.load(io.BytesIO(self.get_workspace().read_file(filepath)))
         major = self._get_key(p, 'major')
         minor = self._get_key(p, 'minor')
         patch = self._get_key(p, 'patch')
@@ -113,6 +126,11 @@ class AskForSnapshot(Command):
 
         return [Variable('version')]
 
+    def is_interactive(self):
+        """The user is asked via the standard input."""
+
+        return True
+
     def execute(self, values):
         """Execution logic.
 
@@ -148,6 +166,11 @@ class AskForContinuation(Command):
 
         return [Argument('variable')]
 
+    def is_interactive(self):
+        """The user is asked via the standard input."""
+
+        return True
+
     def execute(self, values):
         """Execution logic.
 
@@ -168,7 +191,17 @@ class AskForContinuation(Command):
             sys.exit(0)
 
 class AbstractMavenCommand(Command):
-    """Abstract Command baseclass for commands that execute mvn."""
+    """Abstract Command baseclass for commands that execute mvn.
+
+    The command option "maven_backend" determines the Maven executable. With
+    the "mvnd" backend, commands are executed by the Maven Daemon, which keeps
+    warm Maven processes for subsequent invocations. If the Maven Daemon is
+    not available, the commands fall back to plain mvn.
+    """
+
+    _POM_NAMESPACE = 'http://maven.apache.org/POM/4.0.0'
+
+    _MAVEN_BACKENDS = ['mvn', 'mvnd']
 
     @abstractmethod
     def get_basic_command(self):
@@ -176,6 +209,16 @@ class AbstractMavenCommand(Command):
 
         pass
 
+    def get_batch_arguments(self, moduleDirs):
+        """Get additional arguments for a batched Maven command.
+
+        A batched Maven command is executed once for all given module
+        directories by means of a generated aggregator POM. Returns None, if
+        the command does not support batched execution.
+        """
+
+        return None
+
     def maximum_scope(self):
         """Determine maximum scope for the command's application."""
 
@@ -186,6 +229,11 @@ class AbstractMavenCommand(Command):
 
         return ['version']
 
+    def required_files(self, values):
+        """The module's POM must exist."""
+
+        return [os.path.join(self.get_module_directory(), 'pom.xml')]
+
     def execute(self, values):
         """Execution logic.
 
@@ -197,25 +245,265 @@ class AbstractMavenCommand(Command):
         # Determine module directory within target directory and logfile path
         # within target directory
         module = self.get_scope_variable_value('module')
-        moduleDir = os.path.join(self.get_target_directory(), module)
-        if not os.path.isdir(moduleDir):
-            print('Module directory "%s" does not exist. Exiting.' % moduleDir)
-        version = self.get_scope_variable_value('version')
-        logfile = os.path.join(self.get_target_directory(), 'mvn.log')
+        moduleDir = self.get_module_directory()
+        logfile = self._get_logfile()
 
         # Execute the basic Maven command and store log in a logfile (-l mvn
         # command-line argument)
-        mvnCommand = 'mvn -l %s %s%s' % (logfile, self.get_basic_command(),
-            version)
+        mvnCommand = self._get_maven_command(logfile)
         print('%s: %s' % (module, mvnCommand), end='', flush=True)
-        result = subprocess.run(mvnCommand.split(), cwd=moduleDir)
-        if result.returncode == 0:
+        returncode = self.get_workspace().run(mvnCommand.split(), moduleDir)
+        if returncode is None:
+            print(' [WOULD RUN]')
+        elif returncode == 0:
             print(' [DONE]')
         else:
             print('\n\tAn error occurred! mvn output can be found in file ' \
                 '"%s". Exiting.' % logfile)
             sys.exit(4)
 
+    def batch_key(self, values):
+        """Batch consecutive executions with the same version."""
+
+        return self.get_scope_variable_value('version')
+
+    def execute_batch(self, batch):
+        """Batched execution logic.
+
+        Execute the basic Maven command once for the modules of all commands
+        in the batch. To this end, an aggregator POM that lists the modules is
+        generated in the target directory. In case the batched execution
+        fails, the commands are executed one by one to report the failing
+        module.
+        """
+
+        modules = [c.get_scope_variable_value('module') for c, _ in batch]
+        moduleDirs = [c.get_module_directory() for c, _ in batch]
+        batchArguments = self.get_batch_arguments(moduleDirs)
+        if len(batch) < 2 or batchArguments is None:
+            super().execute_batch(batch)
+            return
+
+        targetDir = self.get_target_directory()
+        logfile = self._get_logfile()
+        workspace = self.get_workspace()
+        aggregatorPom = workspace.create_temporary_file(targetDir,
+            'corollary-batch-', '.xml',
+            self._aggregator_pom(targetDir, moduleDirs).encode())
+        try:
+            mvnCommand = '%s -f %s %s' % (self._get_maven_command(logfile),
+                aggregatorPom, batchArguments)
+            print('%s: %s' % (', '.join(modules), mvnCommand.strip()), end='',
+                flush=True)
+            returncode = workspace.run(mvnCommand.split(), targetDir)
+        finally:
+            workspace.remove_file(aggregatorPom)
+
+        if returncode is None:
+            print(' [WOULD RUN]')
+        elif returncode == 0:
+            print(' [DONE]')
+            for module in modules:
+                print('\t%s [DONE]' % module)
+        else:
+            print('\n\tAn error occurred! Executing mvn for each module to ' \
+                'determine failing modules.')
+            super().execute_batch(batch)
+
+    def _get_module_pom(self):
+        """Parse the POM of the current module without reporting errors.
+
+        Returns None, if the POM does not exist or cannot be parsed.
+        """
+
+        return _parse_xml(self.get_workspace(),
+            os.path.join(self.get_module_directory(), 'pom.xml'))
+
+    def _get_logfile(self):
+        """Get the path of the logfile for Maven output."""
+
+        return os.path.join(self.get_target_directory(), 'mvn.log')
+
+    def _get_maven_command(self, logfile):
+        """Get the Maven command for the current version."""
+
+        version = self.get_scope_variable_value('version')
+        return '%s -l %s %s%s' % (self._get_maven_executable(), logfile,
+            self.get_basic_command(), version)
+
+    def _get_maven_executable(self):
+        """Get the Maven executable of the selected Maven backend."""
+
+        backend = self.get_option('maven_backend', 'mvn')
+        if backend not in self._MAVEN_BACKENDS:
+            print('Unknown Maven backend "%s" (supported backends: %s). ' \
+                'Exiting.' % (backend, ', '.join(self._MAVEN_BACKENDS)))
+            sys.exit(4)
+        return _find_maven_executable(backend)
+
+    def _aggregator_pom(self, targetDir, moduleDirs):
+        """Generate an aggregator POM for the given module directories."""
+
+        modules = ''.join('    <module>%s</module>\n' % \
+            os.path.relpath(d, targetDir) for d in moduleDirs)
+        return '<?xml version="1.0" encoding="UTF-8"?>\n' \
+            '<project xmlns="%s">\n' \
+            '  <modelVersion>4.0.0</modelVersion>\n' \
+            '  <groupId>corollary</groupId>\n' \
+            '  <artifactId>corollary-batch</artifactId>\n' \
+            '  <version>0.0.0</version>\n' \
+            '  <packaging>pom</packaging>\n' \
+            '  <modules>\n%s  </modules>\n' \
+            '</project>\n' % (self._POM_NAMESPACE, modules)
+
+def _parse_xml(workspace, xmlFile):
+    """Parse the given XML file from the given workspace.
+
+    Returns None, if the file does not exist or cannot be parsed.
+    """
+
+    from lxml import etree
+
+    try:
+        return _parse_xml_strictly(workspace, xmlFile)
+    except (IOError, etree.XMLSyntaxError):
+        return None
+
+def _parse_xml_strictly(workspace, xmlFile):
+    """Parse the given XML file from the given workspace.
+
+    The parsed XML tree is cached by the workspace. Raises an IOError, if the
+    file does not exist, and an XMLSyntaxError, if it cannot be parsed.
+    """
+
+    return workspace.get_document(xmlFile, _XmlDocument).tree
+
+class _XmlDocument:
+    """Parsed XML document that keeps the original text before and after its
+    root element, e.g., the XML declaration, comments, and trailing
+    whitespace, which the parser does not preserve."""
+
+    # Optional byte order mark, XML declaration, and following whitespace
+    _DECLARATION_REGEX = re.compile(rb'(\xef\xbb\xbf)?<\?xml\s.*?\?>\s*',
+        re.DOTALL)
+
+    def __init__(self, content):
+        """Parse an XML document from the given bytes."""
+
+        from lxml import etree
+
+        self.tree = etree.parse(io.BytesIO(content))
+        self.prefix = self._find_prefix(content, self.tree.getroot())
+        self.trailer = content[len(content.rstrip()):]
+
+    def _find_prefix(self, content, root):
+        """Determine the original text before the root element.
+
+        If the start tag of the root element cannot be located, e.g., in
+        documents that are not encoded in an ASCII-compatible encoding, only
+        the XML declaration is kept.
+        """
+
+        from lxml import etree
+
+        rootName = etree.QName(root).localname
+        if root.prefix:
+            rootName = root.prefix + ':' + rootName
+        # The line of the root element is the line on which its start tag
+        # ends. Hence, the start tag is the last one before the line's end.
+        lineEnd = 0
+        for _ in range(root.sourceline or 0):
+            lineEnd = content.find(b'\n', lineEnd) + 1 or len(content)
+        rootStarts = [m.start() for m in re.finditer(rb'<%s[\s/>]' % \
+            re.escape(rootName.encode('utf-8')), content[:lineEnd])]
+        if rootStarts:
+            return content[:rootStarts[-1]]
+
+        declaration = self._DECLARATION_REGEX.match(content)
+        return declaration.group(0) if declaration else b''
+
+def _serialize_xml(document):
+    """Serialize an XML document with its original encoding and the original
+    text before and after its root element."""
+
+    from lxml import etree
+
+    encoding = document.tree.docinfo.encoding
+    root = document.tree.getroot()
+    return document.prefix + etree.tostring(root, encoding=encoding,
+        xml_declaration=False) + b''.join(b'\n' + etree.tostring(sibling,
+        encoding=encoding) for sibling in root.itersiblings()) + \
+        document.trailer
+
+def _serialize_xml_pretty(document):
+    """Serialize an XML document with pretty printing."""
+
+    from lxml import etree
+
+    return etree.tostring(document.tree, pretty_print=True)
+
+def _lines_document(content):
+    """Parse a text document from the given bytes into a list of lines.
+
+    Like for files opened in text mode, the default encoding applies and
+    newlines are translated.
+    """
+
+    return io.TextIOWrapper(io.BytesIO(content)).readlines()
+
+def _serialize_lines(lines):
+    """Serialize a text document from a list of lines."""
+
+    buffer = io.BytesIO()
+    textBuffer = io.TextIOWrapper(buffer)
+    textBuffer.writelines(lines)
+    textBuffer.flush()
+    return buffer.getvalue()
+
+def _read_bundle_version(workspace, manifestFile):
+    """Read the Bundle-Version from the given OSGi manifest file.
+
+    Returns None, if the file does not exist or does not specify a
+    Bundle-Version.
+    """
+
+    try:
+        manifest = workspace.get_document(manifestFile, _lines_document)
+    except IOError:
+        return None
+
+    for line in manifest:
+        if line.strip().startswith('Bundle-Version:'):
+            return line.split(':', 1)[1].strip()
+    return None
+
+def _to_osgi_version(version):
+    """Adapt the given LEMMA build version to be OSGi-compliant.
+
+    More specifically, replace "-SNAPSHOT" with ".qualifier".
+    """
+
+    if version.endswith(AskForSnapshot.SNAPSHOT_IDENTIFIER):
+        osgiVersion = version[:-len(AskForSnapshot.SNAPSHOT_IDENTIFIER)]
+        osgiVersion += '.qualifier'
+        return osgiVersion
+    else:
+        return version
+
+@functools.lru_cache(maxsize=None)
+def _find_maven_executable(executable):
+    """Find the given Maven executable or fall back to plain mvn.
+
+    The result is cached, so that the fallback is reported only once.
+    """
+
+    if executable == 'mvn' or shutil.which(executable):
+        return executable
+
+    print('Maven executable "%s" not found. Falling back to "mvn".' % \
+        executable)
+    return 'mvn'
+
 class MavenTychoSetVersion(AbstractMavenCommand):
     """mvn_tycho_set_version: Run set-version task of Tycho's version plugin.
 
@@ -233,6 +521,278 @@ class MavenTychoSetVersion(AbstractMavenCommand):
         return 'org.eclipse.tycho:tycho-versions-plugin:' \
             'set-version -DnewVersion='
 
+    def get_batch_arguments(self, moduleDirs):
+        """Restrict the batched set-version task to the modules' artifacts.
+
+        Without restriction, the task would only set the version of the
+        generated aggregator POM.
+        """
+
+        artifactIds = []
+        for moduleDir in moduleDirs:
+            pomXml = _parse_xml(self.get_workspace(),
+                os.path.join(moduleDir, 'pom.xml'))
+            if pomXml is None:
+                return None
+
+            artifactId = pomXml.getroot().findtext('{%s}artifactId' % \
+                self._POM_NAMESPACE)
+            if not artifactId:
+                return None
+            artifactIds.append(artifactId)
+        return '-Dartifacts=' + ','.join(artifactIds)
+
+    def is_applied(self, values):
+        """Probe if the module's POM already specifies the version.
+
+        For OSGi bundles, whose manifest is also updated by Tycho, the manifest
+        must already specify the version, too.
+        """
+
+        pomXml = self._get_module_pom()
+        version = self.get_scope_variable_value('version')
+        if pomXml is None or pomXml.getroot().findtext('{%s}version' % \
+            self._POM_NAMESPACE) != version:
+            return False
+
+        manifestFile = os.path.join(self.get_module_directory(), 'META-INF',
+            'MANIFEST.MF')
+        if not self.get_workspace().exists(manifestFile):
+            return True
+
+        bundleVersion = _read_bundle_version(self.get_workspace(), manifestFile)
+        return bundleVersion is None or \
+            bundleVersion == _to_osgi_version(version)
+
+class MavenTychoSetVersionRaw(MavenTychoSetVersion):
+    """mvn_tycho_set_version_raw: Raw version update of Maven POMs.
+
+    This is a version of the mvn_tycho_set_version command (see above) that
+    directly manipulates the POM file of the current module instead of running
+    Maven. Like the set-version task of Tycho's version plugin, it sets the
+    version XML element of the module's POM, as well as the version of those
+    submodules that explicitly specify the same version as their parent.
+    Moreover, it updates the version of parent and dependency elements that
+    reference the updated artifacts in the POMs of the module's reactor, i.e.,
+    the module and its submodules.
+
+    Modules that require Tycho-specific handling, e.g., because their
+    packaging is "eclipse-plugin", are still updated by means of Tycho's
+    version plugin.
+    """
+
+    _TYCHO_PACKAGINGS = {'eclipse-application', 'eclipse-feature',
+        'eclipse-plugin', 'eclipse-repository', 'eclipse-target-definition',
+        'eclipse-test-plugin', 'eclipse-update-site', 'p2-installable-unit'}
+
+    def name(self):
+        """Command name."""
+
+        return 'mvn_tycho_set_version_raw'
+
+    def batch_key(self, values):
+        """Raw version updates are not batched."""
+
+        return None
+
+    def execute(self, values):
+        """Execution logic.
+
+        Set the version of the module's POM and update references to the
+        module's artifact in its reactor.
+        """
+
+        pomFile = os.path.join(self.get_module_directory(), 'pom.xml')
+        reactor = self._parse_reactor(pomFile)
+        if reactor is None:
+            super().execute(values)
+            return
+
+        version = self.get_scope_variable_value('version')
+        modifiedPoms = self._set_version(reactor, version)
+        if modifiedPoms is None:
+            super().execute(values)
+            return
+
+        for pomFile in modifiedPoms:
+            self.get_workspace().update_document(pomFile, _serialize_xml)
+
+    def is_applied(self, values):
+        """Probe if the module's POM and the references to the module's
+        artifact in its reactor already specify the version.
+
+        Modules that require Tycho-specific handling are probed like for the
+        mvn_tycho_set_version command.
+        """
+
+        pomXml = self._get_module_pom()
+        if pomXml is None:
+            return False
+
+        pomFile = os.path.join(self.get_module_directory(), 'pom.xml')
+        reactor = self._parse_reactor(pomFile)
+        coordinates = self._get_coordinates(reactor[next(iter(reactor))]) \
+            if reactor else None
+        if coordinates is None:
+            return super().is_applied(values)
+
+        groupId, artifactId, versionElement = coordinates
+        version = self.get_scope_variable_value('version')
+        return versionElement.text == version and all(
+            referenceVersion.text == version
+            for _, referenceVersion in self._get_references(reactor,
+                {(groupId, artifactId)})
+        )
+
+    def _parse_reactor(self, pomFile):
+        """Parse the POMs of the reactor with the given root POM.
+
+        Returns a dict that maps the files of the reactor's POMs to their
+        parsed XML trees, starting with the root POM. Returns None, if the
+        reactor requires handling by Tycho.
+        """
+
+        from lxml import etree
+
+        reactor = {}
+        pomFilesTodo = [os.path.realpath(pomFile)]
+        while pomFilesTodo:
+            pomFile = pomFilesTodo.pop(0)
+            if pomFile in reactor:
+                continue
+
+            try:
+                pomXml = _parse_xml_strictly(self.get_workspace(), pomFile)
+            except (IOError, etree.XMLSyntaxError) as err:
+                print('Could not parse POM file "%s" (error was: %s). ' \
+                    'Exiting.' % (pomFile, str(err)))
+                sys.exit(4)
+
+            project = pomXml.getroot()
+            if project.tag != self._pom_tag('project') or \
+                project.findtext(self._pom_tag('packaging')) in \
+                self._TYCHO_PACKAGINGS:
+                return None
+            reactor[pomFile] = pomXml
+
+            pomDir = os.path.dirname(pomFile)
+            for module in project.iterfind('%s/%s' % (self._pom_tag('modules'),
+                self._pom_tag('module'))):
+                if not module.text:
+                    continue
+                modulePom = os.path.join(pomDir, module.text.strip())
+                if self.get_workspace().is_directory(modulePom):
+                    modulePom = os.path.join(modulePom, 'pom.xml')
+                pomFilesTodo.append(os.path.realpath(modulePom))
+        return reactor
+
+    def _set_version(self, reactor, version):
+        """Set the version of the reactor's root POM and its references.
+
+        Like the set-version task of Tycho's version plugin, the version of
+        submodules is set, too, if they explicitly specify the same version as
+        their parent. References to the updated artifacts are only updated,
+        if they specify the old version.
+
+        Returns the list of modified POM files. Returns None, if the root POM
+        does not explicitly specify its coordinates.
+        """
+
+        rootPom = next(iter(reactor))
+        coordinates = self._get_coordinates(reactor[rootPom])
+        if coordinates is None:
+            return None
+
+        groupId, artifactId, versionElement = coordinates
+        oldVersion = versionElement.text
+        updatedArtifacts = {(groupId, artifactId)}
+        versionElements = [(rootPom, versionElement)]
+
+        # Submodules that share the version of an updated parent are updated,
+        # too. Their parents may be submodules themselves.
+        pomFilesTodo = [pomFile for pomFile in reactor if pomFile != rootPom]
+        updated = True
+        while updated:
+            updated = False
+            for pomFile in list(pomFilesTodo):
+                project = reactor[pomFile].getroot()
+                coordinates = self._get_coordinates(reactor[pomFile])
+                parent = project.find(self._pom_tag('parent'))
+                if coordinates is None or coordinates[2].text != oldVersion or \
+                    parent is None or \
+                    parent.findtext(self._pom_tag('version')) != oldVersion or \
+                    (parent.findtext(self._pom_tag('groupId')),
+                        parent.findtext(self._pom_tag('artifactId'))) not in \
+                        updatedArtifacts:
+                    continue
+
+                updatedArtifacts.add(coordinates[:2])
+                versionElements.append((pomFile, coordinates[2]))
+                pomFilesTodo.remove(pomFile)
+                updated = True
+
+        versionElements.extend((pomFile, referenceVersion)
+            for pomFile, referenceVersion in self._get_references(reactor,
+                updatedArtifacts)
+            if referenceVersion.text == oldVersion)
+
+        modifiedPoms = []
+        for pomFile, versionElement in versionElements:
+            versionElement.text = version
+            if pomFile not in modifiedPoms:
+                modifiedPoms.append(pomFile)
+        return modifiedPoms
+
+    def _get_coordinates(self, pomXml):
+        """Get the coordinates of a parsed POM.
+
+        Returns a tuple of the groupId, the artifactId, and the version
+        element. Returns None, if the POM does not explicitly specify its
+        coordinates.
+        """
+
+        project = pomXml.getroot()
+        artifactId = project.findtext(self._pom_tag('artifactId'))
+        groupId = project.findtext(self._pom_tag('groupId')) or \
+            project.findtext('%s/%s' % (self._pom_tag('parent'),
+                self._pom_tag('groupId')))
+        versionElement = project.find(self._pom_tag('version'))
+        if not artifactId or not groupId or versionElement is None or \
+            not versionElement.text or '${' in versionElement.text:
+            return None
+        return groupId, artifactId, versionElement
+
+    def _get_references(self, reactor, artifacts):
+        """Get the versioned references to the given artifacts in the
+        reactor.
+
+        The artifacts are (groupId, artifactId) tuples. Yields tuples of the
+        referencing POM file and the version element of a parent or dependency
+        element.
+        """
+
+        for pomFile, pomXml in reactor.items():
+            references = pomXml.getroot().iterfind('.//' + \
+                self._pom_tag('dependency'))
+            parent = pomXml.getroot().find(self._pom_tag('parent'))
+            if parent is not None:
+                references = [parent] + list(references)
+
+            for reference in references:
+                if (reference.findtext(self._pom_tag('groupId')),
+                    reference.findtext(self._pom_tag('artifactId'))) not in \
+                    artifacts:
+                    continue
+
+                referenceVersion = reference.find(self._pom_tag('version'))
+                if referenceVersion is not None:
+                    yield pomFile, referenceVersion
+
+    def _pom_tag(self, tag):
+        """Qualify the given tag with the POM namespace."""
+
+        return '{%s}%s' % (self._POM_NAMESPACE, tag)
+
 class MavenUpdateParentVersion(AbstractMavenCommand):
     """mvn_update_parent_version: Run update-parent of Maven's version plugin.
 
@@ -250,6 +810,29 @@ class MavenUpdateParentVersion(AbstractMavenCommand):
         return 'versions:update-parent -DgenerateBackupPoms=false ' \
             '-DallowSnapshots=true -DparentVersion='
 
+    def get_batch_arguments(self, moduleDirs):
+        """The update-parent task is executed for every module of a reactor.
+
+        Hence, no additional arguments are required.
+        """
+
+        return ''
+
+    def is_applied(self, values):
+        """Probe if the module's POM already references the parent version."""
+
+        return _has_parent_version(self._get_module_pom(),
+            self.get_scope_variable_value('version'))
+
+def _has_parent_version(pomXml, version):
+    """Check if the given parsed POM references the given parent version."""
+
+    if pomXml is None:
+        return False
+
+    return pomXml.getroot().findtext('{%(ns)s}parent/{%(ns)s}version' % \
+        {'ns': AbstractMavenCommand._POM_NAMESPACE}) == version
+
 class MavenUpdateParentVersionRaw(Command):
     """mvn_update_parent_version_raw: Raw update of Maven parents.
 
@@ -281,6 +864,11 @@ class MavenUpdateParentVersionRaw(Command):
 
         return ['version']
 
+    def required_files(self, values):
+        """The module's POM must exist."""
+
+        return [os.path.join(self.get_module_directory(), 'pom.xml')]
+
     def execute(self, values):
         """Execution logic.
 
@@ -289,17 +877,12 @@ class MavenUpdateParentVersionRaw(Command):
         build.
         """
 
-        # Determine module directory within current target directory
-        module = self.get_scope_variable_value('module')
-        moduleDir = os.path.join(self.get_target_directory(), module)
-        if not os.path.isdir(moduleDir):
-            print('Module directory "%s" does not exist. Exiting.' % moduleDir)
-
         # Parse the module's POM
-        pomFile = os.path.join(moduleDir, 'pom.xml')
+        workspace = self.get_workspace()
+        pomFile = os.path.join(self.get_module_directory(), 'pom.xml')
         version = self.get_scope_variable_value('version')
         try:
-            pomXml = etree.parse(pomFile)
+            pomXml = _parse_xml_strictly(workspace, pomFile)
         except IOError as err:
             print('Could not open POM file "%s" (error was: %s). Exiting.' % \
                 (pomFile, str(err)))
@@ -319,7 +902,15 @@ class MavenUpdateParentVersionRaw(Command):
         # Change the referenced parent POM's version to the version value for
         # the LEMMA build and write back the changes to the module's POM
         pomParentVersion.text = version
-        pomXml.write(pomFile, pretty_print=True)
+        workspace.update_document(pomFile, _serialize_xml_pretty)
+
+    def is_applied(self, values):
+        """Probe if the module's POM already references the parent version."""
+
+        pomXml = _parse_xml(self.get_workspace(),
+            os.path.join(self.get_module_directory(), 'pom.xml'))
+        return _has_parent_version(pomXml,
+            self.get_scope_variable_value('version'))
 
 class OsgiUpdateBundleVersion(Command):
     """osgi_update_bundle_version: Update an OSGi bundle's Bundle-Version."""
@@ -339,6 +930,12 @@ class OsgiUpdateBundleVersion(Command):
 
         return ['version']
 
+    def required_files(self, values):
+        """The module's OSGi manifest must exist."""
+
+        return [os.path.join(self.get_module_directory(), 'META-INF',
+            'MANIFEST.MF')]
+
     def execute(self, values):
         """Execution logic.
 
@@ -346,40 +943,35 @@ class OsgiUpdateBundleVersion(Command):
         directory to the version number for the LEMMA build.
         """
 
-        # Determine module directory within current target directory
-        module = self.get_scope_variable_value('module')
-        moduleDir = os.path.join(self.get_target_directory(), module)
-        if not os.path.isdir(moduleDir):
-            print('Module directory "%s" does not exist. Exiting.' % moduleDir)
-
         # Manipulate the MANIFEST.MF OSGi bundle specification in the module
         # directory's META-INF folder
-        manifestFile = os.path.join(moduleDir, 'META-INF', 'MANIFEST.MF')
+        workspace = self.get_workspace()
+        manifestFile = os.path.join(self.get_module_directory(), 'META-INF',
+            'MANIFEST.MF')
         try:
-            with FileInput(files=(manifestFile), inplace=True) as fd:
-                for line in fd:
-                    if line.strip().startswith('Bundle-Version:'):
-                        print('Bundle-Version: ' + self._get_osgi_version())
-                    else:
-                        print(line, end='')
+            lines = workspace.get_document(manifestFile, _lines_document)
+            for i, line in enumerate(lines):
+                if line.strip().startswith('Bundle-Version:'):
+                    lines[i] = 'Bundle-Version: %s\n' % \
+                        self._get_osgi_version()
+            workspace.update_document(manifestFile, _serialize_lines)
         except IOError as err:
             print('Could not open OSGi manifest file "%s" (error was: %s).' \
                 'Exiting.' % (manifestFile, str(err)))
             sys.exit(4)
 
-    def _get_osgi_version(self):
-        """Adapt the LEMMA build version to be OSGi-compliant.
+    def is_applied(self, values):
+        """Probe if the manifest already specifies the Bundle-Version."""
 
-        More specifically, replace "-SNAPSHOT" with ".qualifier".
-        """
+        manifestFile = os.path.join(self.get_module_directory(), 'META-INF',
+            'MANIFEST.MF')
+        return _read_bundle_version(self.get_workspace(), manifestFile) == \
+            self._get_osgi_version()
 
-        version = self.get_scope_variable_value('version')
-        if version.endswith(AskForSnapshot.SNAPSHOT_IDENTIFIER):
-            osgiVersion = version[:-len(AskForSnapshot.SNAPSHOT_IDENTIFIER)]
-            osgiVersion += '.qualifier'
-            return osgiVersion
-        else:
-            return version
+    def _get_osgi_version(self):
+        """Adapt the LEMMA build version to be OSGi-compliant."""
+
+        return _to_osgi_version(self.get_scope_variable_value('version'))
 
 class UpdatePropertiesFile(Command):
     """update_properties_file: Update a Java properties file.
@@ -406,6 +998,11 @@ class UpdatePropertiesFile(Command):
         return [Argument('filepath'), Argument('propertyName'),
             Argument('variable')]
 
+    def required_files(self, values):
+        """The properties file must exist."""
+
+        return [os.path.join(self.get_module_directory(), values['filepath'])]
+
     def execute(self, values):
         """Execution logic.
 
@@ -420,33 +1017,207 @@ class UpdatePropertiesFile(Command):
             print('Variable "%s" not found in scope. Exiting.' % variable)
             sys.exit(4)
 
-        # Determine module directory within target directory
-        module = self.get_scope_variable_value('module')
-        moduleDir = os.path.join(self.get_target_directory(), module)
-        if not os.path.isdir(moduleDir):
-            print('Module directory "%s" does not exist. Exiting.' % moduleDir)
-
         # Raw-read and manipulation of the Java properties file to preserve comments and empty
         # lines
-        propertiesFile = os.path.join(moduleDir, values['filepath'])
+        workspace = self.get_workspace()
+        propertiesFile = os.path.join(self.get_module_directory(),
+            values['filepath'])
+        propertyRegex = re.compile('%s\s*=\s*(?P<value>.*)' % \
+            values['propertyName'])
+        try:
+            lines = workspace.get_document(propertiesFile, _lines_document)
+            for i, rawLine in enumerate(lines):
+                line = rawLine.strip()
+                propertyMatch = propertyRegex.match(line)
+                if propertyMatch:
+                    propertyValue = propertyMatch.group('value')
+                    propertyValueBegin = line[:-len(propertyValue)]
+                    lines[i] = propertyValueBegin + value + '\n'
+                else:
+                    lines[i] = line + '\n'
+            workspace.update_document(propertiesFile, _serialize_lines)
+        except IOError as err:
+            print('Could not open properties file "%s" (error was: %s).' \
+                'Exiting.' % (propertiesFile, str(err)))
+            sys.exit(4)
+
+    def is_applied(self, values):
+        """Probe if the property already has the variable's value."""
+
+        try:
+            value = self.get_scope_variable_value(values['variable'])
+        except KeyError:
+            return False
+
+        propertiesFile = os.path.join(self.get_module_directory(),
+            values['filepath'])
         propertyRegex = re.compile('%s\s*=\s*(?P<value>.*)' % \
             values['propertyName'])
+        propertyValues = []
+        try:
+            properties = self.get_workspace().get_document(propertiesFile,
+                _lines_document)
+        except IOError:
+            return False
+
+        for line in properties:
+            propertyMatch = propertyRegex.match(line.strip())
+            if propertyMatch:
+                propertyValues.append(propertyMatch.group('value'))
+        return bool(propertyValues) and all(v == value for v in propertyValues)
+
+class UpdatePropertiesFileBulk(Command):
+    """update_properties_file_bulk: Update several properties of a Java
+    properties file at once.
+
+    The command takes the path of the properties file relative to the current
+    module's path. Moreover, it expects a mapping of property names to the
+    names of variables, whose current values shall be assigned to the
+    properties. The mapping consists of comma-separated pairs of the form
+    propertyName=variable, e.g., "version=version,group=groupId".
+
+    In contrast to update_properties_file, the command updates all properties
+    in a single pass over the file, only matches complete property names, and
+    preserves the indentation of lines.
+    """
+
+    def name(self):
+        """Command name."""
+
+        return 'update_properties_file_bulk'
+
+    def maximum_scope(self):
+        """Determine maximum scope for the command's application."""
+
+        return CommandScope.MODULE
+
+    def arguments(self):
+        """Expected arguments."""
+
+        return [Argument('filepath'), Argument('properties')]
+
+    def required_files(self, values):
+        """The properties file must exist."""
+
+        return [os.path.join(self.get_module_directory(), values['filepath'])]
+
+    def execute(self, values):
+        """Execution logic.
+
+        Replace the values of all given properties with variable values.
+        """
+
+        propertyValues = self._get_property_values(values)
+        if propertyValues is None:
+            sys.exit(4)
+
+        workspace = self.get_workspace()
+        propertiesFile = os.path.join(self.get_module_directory(),
+            values['filepath'])
+        propertyRegex = _properties_regex(tuple(sorted(propertyValues)))
         try:
-            with FileInput(files=(propertiesFile), inplace=True) as fd:
-                for rawLine in fd:
-                    line = rawLine.strip()
-                    propertyMatch = propertyRegex.match(line)
-                    if propertyMatch:
-                        propertyValue = propertyMatch.group('value')
-                        propertyValueBegin = line[:-len(propertyValue)]
-                        print(propertyValueBegin + value)
-                    else:
-                        print(line)
+            lines = workspace.get_document(propertiesFile, _lines_document)
         except IOError as err:
             print('Could not open properties file "%s" (error was: %s).' \
                 'Exiting.' % (propertiesFile, str(err)))
             sys.exit(4)
 
+        updatedLines = []
+        continued = False
+        for line in lines:
+            # Drop continuation lines of replaced values
+            if continued:
+                continued = _is_continued(line)
+                continue
+
+            propertyMatch = propertyRegex.match(line)
+            if propertyMatch:
+                updatedLines.append(propertyMatch.group('begin') + \
+                    propertyValues[propertyMatch.group('name')] + \
+                    propertyMatch.group('end'))
+                continued = _is_continued(propertyMatch.group('value'))
+            else:
+                updatedLines.append(line)
+        lines[:] = updatedLines
+        workspace.update_document(propertiesFile, _serialize_lines)
+
+    def is_applied(self, values):
+        """Probe if all properties already have their variables' values."""
+
+        propertyValues = self._get_property_values(values, report=False)
+        if propertyValues is None:
+            return False
+
+        propertiesFile = os.path.join(self.get_module_directory(),
+            values['filepath'])
+        propertyRegex = _properties_regex(tuple(sorted(propertyValues)))
+        try:
+            lines = self.get_workspace().get_document(propertiesFile,
+                _lines_document)
+        except IOError:
+            return False
+
+        foundProperties = set()
+        for line in lines:
+            propertyMatch = propertyRegex.match(line)
+            if not propertyMatch:
+                continue
+
+            name = propertyMatch.group('name')
+            if propertyMatch.group('value') != propertyValues[name] or \
+                _is_continued(propertyMatch.group('value')):
+                return False
+            foundProperties.add(name)
+        return len(foundProperties) == len(propertyValues)
+
+    def _get_property_values(self, values, report=True):
+        """Map the names of the given properties to their variables' values.
+
+        Returns None, if the mapping is malformed or a variable is not in
+        scope. Errors are printed, if report is True.
+        """
+
+        propertyValues = {}
+        for pair in re.split(r'[\s,]+', values['properties'].strip()):
+            propertyName, separator, variable = pair.partition('=')
+            if not propertyName or not separator or not variable:
+                if report:
+                    print('Property mapping "%s" must consist of pairs of ' \
+                        'the form propertyName=variable. Exiting.' % \
+                        values['properties'])
+                return None
+
+            try:
+                propertyValues[propertyName] = \
+                    self.get_scope_variable_value(variable)
+            except KeyError:
+                if report:
+                    print('Variable "%s" not found in scope. Exiting.' % \
+                        variable)
+                return None
+        return propertyValues
+
+@functools.lru_cache(maxsize=None)
+def _properties_regex(propertyNames):
+    """Compile a regex that matches lines of the given Java properties.
+
+    The regex captures the beginning of a line up to the property value, the
+    property name, the value, and the line ending.
+    """
+
+    return re.compile(r'(?P<begin>[ \t\f]*(?P<name>%s)[ \t\f]*[=:][ \t\f]*)' \
+        r'(?P<value>.*?)(?P<end>\n?)$' % '|'.join(re.escape(n)
+            for n in propertyNames))
+
+def _is_continued(line):
+    """Check if a line of a Java properties file continues in the next line.
+
+    That is the case, if the line ends with an odd number of backslashes.
+    """
+
+    content = line.rstrip('\n')
+    return (len(content) - len(content.rstrip('\\'))) % 2 == 1
+
 class DeleteFile(Command):
     """delete_file: Delete a file within the target directory."""
 
@@ -463,6 +1234,24 @@ class DeleteFile(Command):
     def execute(self, values):
         """Execution logic."""
 
+        filepath = self._get_filepath(values)
+        try:
+            self.get_workspace().remove_file(filepath)
+        except IOError:
+            pass
+
+    def is_applied(self, values):
+        """Probe if the file was already deleted."""
+
+        return not self.get_workspace().exists(self._get_filepath(values))
+
+    def _get_filepath(self, values):
+        """Get the path of the file to delete.
+
+        Relative paths are resolved against the current module's directory or
+        the target directory.
+        """
+
         filepath = values['filepath']
         targetDir = self.get_target_directory()
         if not os.path.isabs(filepath):
@@ -476,8 +1265,4 @@ class DeleteFile(Command):
             print('File "%s" is not in target directory "%s" and thus cannot ' \
                 'be deleted. Exiting.' % (filepath, targetDir))
             sys.exit(4)
-
-        try:
-            os.remove(filepath)
-        except IOError:
-            pass
\ No newline at end of file
+        return filepath
\ No newline at end of file
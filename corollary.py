@@ -1,18 +1,38 @@
 #!/usr/bin/env python3
 
 from abc import ABC, abstractmethod
+from collections.abc import MutableMapping, Sequence
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
 from yaml.loader import SafeLoader
 
 import argparse
+import array
+import contextlib
 import copy
+import difflib
+import hashlib
+import hmac
 import importlib
+import importlib.util
 import inspect
+import io
+import json
 import logging
 import os
+import queue
 import re
 import shlex
+import socket
+import socketserver
+import stat
+import struct
+import subprocess
 import sys
+import sysconfig
+import tempfile
+import threading
+import time
 import yaml
 
 _NAME = 'corollary'
@@ -27,18 +47,181 @@ class Commandline:
         self._argument_parser = argparse.ArgumentParser(
             description='Corollary - Your Simple Command Executor')
         self._argument_parser.add_argument('-c', '--command_directory',
-            dest='commandDirectory', help='Directory of available commands',
-            required=True)
+            dest='commandDirectory', help='Directory of available commands ' \
+                '(required unless running as a daemon client)')
         self._argument_parser.add_argument('-f', '--formula',
-            dest='formula', required=True, help='The formula to be executed')
+            dest='formula', help='The formula to be executed (required ' \
+                'unless running as a worker or daemon)')
         self._argument_parser.add_argument('-t', '--target_directory',
-            dest='targetDirectory', required=True, help='The directory in ' \
-                'whose context the formula shall be executed')
+            dest='targetDirectories', action='append', default=[],
+            help='The directory in whose context the formula shall be ' \
+                'executed (required unless running as a daemon). May be ' \
+                'given several times to execute the formula on several ' \
+                'directories.')
+        self._argument_parser.add_argument('--target_file', dest='targetFile',
+            help='File that lists further target directories, one per line. ' \
+                'Empty lines and lines starting with "#" are ignored.')
+        self._argument_parser.add_argument('--target_jobs', dest='targetJobs',
+            type=int, default=4, help='Number of target directories to ' \
+                'execute the formula on concurrently (default: 4)')
+        self._argument_parser.add_argument('-b', '--batch', dest='batch',
+            action='store_true', help='Batch consecutive executions of ' \
+                'commands that support batching, e.g., Maven commands ' \
+                'across modules')
+        self._argument_parser.add_argument('-j', '--jobs', dest='jobs',
+            type=int, default=1, help='Number of module blocks within a ' \
+                'group to execute in parallel (default: 1)')
+        self._argument_parser.add_argument('-o', '--command_option',
+            dest='commandOptions', action='append', default=[],
+            type=self._command_option, metavar='NAME=VALUE',
+            help='Option to be passed to commands, e.g., ' \
+                'maven_backend=mvnd. May be given several times.')
+        self._argument_parser.add_argument('-p', '--plan_cache_directory',
+            dest='planCacheDirectory', help='Directory in which compiled ' \
+                'execution plans are cached across runs')
+        self._argument_parser.add_argument('--profile', '--trace-file',
+            dest='traceFile', metavar='TRACE_FILE', help='Record the wall ' \
+                'and CPU times of parsing, validating, and executing each ' \
+                'formula line, and write them as Chrome Trace Event JSON to ' \
+                'the given file, e.g., to inspect them in Perfetto')
+        self._argument_parser.add_argument('--no-skip-applied',
+            dest='skipApplied', action='store_false', help='Execute commands ' \
+                'even if their effect is already applied (cf. ' \
+                'Command.is_applied())')
+        self._argument_parser.add_argument('-n', '--dry-run', dest='dryRun',
+            action='store_true', help='Execute the formula without changing ' \
+                'files or running processes and print a diff of the changes')
+        self._argument_parser.add_argument('-w', '--worker', dest='workers',
+            action='append', default=[], type=self._address,
+            metavar='HOST:PORT', help='Worker to which module blocks within ' \
+                'groups are distributed instead of executing them locally. ' \
+                'May be given several times, also for the same worker. ' \
+                'Requires --worker_secret_file.')
+        self._argument_parser.add_argument('--serve_worker',
+            dest='serveWorker', type=self._address, metavar='[HOST]:PORT',
+            help='Run as a worker that executes the module blocks sent by ' \
+                'coordinators on the target directory. Without a host, the ' \
+                'worker only listens on the loopback interface. Requires ' \
+                '--worker_secret_file.')
+        self._argument_parser.add_argument('--worker_secret_file',
+            dest='workerSecretFile', metavar='SECRET_FILE', help='File that ' \
+                'contains the secret shared by a worker and its ' \
+                'coordinators. Workers reject coordinators that do not know ' \
+                'the secret.')
+        self._argument_parser.add_argument('--serve_daemon',
+            dest='serveDaemon', metavar='SOCKET_FILE', help='Run as a daemon ' \
+                'that keeps the commands loaded and executes the formulas ' \
+                'sent by clients via the Unix domain socket at the given file')
+        self._argument_parser.add_argument('-d', '--daemon', dest='daemon',
+            metavar='SOCKET_FILE', help='Let the daemon listening on the ' \
+                'Unix domain socket at the given file execute the formula')
+        self._argument_parser.add_argument('--journal', dest='journal',
+            metavar='JOURNAL_FILE', help='Record the completed lines of the ' \
+                'formula in the given journal file, so that a failed ' \
+                'execution can be resumed')
+        self._argument_parser.add_argument('--resume', dest='resume',
+            action='store_true', help='Resume the execution recorded in the ' \
+                'journal file after its last checkpoint')
+
+    def _command_option(self, value):
+        """Parse a command option of the form NAME=VALUE."""
+
+        name, separator, optionValue = value.partition('=')
+        if not name or not separator:
+            raise argparse.ArgumentTypeError('Command option "%s" must have ' \
+                'the form NAME=VALUE' % value)
+        return (name, optionValue)
+
+    def _address(self, value):
+        """Parse a network address of the form HOST:PORT."""
+
+        host, separator, port = value.rpartition(':')
+        try:
+            if separator and 0 <= int(port) <= 65535:
+                return (host, int(port))
+        except ValueError:
+            pass
+        raise argparse.ArgumentTypeError('Address "%s" must have the form ' \
+            'HOST:PORT' % value)
 
     def parse_arguments(self):
         """Parse the command-line arguments of the script."""
 
         self._parsed_arguments = self._argument_parser.parse_args()
+        arguments = self._parsed_arguments
+        if arguments.targetFile:
+            arguments.targetDirectories.extend(self._read_target_file(
+                arguments.targetFile))
+        if not arguments.commandDirectory and not arguments.daemon:
+            self._argument_parser.error('the following arguments are ' \
+                'required: -c/--command_directory')
+        if not arguments.targetDirectories and not arguments.serveDaemon:
+            self._argument_parser.error('the following arguments are ' \
+                'required: -t/--target_directory')
+        if len(arguments.targetDirectories) > 1:
+            for option, value in [('-w/--worker', arguments.workers),
+                ('--profile', arguments.traceFile),
+                ('--journal', arguments.journal),
+                ('--serve_worker', arguments.serveWorker),
+                ('-d/--daemon', arguments.daemon)]:
+                if value:
+                    self._argument_parser.error('argument %s: not allowed ' \
+                        'with several target directories' % option)
+        if not arguments.formula and not arguments.serveWorker and \
+            not arguments.serveDaemon:
+            self._argument_parser.error('the following arguments are ' \
+                'required: -f/--formula')
+        if arguments.daemon:
+            for option, value in [('-w/--worker', arguments.workers),
+                ('-p/--plan_cache_directory', arguments.planCacheDirectory),
+                ('--profile', arguments.traceFile),
+                ('--journal', arguments.journal),
+                ('--serve_worker', arguments.serveWorker),
+                ('--serve_daemon', arguments.serveDaemon)]:
+                if value:
+                    self._argument_parser.error('argument -d/--daemon: not ' \
+                        'allowed with argument %s' % option)
+        if (arguments.workers or arguments.serveWorker) and \
+            not arguments.workerSecretFile:
+            self._argument_parser.error('argument %s: requires ' \
+                '--worker_secret_file' % ('--serve_worker' if \
+                    arguments.serveWorker else '-w/--worker'))
+        arguments.workerSecret = None
+        if arguments.workerSecretFile:
+            arguments.workerSecret = self._read_secret_file(
+                arguments.workerSecretFile)
+        if self._parsed_arguments.resume and \
+            not self._parsed_arguments.journal:
+            self._argument_parser.error('argument --resume: requires ' \
+                '--journal')
+        if self._parsed_arguments.journal and self._parsed_arguments.dryRun:
+            self._argument_parser.error('argument --journal: not allowed ' \
+                'with argument -n/--dry-run')
+
+    def _read_target_file(self, targetFile):
+        """Read the target directories listed in a file."""
+
+        try:
+            with open(targetFile, 'r') as fd:
+                lines = [line.strip() for line in fd]
+        except OSError as e:
+            self._argument_parser.error('argument --target_file: could not ' \
+                'read "%s": %s' % (targetFile, e))
+        return [line for line in lines if line and not line.startswith('#')]
+
+    def _read_secret_file(self, secretFile):
+        """Read the secret shared by workers and coordinators from a file."""
+
+        try:
+            with open(secretFile, 'rb') as fd:
+                secret = fd.read().strip()
+        except OSError as e:
+            self._argument_parser.error('argument --worker_secret_file: ' \
+                'could not read "%s": %s' % (secretFile, e))
+        if not secret:
+            self._argument_parser.error('argument --worker_secret_file: ' \
+                '"%s" is empty' % secretFile)
+        return secret
 
     @property
     def command_directory(self):
@@ -54,9 +237,108 @@ class Commandline:
 
     @property
     def target_directory(self):
-        """Passed target directory."""
+        """Passed target directory. If several target directories were passed,
+        the first one."""
+
+        targetDirectories = self._parsed_arguments.targetDirectories
+        return targetDirectories[0] if targetDirectories else None
+
+    @property
+    def target_directories(self):
+        """Passed target directories."""
+
+        return self._parsed_arguments.targetDirectories
+
+    @property
+    def target_jobs(self):
+        """Passed number of target directories to execute concurrently."""
+
+        return self._parsed_arguments.targetJobs
+
+    @property
+    def batch(self):
+        """Passed flag for batched command execution."""
+
+        return self._parsed_arguments.batch
+
+    @property
+    def jobs(self):
+        """Passed number of parallel jobs."""
+
+        return self._parsed_arguments.jobs
+
+    @property
+    def plan_cache_directory(self):
+        """Passed directory for cached execution plans."""
+
+        return self._parsed_arguments.planCacheDirectory
+
+    @property
+    def trace_file(self):
+        """Passed file for the trace of the execution."""
+
+        return self._parsed_arguments.traceFile
+
+    @property
+    def skip_applied(self):
+        """Passed flag for skipping commands whose effect is already
+        applied."""
+
+        return self._parsed_arguments.skipApplied
+
+    @property
+    def dry_run(self):
+        """Passed flag for dry runs."""
+
+        return self._parsed_arguments.dryRun
+
+    @property
+    def command_options(self):
+        """Passed command options as a dict."""
+
+        return dict(self._parsed_arguments.commandOptions)
+
+    @property
+    def workers(self):
+        """Passed worker addresses as (host, port) tuples."""
+
+        return self._parsed_arguments.workers
+
+    @property
+    def serve_worker(self):
+        """Passed address to serve as a worker on, if any."""
+
+        return self._parsed_arguments.serveWorker
+
+    @property
+    def worker_secret(self):
+        """Secret shared by workers and coordinators as bytes, if any."""
+
+        return self._parsed_arguments.workerSecret
+
+    @property
+    def serve_daemon(self):
+        """Passed socket file to serve as a daemon on, if any."""
+
+        return self._parsed_arguments.serveDaemon
+
+    @property
+    def daemon(self):
+        """Passed socket file of the daemon to execute the formula, if any."""
 
-        return self._parsed_arguments.targetDirectory
+        return self._parsed_arguments.daemon
+
+    @property
+    def journal(self):
+        """Passed journal file, if any."""
+
+        return self._parsed_arguments.journal
+
+    @property
+    def resume(self):
+        """Passed flag for resuming the execution recorded in the journal."""
+
+        return self._parsed_arguments.resume
 
 class Commands:
     """Holds information about commands found in the command directory."""
@@ -76,28 +358,226 @@ class Commands:
 
         thisModule = inspect.getmodule(self)
         self._builtin_commands = {}
-        commands = self._load_commands(thisModule, '__main__', 'BuiltinCommand')
+        commands = self._load_commands(thisModule, __name__, 'BuiltinCommand')
         for command in commands:
             self._builtin_commands[command.get_name()] = command
 
     def _load_commands_from_directory(self, directory):
-        """Load commands from the specified directory."""
+        """Load commands from the specified directory.
+
+        If the Python package descriptor of the directory declares a command
+        index, submodules are only loaded when one of their commands is
+        requested (cf. _load_command_index()). Without a declared index, the
+        index is derived from the registry cache, if it is up to date for all
+        exported submodules (cf. CommandRegistryCache).
+        """
 
         self._commands = {}
+        self._directory = directory
+        self._loadedSubmodules = {}
 
         # Only those commands are loaded that are explicitly exported as
         # submodules via the Python package descriptor (file "__init__.py") and
         # the __all__ variable, e.g., __all__ = ['cmds']
-        exportedModules = importlib.import_module(directory).__all__
-        qualifiedSubmoduleNames = [directory + '.' + n for n in exportedModules]
-        loadedSubmodules = [importlib.import_module(m, package=directory)
-            for m in qualifiedSubmoduleNames]
+        package = importlib.import_module(directory)
+        self._exportedModules = package.__all__
+        self._registryCache = CommandRegistryCache(package)
+        declaredIndex = getattr(package, '__commands__', None)
+        if declaredIndex is None:
+            declaredIndex = self._registryCache.get_command_names(
+                {m: self._submodule_file(m) for m in self._exportedModules}
+            )
+        self._commandIndex = self._load_command_index(package, declaredIndex)
+        if self._commandIndex is not None:
+            return
+
+        # Load commands from all exported submodules
+        for exportedModule in self._exportedModules:
+            self._load_submodule(exportedModule)
+
+    def _submodule_file(self, submoduleName):
+        """Determine the file of an exported submodule without loading it."""
+
+        return importlib.util.find_spec(self._directory + '.' + \
+            submoduleName).origin
+
+    def _load_command_index(self, package, declaredIndex):
+        """Load the given command index of the given package, if any.
+
+        The command index is usually declared by the __commands__ variable of
+        the package descriptor. It maps the names of exported submodules to the
+        names of the commands they contain, e.g., __commands__ = {'cmds':
+        ['cmd1', 'cmd2']}. The method returns a dict that maps command names to
+        submodule names. It applies the same checks for reserved and duplicate
+        command names as the registration of loaded commands.
+        """
 
-        # Load commands from exported submodules
-        for submodule in loadedSubmodules:
+        if declaredIndex is None:
+            return None
+
+        commandIndex = {}
+        for submoduleName, commandNames in declaredIndex.items():
+            if submoduleName not in self._exportedModules:
+                raise ValueError('Error while loading command index of ' \
+                    'package "%s": Submodule "%s" is not exported' % \
+                    (package.__name__, submoduleName))
+
+            for commandName in commandNames:
+                if commandName in self._builtin_commands:
+                    raise ValueError('Error while loading command index of ' \
+                        'package "%s" (submodule "%s"): Command name "%s" ' \
+                        'is reserved for built-in comamnd' % \
+                        (package.__name__, submoduleName, commandName))
+                elif commandName in commandIndex:
+                    raise ValueError('Error while loading command index of ' \
+                        'package "%s" (submodule "%s"): Duplicate command ' \
+                        'name "%s"' % (package.__name__, submoduleName,
+                        commandName))
+                commandIndex[commandName] = submoduleName
+        return commandIndex
+
+    def _load_submodule(self, submoduleName, reload=False):
+        """Load and register the commands of an exported submodule.
+
+        If the registry cache holds up-to-date metadata for the submodule, the
+        commands are initialized from the metadata. Otherwise, the submodule's
+        classes are scanned for commands and the registry cache is updated.
+        If the reload flag is set, the already imported submodule is executed
+        again. Returns the loaded commands.
+        """
+
+        submodule = importlib.import_module(self._directory + '.' + \
+            submoduleName, package=self._directory)
+        if reload:
+            submodule = importlib.reload(submodule)
+        else:
             sys.path.append(submodule.__file__)
+        self._loadedSubmodules[submoduleName] = (submodule.__file__,
+            self._file_state(submodule.__file__))
+        loadedCommands = self._load_commands_from_metadata(submodule,
+            self._registryCache.get_metadata(submoduleName, submodule.__file__))
+        if loadedCommands is None:
             loadedCommands = self._load_commands(submodule)
-            self._validate_and_register_external_commands(loadedCommands)
+            self._registryCache.store_metadata(submoduleName,
+                submodule.__file__, [c.get_metadata() for c in loadedCommands],
+                self._submodule_dependencies(submodule))
+
+        if self._commandIndex is not None:
+            self._validate_indexed_commands(submoduleName, loadedCommands)
+        self._validate_and_register_external_commands(loadedCommands)
+        return loadedCommands
+
+    def _submodule_dependencies(self, submodule):
+        """Determine the files of the modules a submodule depends on.
+
+        These are the modules that the submodule imports or imports from, and
+        the modules that define the base classes of its classes. The modules
+        of corollary itself, of the standard library, and of installed
+        libraries are not considered.
+        """
+
+        modules = set()
+        for value in vars(submodule).values():
+            modules.add(value if inspect.ismodule(value) else \
+                inspect.getmodule(value))
+            if inspect.isclass(value):
+                modules.update(inspect.getmodule(c) for c in value.__mro__)
+
+        excludedFiles = {os.path.abspath(__file__),
+            os.path.abspath(submodule.__file__)}
+        libraryDirectories = tuple(os.path.join(os.path.abspath(
+            sysconfig.get_path(name)), '') for name in ['stdlib',
+            'platstdlib', 'purelib', 'platlib'])
+        dependencies = set()
+        for module in modules:
+            file = getattr(module, '__file__', None)
+            if not file or not file.endswith('.py'):
+                continue
+
+            file = os.path.abspath(file)
+            if file not in excludedFiles and \
+                not file.startswith(libraryDirectories):
+                dependencies.add(file)
+        return sorted(dependencies)
+
+    def _file_state(self, file):
+        """Determine the modification time and size of a file."""
+
+        fileStat = os.stat(file)
+        return (fileStat.st_mtime_ns, fileStat.st_size)
+
+    def reload_changed_submodules(self):
+        """Reload the loaded submodules whose files changed since they were
+        loaded.
+
+        The commands of a changed submodule are replaced by those of the
+        reloaded submodule. Returns the names of the reloaded submodules.
+        """
+
+        changedSubmodules = [submoduleName
+            for submoduleName, (file, state) in self._loadedSubmodules.items()
+            if self._file_state(file) != state]
+        for submoduleName in changedSubmodules:
+            file = self._loadedSubmodules[submoduleName][0]
+            self._commands = {n: c for n, c in self._commands.items()
+                if c.get_file() != file}
+            self._load_submodule(submoduleName, reload=True)
+        return changedSubmodules
+
+    def preload(self):
+        """Load all exported submodules in advance.
+
+        Moreover, the modules listed by the __preload__ variable of the
+        command directory's package descriptor are imported, e.g., libraries
+        that commands import on demand. Modules that cannot be imported are
+        skipped.
+        """
+
+        for submoduleName in self._exportedModules:
+            if submoduleName not in self._loadedSubmodules:
+                self._load_submodule(submoduleName)
+
+        package = importlib.import_module(self._directory)
+        for moduleName in getattr(package, '__preload__', []):
+            try:
+                importlib.import_module(moduleName)
+            except ImportError as e:
+                logging.getLogger().warning('Could not preload module ' \
+                    '"%s": %s' % (moduleName, str(e)))
+
+    def _load_commands_from_metadata(self, submodule, metadata):
+        """Initialize the commands of a submodule from cached metadata.
+
+        Returns None, if there is no metadata or it does not fit the
+        submodule.
+        """
+
+        if metadata is None:
+            return None
+
+        commands = []
+        for commandMetadata in metadata:
+            commandClass = getattr(submodule, commandMetadata['class'], None)
+            if not inspect.isclass(commandClass):
+                return None
+
+            commandInstance = commandClass(submodule.__file__, commandClass)
+            commandInstance.init_from_metadata(commandMetadata)
+            commands.append(commandInstance)
+        return commands
+
+    def _validate_indexed_commands(self, submoduleName, commands):
+        """Validate that the command index matches the loaded commands."""
+
+        indexedNames = {n for n, m in self._commandIndex.items()
+            if m == submoduleName}
+        loadedNames = {c.get_name() for c in commands}
+        if indexedNames != loadedNames:
+            raise ValueError('Error while loading commands of submodule ' \
+                '"%s": Command index is out of date (missing commands: %s, ' \
+                'unknown commands: %s)' % (submoduleName,
+                ', '.join(sorted(loadedNames - indexedNames)) or '-',
+                ', '.join(sorted(indexedNames - loadedNames)) or '-'))
 
     def _load_commands(self, submodule, commandClassModule='corollary',
         commandClassName='Command'):
@@ -185,12 +665,40 @@ class Commands:
         return commandInstance
 
     def get_command(self, commandName):
-        """Get command with the given name."""
+        """Get command with the given name.
+
+        Commands from submodules that were not loaded yet are loaded on
+        demand.
+        """
 
         if self.is_builtin_command(commandName):
             return self._builtin_commands[commandName]
-        else:
-            return self._commands[commandName]
+        elif commandName not in self._commands and self._commandIndex and \
+            commandName in self._commandIndex:
+            self._load_submodule(self._commandIndex[commandName])
+        return self._commands[commandName]
+
+    def get_registry_hash(self):
+        """Get a hash of the registered commands.
+
+        The hash covers the metadata of built-in commands as well as the
+        contents of the command directory's package descriptor and exported
+        submodules. Hence, it can be determined without loading submodules.
+        """
+
+        registryHash = hashlib.sha256()
+        builtinMetadata = sorted((c.get_metadata()
+            for c in self._builtin_commands.values()),
+            key=lambda m: m['name'])
+        registryHash.update(json.dumps(builtinMetadata).encode('utf-8'))
+
+        package = importlib.import_module(self._directory)
+        files = [package.__file__] + [self._submodule_file(m)
+            for m in self._exportedModules]
+        for file in files:
+            with open(file, 'rb') as fd:
+                registryHash.update(fd.read())
+        return registryHash.hexdigest()
 
     def is_builtin_command(self, commandName):
         """Check if the class with the given name is a built-in command."""
@@ -210,6 +718,175 @@ class Commands:
                 )
             return self._provided_builtin_variables
 
+def _source_hash():
+    """Determine a hash of corollary's source code.
+
+    Caches include the hash in their keys, so that changes of corollary
+    invalidate them, even if the version was not increased.
+    """
+
+    with open(os.path.abspath(__file__), 'rb') as fd:
+        return hashlib.sha256(fd.read()).hexdigest()
+
+class CommandRegistryCache:
+    """Persistent cache for the metadata of the commands in a package.
+
+    The cache is stored in the "__pycache__" directory of the package or, if
+    the directory is not writable, in the user's cache directory. It holds the
+    metadata of the commands in each submodule (cf. Command.get_metadata())
+    together with the modification time, size, and content hash of the
+    submodule's file and the files of the modules the submodule depends on.
+    Metadata is only reused, if none of the files was changed. The cache is
+    invalidated as a whole, when the file of corollary itself changes.
+    """
+
+    _FILENAME = 'corollary-registry.json'
+
+    # Version of the cache structure. Needs to be increased, when the structure
+    # of the cache or the command metadata changes.
+    _FORMAT_VERSION = 2
+
+    def __init__(self, package):
+        """Constructor."""
+
+        self._cacheFile = self._cache_file(package)
+        self._version = [_VERSION, self._FORMAT_VERSION, _source_hash()]
+        self._entries = self._load_entries()
+
+    def _cache_file(self, package):
+        """Determine the cache file of the given package.
+
+        Packages whose "__pycache__" directory is not writable, e.g., because
+        they are installed read-only, are cached in the user's cache
+        directory.
+        """
+
+        packageDirectory = os.path.dirname(os.path.abspath(package.__file__))
+        cacheDirectory = os.path.join(packageDirectory, '__pycache__')
+        if os.access(cacheDirectory if os.path.isdir(cacheDirectory) else \
+            packageDirectory, os.W_OK):
+            return os.path.join(cacheDirectory, self._FILENAME)
+
+        userCacheDirectory = os.environ.get('XDG_CACHE_HOME') or \
+            os.path.join(os.path.expanduser('~'), '.cache')
+        return os.path.join(userCacheDirectory, _NAME, '%s-%s' % \
+            (hashlib.sha256(packageDirectory.encode()).hexdigest()[:16],
+            self._FILENAME))
+
+    def _load_entries(self):
+        """Load the cache entries of the package's submodules."""
+
+        try:
+            with open(self._cacheFile, 'r') as fd:
+                cache = json.load(fd)
+            if cache['version'] == self._version:
+                return cache['submodules']
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        return {}
+
+    def _file_state(self, file, entry=None):
+        """Determine the state of a file to key cache entries.
+
+        The state comprises the file's modification time, size, and content
+        hash. The content hash is only computed, if modification time or size
+        differ from those of the given cache entry.
+        """
+
+        stat = os.stat(file)
+        state = {'mtime': stat.st_mtime_ns, 'size': stat.st_size}
+        if entry and entry['mtime'] == state['mtime'] and \
+            entry['size'] == state['size']:
+            state['hash'] = entry['hash']
+        else:
+            with open(file, 'rb') as fd:
+                state['hash'] = hashlib.sha256(fd.read()).hexdigest()
+        return state
+
+    def get_metadata(self, submoduleName, file):
+        """Get cached command metadata of a submodule.
+
+        Returns None, if the cache holds no metadata for the submodule, or the
+        submodule's file or the file of a module it depends on was changed.
+        """
+
+        entry = self._entries.get(submoduleName)
+        if not entry:
+            return None
+
+        touchedFiles = []
+        for filepath, state in [(file, entry)] + \
+            list(entry['dependencies'].items()):
+            try:
+                currentState = self._file_state(filepath, state)
+            except OSError:
+                return None
+
+            if state['hash'] != currentState['hash']:
+                return None
+            elif state['mtime'] != currentState['mtime'] or \
+                state['size'] != currentState['size']:
+                touchedFiles.append((state, currentState))
+
+        if touchedFiles:
+            # Files were touched, but their contents did not change
+            for state, currentState in touchedFiles:
+                state.update(currentState)
+            self._save()
+        return entry['commands']
+
+    def get_command_names(self, submoduleFiles):
+        """Get cached command names of the given submodules.
+
+        The submodules are passed as a dict that maps submodule names to their
+        files. Returns a dict that maps the names of the submodules to the names
+        of their commands, or None, if metadata for any submodule is missing.
+        """
+
+        commandNames = {}
+        for submoduleName, file in submoduleFiles.items():
+            metadata = self.get_metadata(submoduleName, file)
+            if metadata is None:
+                return None
+            commandNames[submoduleName] = [m['name'] for m in metadata]
+        return commandNames
+
+    def store_metadata(self, submoduleName, file, metadata,
+        dependencies=None):
+        """Store command metadata of a submodule.
+
+        The dependencies are the files of the modules that the submodule
+        depends on (cf. Commands._submodule_dependencies()).
+        """
+
+        try:
+            entry = self._file_state(file)
+            entry['dependencies'] = {f: self._file_state(f)
+                for f in dependencies or []}
+        except OSError:
+            return
+
+        entry['commands'] = metadata
+        self._entries[submoduleName] = entry
+        self._save()
+
+    def _save(self):
+        """Save the cache.
+
+        Failures to save the cache are ignored, as the cache is optional.
+        """
+
+        cache = {'version': self._version,
+            'submodules': self._entries}
+        try:
+            os.makedirs(os.path.dirname(self._cacheFile), exist_ok=True)
+            temporaryFile = '%s.%d.tmp' % (self._cacheFile, os.getpid())
+            with open(temporaryFile, 'w') as fd:
+                json.dump(cache, fd)
+            os.replace(temporaryFile, self._cacheFile)
+        except OSError:
+            pass
+
 class Command(ABC):
     """Abstract baseclass for commands."""
 
@@ -270,6 +947,42 @@ class Command(ABC):
         self._provided_variables = providedVars
         self._required_variable_names = requiresVarsNames
 
+    def get_metadata(self):
+        """Get the initialization values of the command as a JSON-compatible
+        dict.
+
+        The metadata allows to initialize instances of the command's class via
+        init_from_metadata() without invoking the methods of the implementer.
+        """
+
+        return {
+            'name': self._name,
+            'class': self._classname,
+            'maximumScope': self._maximumScope.name,
+            'arguments': [a.get_name() for a in self._arguments],
+            'providedVariables': [v.get_name()
+                for v in self._provided_variables],
+            'requiredVariables': list(self._required_variable_names)
+        }
+
+    def init_from_metadata(self, metadata):
+        """Initialize a Command instance from metadata.
+
+        The metadata is expected to originate from get_metadata() of a command
+        that was initialized with init_from_implementer().
+        """
+
+        name = metadata['name']
+        arguments = [Argument(a) for a in metadata['arguments']]
+        for arg in arguments:
+            arg.init_internal(self._file, name)
+        providedVars = [Variable(v) for v in metadata['providedVariables']]
+        for v in providedVars:
+            v.init_internal(self._file, name)
+
+        self._init_from_values(name, CommandScope[metadata['maximumScope']],
+            arguments, providedVars, list(metadata['requiredVariables']))
+
     def new_instance(self):
         """Create a new instance of a concrete Command implementation.
 
@@ -311,6 +1024,70 @@ class Command(ABC):
 
         pass
 
+    def is_applied(self, argumentValues):
+        """For implementers: Probe if the command's effect is already in place.
+
+        The method is invoked before the command's execution. The scope
+        variables and the target directory are already set. If the method
+        returns True, the execution of the command is skipped. Hence, probes
+        should be cheap and return False in case of doubt. Commands that
+        provide variables are never probed. By default, commands are always
+        executed.
+        """
+
+        return False
+
+    def is_interactive(self):
+        """For implementers: Check if the command reads from the standard
+        input, e.g., to ask the user for values.
+
+        When a formula is executed on several target directories, interactive
+        commands at the start of the formula are executed only once and their
+        provided variables are shared by all target directories (cf.
+        ExecutionPlan.execute_interactive_prefix()). Interactive commands
+        elsewhere are rejected in that case. By default, commands are not
+        interactive.
+        """
+
+        return False
+
+    def required_files(self, argumentValues):
+        """For implementers: Determine the files the command requires.
+
+        Before a formula is executed, a preflight check rejects the execution,
+        if one of the required files of its commands does not exist. Relative
+        paths are resolved against the target directory. The target directory
+        and the target directory index are already set when this method is
+        invoked. Within modules, the variable "module" is the only scope
+        variable, so that the module directory can be determined by means of
+        get_module_directory(). By default, commands do not require files.
+        """
+
+        return []
+
+    def batch_key(self, argumentValues):
+        """For implementers: Determine the key for batched execution.
+
+        In batch mode, consecutive executions of the same command with equal
+        keys are collected and passed to execute_batch() at once. The scope
+        variables and the target directory are already set when this method is
+        invoked. The default key None disables batching. Commands that provide
+        variables are never batched.
+        """
+
+        return None
+
+    def execute_batch(self, batch):
+        """For implementers: Execution logic for a batch of executions.
+
+        The batch is a list of (command instance, argument values) tuples in
+        execution order. The method is invoked on the first command instance
+        of the batch. By default, the commands are executed one by one.
+        """
+
+        for command, argumentValues in batch:
+            command.execute(argumentValues)
+
     def set_target_directory(self, targetDirectory):
         """Pass the given target directoy to a concrete command."""
 
@@ -321,6 +1098,58 @@ class Command(ABC):
 
         return self._targetDirectory
 
+    def set_target_index(self, targetIndex):
+        """Pass the index of the target directory to a concrete command."""
+
+        self._targetIndex = targetIndex
+
+    def get_target_index(self):
+        """Get the index of the target directory (cf. TargetDirectoryIndex).
+
+        The index reflects the target directory before the execution of the
+        formula. Hence, it suits checks before the execution, e.g.,
+        required_files(). During the execution, files must be queried via the
+        workspace (cf. get_workspace()).
+        """
+
+        return self._targetIndex
+
+    def get_module_directory(self):
+        """Get the current module's directory within the target directory."""
+
+        return os.path.join(self.get_target_directory(),
+            self.get_scope_variable_value('module'))
+
+    def get_module_files(self):
+        """Get the well-known files of the current module before the execution
+        of the formula (cf. get_target_index() and
+        TargetDirectoryIndex.get_module_files())."""
+
+        return self.get_target_index().get_module_files(
+            self.get_module_directory())
+
+    def set_workspace(self, workspace):
+        """Pass the workspace for file accesses and processes to a concrete
+        command."""
+
+        self._workspace = workspace
+
+    def get_workspace(self):
+        """Get the workspace for file accesses and processes (cf. Workspace).
+        """
+
+        return self._workspace
+
+    def set_options(self, options):
+        """Pass the command options given on the command-line to a command."""
+
+        self._options = options
+
+    def get_option(self, optionName, default=None):
+        """Get the value of the given command option."""
+
+        return self._options.get(optionName, default)
+
     def set_scope_variables(self, scopeVariables):
         """Pass the current execution scope's variables to a command."""
 
@@ -477,6 +1306,8 @@ class _GroupCommand(BuiltinCommand):
 class Argument:
     """Command argument."""
 
+    __slots__ = ('_name', 'commandFile', 'commandName')
+
     def __init__(self, name):
         """Constructor."""
 
@@ -516,6 +1347,8 @@ class Argument:
 class Variable:
     """Command variable."""
 
+    __slots__ = ('_name', 'commandFile', 'commandName')
+
     def __init__(self, name):
         """Constructor."""
 
@@ -586,15 +1419,22 @@ class Formula:
         self._formulaFile = formulaFile
         self._commands = commands
 
+        # The YAML content of the formula is only parsed on demand, so that it
+        # need not be parsed for cached execution plans
         with open(formulaFile, 'r') as fd:
-            self._unpackedEntries = \
-                self._unpack_yaml_entries(yaml.load(fd, Loader=YamlLineLoader))
+            self._content = fd.read()
+        self._unpackedEntries = None
 
     def get_file(self):
         """Get the formula's file."""
 
         return self._formulaFile
 
+    def get_content_hash(self):
+        """Get a hash of the formula's content."""
+
+        return hashlib.sha256(self._content.encode('utf-8')).hexdigest()
+
     def _unpack_yaml_entries(self, yamlEntries):
         """Unpack YAML entries.
 
@@ -614,9 +1454,9 @@ class Formula:
                 for l in nestedLists:
                     entryListsTodo.append((l, nestingLevel+1))
 
-        # YAML does not guarantee entry ordering. Sort unpacked entries by line
-        # numbers to circumvent that constraint.
-        return dict(sorted(unpackedEntries.items()))
+        # YAML does not guarantee entry ordering. The unpacked entries are
+        # sorted by line numbers to circumvent that constraint.
+        return FormulaEntries(unpackedEntries)
 
     def _unpack_yaml_entry(self, entry):
         """Unpack a YAML entry."""
@@ -643,10 +1483,48 @@ class Formula:
                 type(entry).__name__)
 
     def get_unpacked_entries(self):
-        """Get unpacked YAML entries."""
+        """Get unpacked YAML entries (cf. FormulaEntries)."""
 
+        if self._unpackedEntries is None:
+            self._unpackedEntries = self._unpack_yaml_entries(
+                yaml.load(self._content, Loader=_YAML_LINE_LOADER)
+            )
         return self._unpackedEntries
 
+class FormulaEntries:
+    """Unpacked YAML entries of a formula in the order of their lines.
+
+    Line numbers and nesting levels are stored in arrays and YAML scalars are
+    interned, so that large formulas need not keep an object per line.
+    Iterating the entries yields (line number, YAML scalar, nesting level)
+    tuples.
+    """
+
+    __slots__ = ('_linenos', '_scalars', '_nestingLevels')
+
+    def __init__(self, unpackedEntries):
+        """Constructor.
+
+        The unpacked entries map line numbers to (YAML scalar, nesting level)
+        tuples.
+        """
+
+        self._linenos = array.array('I', sorted(unpackedEntries))
+        self._scalars = [sys.intern(unpackedEntries[lineno][0])
+            for lineno in self._linenos]
+        self._nestingLevels = array.array('H', (unpackedEntries[lineno][1]
+            for lineno in self._linenos))
+
+    def __len__(self):
+        """Get the number of entries."""
+
+        return len(self._linenos)
+
+    def __iter__(self):
+        """Iterate the entries in the order of their lines."""
+
+        return zip(self._linenos, self._scalars, self._nestingLevels)
+
 class YamlLineLoader(SafeLoader):
     """Implementation of a YAML loader that preserves line numbers."""
 
@@ -656,522 +1534,3576 @@ class YamlLineLoader(SafeLoader):
         scalar = super(YamlLineLoader, self).construct_scalar(node)
         return (scalar, node.start_mark.line + 1)
 
-class ExecutionPlan:
-    """An execution plan derived from a formula."""
+try:
+    from yaml import CSafeLoader
 
-    _COMMAND_REGEX = re.compile('(?P<command>\S*)(?P<argumentValues>.*)?')
+    class YamlCLineLoader(CSafeLoader):
+        """Line-preserving YAML loader based on libyaml.
 
-    _GROUP_ENTRY = 'GROUP ENTRY'
-    _GROUP_EXIT = 'GROUP EXIT'
-    _MODULE_ENTRY = 'MODULE ENTRY'
-    _MODULE_EXIT = 'MODULE EXIT'
+        The loader yields the same (scalar, line number) tuples as
+        YamlLineLoader, but is considerably faster for large formulas.
+        """
 
-    def __init__(self, commands, formula, targetDirectory):
-        """Constructor."""
+        def construct_scalar(self, node):
+            """Keep line number for each YAML scalar."""
 
-        self._commands = commands
-        self._formulaFile = formula.get_file()
-        self._targetDirectory = targetDirectory
-        self._executionPlan = self._parse(formula)
-        self._validate_scoping()
+            scalar = super(YamlCLineLoader, self).construct_scalar(node)
+            return (scalar, node.start_mark.line + 1)
 
-    def _parse(self, formula):
-        """Parse a formula."""
+    _YAML_LINE_LOADER = YamlCLineLoader
+except ImportError:
+    # PyYAML was built without libyaml bindings
+    _YAML_LINE_LOADER = YamlLineLoader
 
-        yamlEntries = formula.get_unpacked_entries()
-        executionPlan = {}
+class ScopeVariables(MutableMapping):
+    """Variables visible within a scope.
 
-        # Iterate of the formula's unpacked YAML scalars and parse commands
-        for self._currentLineno, entryInfo in yamlEntries.items():
-            (yamlScalar, nestingLevel) = entryInfo
-            # Parse a command, its argument values, and internal execution
-            # instructions
-            instrsBefore, command, argumentValues, instrsAfter = \
-                self._parse_command(yamlScalar)
+    The variables of a scope are layered on the variables of an outer scope.
+    Hence, entering a scope does not require to copy the outer scope's
+    variables. Instead, values of the outer scope are deeply copied on first
+    access. Consequently, mutations of the values within the inner scope do not
+    affect the outer scope. Values of immutable types are not copied.
+    """
 
-            # Add the command to the execution plan
-            if not self._currentLineno in executionPlan:
-                executionPlan[self._currentLineno] = \
-                    ([], command, argumentValues, [])
-            # The line number of the command may already be assigned in the
-            # execution plan, because an after execution instruction was added
-            # (cf. _insert_after_execution_instruction_into_plan()). In this
-            # case, keep existing internal execution instructions.
-            else:
-                existingBefore, _, _, existingAfter = \
-                    executionPlan[self._currentLineno]
-                executionPlan[self._currentLineno] = \
-                    (existingBefore, command, argumentValues, existingAfter)
-
-            # Add before execution instructions of the command
-            if instrsBefore:
-                self._insert_before_execution_instruction_into_plan(
-                    executionPlan,
-                    instrsBefore
-                )
+    _IMMUTABLE_TYPES = (str, int, float, bool, bytes, type(None))
 
-            # Add after execution instructions of the command
-            if instrsAfter:
-                self._insert_after_execution_instruction_into_plan(
-                    executionPlan,
-                    nestingLevel,
-                    yamlEntries,
-                    instrsAfter
-                )
+    def __init__(self, outer=None):
+        """Constructor."""
 
-        return sorted(executionPlan.items())
+        self._outer = outer
+        self._variables = {}
 
-    def _parse_command(self, yamlScalar):
-        """Parse a command from a YAML scalar."""
+    def _lookup(self, name):
+        """Look up the value of a variable without copying it.
 
-        match = self._COMMAND_REGEX.match(yamlScalar)
-        if not match:
-            raise ValueError('Line %d: %s is not a valid command syntax ' \
-                '(formula "%s")' % (self._currentLineno, yamlScalar,
-                    self._formulaFile))
+        Raises a KeyError, if the variable is not visible.
+        """
+
+        scope = self
+        while scope is not None:
+            try:
+                return scope._variables[name]
+            except KeyError:
+                scope = scope._outer
+        raise KeyError(name)
+
+    def __getitem__(self, name):
+        """Get the value of a variable.
+
+        Values of outer scopes are copied into this scope on first access.
+        """
 
-        commandName = match.group('command')
         try:
-            command = self._commands.get_command(commandName)
+            return self._variables[name]
         except KeyError:
-            raise ValueError('Line %d: Unkown command "%s" (formula "%s")' % \
-                (self._currentLineno, commandName, self._formulaFile))
+            pass
 
-        try:
-            argumentValues = shlex.split(match.group('argumentValues'))
-        except IndexError:
-            argumentValues = []
-        self._validate_passed_arguments(command, argumentValues)
+        value = self._lookup(name)
+        if not isinstance(value, self._IMMUTABLE_TYPES):
+            value = copy.deepcopy(value)
+            self._variables[name] = value
+        return value
 
-        providedVars = command.get_provided_variables()
-        self._validate_provided_variables(command, providedVars)
+    def __setitem__(self, name, value):
+        """Set the value of a variable within this scope."""
 
-        # Determine internal execution instructions of the command. These
-        # instructions haven nothin to do with the comman'ds execution logic,
-        # but represent instructions needed by corollary to execute an execution
-        # plan and manipulate, e.g., the variable stack.
-        instrBefore, instrAfter = self._internal_execution_instructions(command)
-        return (instrBefore, command, argumentValues, instrAfter)
+        self._variables[name] = value
 
-    def _validate_passed_arguments(self, command, passedArguments):
-        """Validate the arguments passed to a command."""
+    def __delitem__(self, name):
+        """Remove a variable from this scope."""
 
-        expectedCount = len(command.get_arguments())
-        passedCount = len(passedArguments)
-        if passedCount != expectedCount:
-            raise ValueError('Line %d: Command "%s" takes %d argument(s), ' \
-                'got %d (formula "%s")' % (self._currentLineno,
-                command.get_name(), expectedCount, passedCount,
-                self._formulaFile))
+        del self._variables[name]
 
-    def _validate_provided_variables(self, command, providedVariables):
-        """Validate the variables provided by a command."""
+    def __contains__(self, name):
+        """Check if a variable is visible within this scope."""
+
+        try:
+            self._lookup(name)
+            return True
+        except KeyError:
+            return False
+
+    def __iter__(self):
+        """Iterate the names of visible variables.
+
+        Names of variables from outer scopes come first.
+        """
+
+        if self._outer is None:
+            yield from self._variables
+            return
+
+        outerNames = set()
+        for name in self._outer:
+            outerNames.add(name)
+            yield name
+        for name in self._variables:
+            if name not in outerNames:
+                yield name
+
+    def __len__(self):
+        """Get the number of visible variables."""
+
+        return sum(1 for _ in self)
+
+class _ParsedLine:
+    """Line of a parsed formula (cf. ExecutionPlan._parse()).
+
+    The internal execution instructions before and after the line's command
+    are tuples, which are shared by lines with the same instructions.
+    """
+
+    __slots__ = ('lineno', 'instructionsBefore', 'command', 'argumentValues',
+        'instructionsAfter')
+
+    def __init__(self, lineno, instructionsBefore, command, argumentValues,
+        instructionsAfter):
+        """Constructor."""
+
+        self.lineno = lineno
+        self.instructionsBefore = instructionsBefore
+        self.command = command
+        self.argumentValues = argumentValues
+        self.instructionsAfter = instructionsAfter
+
+class CompiledProgram(Sequence):
+    """Compiled program of an execution plan (cf. ExecutionPlan._compile()).
+
+    The program is a sequence of instructions in the form (line number,
+    command, argument values dict, scope transitions before, scope, scope
+    transitions after). Instead of keeping a tuple and a dict per
+    instruction, the program stores its instructions in columns. Line numbers
+    are stored in an array, argument values as tuples of interned strings,
+    and the scope transitions and scope of an instruction as a frame that is
+    shared by all instructions with the same frame. Instructions are
+    assembled on access, so that each access yields a fresh argument values
+    dict.
+    """
+
+    __slots__ = ('_linenos', '_commands', '_argumentValues', '_frames',
+        '_internedFrames')
+
+    def __init__(self, instructions=()):
+        """Constructor."""
+
+        self._linenos = array.array('I')
+        self._commands = []
+        self._argumentValues = []
+        self._frames = []
+        self._internedFrames = {}
+        self.extend(instructions)
+
+    def _columns(self, instruction):
+        """Split an instruction into the values of its columns."""
+
+        (lineno, command, argumentValues, transitionsBefore, scope,
+            transitionsAfter) = instruction
+        frame = (transitionsBefore, scope, transitionsAfter)
+        return (lineno, command, tuple(sys.intern(v) if isinstance(v, str)
+            else v for v in (argumentValues[a.get_name()]
+            for a in command.get_arguments())),
+            self._internedFrames.setdefault(frame, frame))
+
+    def append(self, instruction):
+        """Append an instruction to the program."""
+
+        self.append_values(*self._columns(instruction))
+
+    def append_values(self, lineno, command, argumentValues, frame):
+        """Append an instruction to the program by the values of its columns.
+
+        The argument values are a tuple in the order of the command's
+        arguments. The frame is a tuple of the scope transitions before, the
+        scope, and the scope transitions after the instruction.
+        """
+
+        self._linenos.append(lineno)
+        self._commands.append(command)
+        self._argumentValues.append(argumentValues)
+        self._frames.append(self._internedFrames.setdefault(frame, frame))
+
+    def extend(self, instructions):
+        """Append the given instructions to the program."""
+
+        for instruction in instructions:
+            self.append(instruction)
+
+    def __len__(self):
+        """Get the number of instructions."""
+
+        return len(self._linenos)
+
+    def __getitem__(self, index):
+        """Get the instruction at the given index or a list of the
+        instructions in the given slice."""
+
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        command = self._commands[index]
+        transitionsBefore, scope, transitionsAfter = self._frames[index]
+        return (self._linenos[index], command,
+            {a.get_name(): v for a, v in zip(command.get_arguments(),
+            self._argumentValues[index])},
+            transitionsBefore, scope, transitionsAfter)
+
+    def __setitem__(self, index, instruction):
+        """Replace the instruction at the given index."""
+
+        (self._linenos[index], self._commands[index],
+            self._argumentValues[index], self._frames[index]) = \
+            self._columns(instruction)
+
+    def __iter__(self):
+        """Iterate the instructions."""
+
+        for index in range(len(self)):
+            yield self[index]
+
+class ExecutionPlan:
+    """An execution plan derived from a formula."""
+
+    _COMMAND_REGEX = re.compile('(?P<command>\S*)(?P<argumentValues>.*)?')
+
+    _GROUP_ENTRY = 'GROUP ENTRY'
+    _GROUP_EXIT = 'GROUP EXIT'
+    _MODULE_ENTRY = 'MODULE ENTRY'
+    _MODULE_EXIT = 'MODULE EXIT'
+
+    def __init__(self, commands, formula, targetDirectory, planCache=None,
+        tracer=None, build=True):
+        """Constructor.
+
+        If a plan cache is given, a cached program for the formula is reused
+        instead of parsing and compiling the formula. If a tracer is given,
+        it records the durations of parsing, validating, and executing the
+        formula's lines (cf. ExecutionTracer). Without a target directory,
+        the plan can only be executed by its copies for target directories
+        (cf. for_target_directory()).
+
+        If build is False, the formula is neither parsed nor compiled. The
+        plan must then be built by parse() and compile(), e.g., to measure
+        both phases separately.
+        """
+
+        self._commands = commands
+        self._formula = formula
+        self._formulaFile = formula.get_file()
+        self._targetDirectory = targetDirectory
+        self._tracer = tracer
+        self._program = None
+        if not build:
+            return
+
+        program = planCache.load(formula) if planCache else None
+        if program is None:
+            program = self._compile(self.parse())
+            if planCache:
+                planCache.store(formula, program)
+        self._set_program(program)
+
+    def parse(self):
+        """Parse the plan's formula.
+
+        Returns the parsed lines of the formula, which compile() compiles into
+        the plan's program.
+        """
+
+        return self._parse(self._formula)
+
+    def compile(self, parsedLines):
+        """Compile the parsed lines of the plan's formula (cf. parse()).
+
+        The compilation validates the scoping of the formula and yields the
+        plan's program. If the plan has a target directory, the program is
+        expanded for it. Returns the compiled program.
+        """
+
+        self._set_program(self._compile(parsedLines))
+        return self._compiledProgram
+
+    def _set_program(self, program):
+        """Set the compiled program of the plan.
+
+        The formula is released, as the plan does not need it anymore.
+        """
+
+        self._formula = None
+        self._program = self._compiledProgram = program
+        if self._targetDirectory is not None:
+            self._expand_for_target_directory()
+
+    def _expand_for_target_directory(self):
+        """Expand the compiled program for the plan's target directory."""
+
+        self._targetIndex = TargetDirectoryIndex(self._targetDirectory)
+
+        # Module patterns are expanded after caching, as their expansion
+        # depends on the target directory
+        with _trace(self._tracer, 'expand'):
+            self._program = self._expand_module_patterns(self._compiledProgram)
+
+        if self._tracer:
+            self._tracer.set_line_contexts(self._line_contexts())
+
+    def for_target_directory(self, targetDirectory):
+        """Create a copy of the execution plan for the given target directory.
+
+        The copy shares the compiled program, so that the formula is not
+        parsed and validated again. Only module patterns are expanded against
+        the target directory.
+        """
+
+        plan = copy.copy(self)
+        plan._targetDirectory = targetDirectory
+        plan._tracer = None
+        plan._expand_for_target_directory()
+        return plan
+
+    def _parse(self, formula):
+        """Parse a formula.
+
+        The formula's unpacked YAML scalars are parsed in a single pass. A stack
+        of currently open blocks, e.g., groups and modules, determines where
+        the internal execution instructions that end the blocks are placed.
+        """
+
+        with _trace(self._tracer, 'load'):
+            yamlEntries = formula.get_unpacked_entries()
+        executionPlan = []
+        openBlocks = []
+        # Instruction sequences recur across lines and are shared
+        internedInstructions = {}
+
+        # Iterate of the formula's unpacked YAML scalars and parse commands
+        for self._currentLineno, yamlScalar, nestingLevel in yamlEntries:
+            # Parse a command, its argument values, and internal execution
+            # instructions
+            with _trace(self._tracer, 'parse', self._currentLineno) as details:
+                instrBefore, command, argumentValues, instrAfter = \
+                    self._parse_command(yamlScalar)
+                details['command'] = command.get_name()
+
+            # After execution instructions of open blocks are executed when the
+            # blocks end, i.e., at a line number whose nesting level is lesser
+            # or equal to the nesting level of the command that opened the
+            # block. For example, after execution instructions of a group
+            # become the first instructions to be executed when the group is
+            # left.
+            instrsBefore = self._close_blocks(openBlocks, nestingLevel)
+            if instrBefore:
+                instrsBefore.append(instrBefore)
+            if instrAfter:
+                openBlocks.append((nestingLevel, instrAfter))
+
+            # Add the command to the execution plan
+            instrsBefore = tuple(instrsBefore)
+            executionPlan.append(_ParsedLine(self._currentLineno,
+                internedInstructions.setdefault(instrsBefore, instrsBefore),
+                command, argumentValues, ()))
+
+        # Blocks that are still open at the end of the formula are closed after
+        # the execution of the formula's last command
+        if executionPlan:
+            executionPlan[-1].instructionsAfter = tuple(self._close_blocks(
+                openBlocks, -1))
+
+        return executionPlan
+
+    def _parse_command(self, yamlScalar):
+        """Parse a command from a YAML scalar."""
+
+        match = self._COMMAND_REGEX.match(yamlScalar)
+        if not match:
+            raise ValueError('Line %d: %s is not a valid command syntax ' \
+                '(formula "%s")' % (self._currentLineno, yamlScalar,
+                    self._formulaFile))
+
+        commandName = sys.intern(match.group('command'))
+        try:
+            command = self._commands.get_command(commandName)
+        except KeyError:
+            raise ValueError('Line %d: Unkown command "%s" (formula "%s")' % \
+                (self._currentLineno, commandName, self._formulaFile))
+
+        try:
+            argumentValues = tuple(sys.intern(v)
+                for v in shlex.split(match.group('argumentValues')))
+        except IndexError:
+            argumentValues = ()
+        self._validate_passed_arguments(command, argumentValues)
+
+        providedVars = command.get_provided_variables()
+        self._validate_provided_variables(command, providedVars)
+
+        # Determine internal execution instructions of the command. These
+        # instructions haven nothin to do with the comman'ds execution logic,
+        # but represent instructions needed by corollary to execute an execution
+        # plan and manipulate, e.g., the variable stack.
+        instrBefore, instrAfter = self._internal_execution_instructions(command)
+        return (instrBefore, command, argumentValues, instrAfter)
+
+    def _validate_passed_arguments(self, command, passedArguments):
+        """Validate the arguments passed to a command."""
+
+        expectedCount = len(command.get_arguments())
+        passedCount = len(passedArguments)
+        if passedCount != expectedCount:
+            raise ValueError('Line %d: Command "%s" takes %d argument(s), ' \
+                'got %d (formula "%s")' % (self._currentLineno,
+                command.get_name(), expectedCount, passedCount,
+                self._formulaFile))
+
+    def _validate_provided_variables(self, command, providedVariables):
+        """Validate the variables provided by a command."""
 
         if self._commands.is_builtin_command(command.get_name()):
             return
 
-        # A command cannot override variables provided by a built-in command
-        builtinVars = self._commands.get_builtin_provided_variables()
-        providedVarNames = [v.get_name() for v in providedVariables]
-        providedBuiltins = [v for v in providedVarNames if v in builtinVars]
-        if providedBuiltins:
-            raise ValueError('Line %d: Command "%s" cannot provide built-in ' \
-                'variable(s) "%s" (formula "%s")' % (self._current_lineno,
-                command.get_name(), ', '.join(providedBuiltins),
-                self._formulaFile))
+        # A command cannot override variables provided by a built-in command
+        builtinVars = self._commands.get_builtin_provided_variables()
+        providedVarNames = [v.get_name() for v in providedVariables]
+        providedBuiltins = [v for v in providedVarNames if v in builtinVars]
+        if providedBuiltins:
+            raise ValueError('Line %d: Command "%s" cannot provide built-in ' \
+                'variable(s) "%s" (formula "%s")' % (self._currentLineno,
+                command.get_name(), ', '.join(providedBuiltins),
+                self._formulaFile))
+
+    def _internal_execution_instructions(self, command):
+        """Determine the internal execution instructions of a command.
+
+        Internal execution instructions may only originate from a built-in
+        command. This method returns a tuple. Its first element determines
+        execution instructions to be executed _before_ the command. Its second
+        element determines instructions to be executed _after_ the command.
+        """
+
+        if not self._commands.is_builtin_command(command.get_name()):
+            return (None, None)
+
+        if command.get_name() == _GroupCommand.NAME:
+            return (self._GROUP_ENTRY, self._GROUP_EXIT)
+        elif command.get_name() == _ModuleCommand.NAME:
+            return (self._MODULE_ENTRY, self._MODULE_EXIT)
+        else:
+            return (None, None)
+
+    def _close_blocks(self, openBlocks, nestingLevel):
+        """Close open blocks with a nesting level greater or equal to the given
+        one.
+
+        Returns the after execution instructions of the closed blocks, starting
+        with the innermost block.
+        """
+
+        instrsAfter = []
+        while openBlocks and openBlocks[-1][0] >= nestingLevel:
+            instrsAfter.append(openBlocks.pop()[1])
+        return instrsAfter
+
+    def _compile(self, executionPlan):
+        """Compile the execution plan into a flat program.
+
+        Compilation validates the plan's scoping once, i.e., it checks that
+        commands do not exceed their maximum scopes and that the variables
+        they require are provided on their scopes. The resulting program
+        consists of one instruction per command in the form (line number,
+        command, argument values dict, scope transitions before, scope,
+        scope transitions after). A scope transition is a tuple (scope, outer
+        scope). It enters the scope with its variables layered on the
+        variables of the outer scope or, if the outer scope is None, exits the
+        scope. The program is stored compactly (cf. CompiledProgram).
+        """
+
+        self._scopeStack = [CommandScope.GLOBAL]
+        self._setup_variable_stack()
+
+        program = CompiledProgram()
+        for parsedLine in executionPlan:
+            self._currentLineno = parsedLine.lineno
+            command = parsedLine.command
+            argumentValues = parsedLine.argumentValues
+            instrsBefore = parsedLine.instructionsBefore
+            instrsAfter = parsedLine.instructionsAfter
+            with _trace(self._tracer, 'validate', self._currentLineno,
+                command.get_name()):
+                transitionsBefore = self._resolve_scope_transitions(
+                    instrsBefore)
+                currentScope = self._scopeStack[0]
+                self._validate_command_scope(command, currentScope)
+
+                # Put names of provided variables of a command on the current
+                # scope's variable stack
+                scopeVariables = self._visibleVariables[currentScope]
+                for v in command.get_provided_variables():
+                    scopeVariables[v.get_name()] = None
+                self._validate_required_variables(command, currentScope,
+                    scopeVariables)
+
+                transitionsAfter = self._resolve_scope_transitions(instrsAfter)
+            program.append_values(self._currentLineno, command,
+                argumentValues, (transitionsBefore, currentScope,
+                transitionsAfter))
+        return program
+
+    def _resolve_scope_transitions(self, executionInstructions):
+        """Resolve internal execution instructions into scope transitions.
+
+        This method also manipulates the scope stack and the variable stack
+        depending on the given execution instructions.
+        """
+
+        transitions = []
+        for instruction in executionInstructions:
+            if instruction == self._GROUP_ENTRY:
+                self._scopeStack.insert(0, CommandScope.GROUP)
+            elif instruction == self._MODULE_ENTRY:
+                self._scopeStack.insert(0, CommandScope.MODULE)
+            elif instruction in (self._GROUP_EXIT, self._MODULE_EXIT):
+                transitions.append((self._scopeStack.pop(0), None))
+                self._apply_scope_transitions(transitions[-1:])
+                continue
+
+            # A group was entered. Its variables are layered on the variables of
+            # the preceding global scope. A module was entered. Its variables
+            # are layered on the variables of the enclosing scope. Group
+            # variables may overwrite global variables, if a module is
+            # contained in a group.
+            transitions.append((self._scopeStack[0], self._scopeStack[1]))
+            self._apply_scope_transitions(transitions[-1:])
+        return tuple(transitions)
+
+    def _validate_command_scope(self, command, currentScope):
+        """Validate that a command does not exceed its maximum scope."""
+
+        commandScope = command.get_maximum_scope()
+        if commandScope.value < currentScope.value:
+            raise ValueError('Line %d: Maximum scope of command "%s" is ' \
+                '"%s", but the current scope is "%s" (formula "%s")' % \
+                (self._currentLineno, command.get_name(), commandScope,
+                    currentScope, self._formulaFile))
+
+    def _validate_required_variables(self, command, currentScope,
+        scopeVariables):
+        """Validate that the variables required by a command are provided."""
+
+        missingRequiredVariableNames = [ rv
+            for rv in command.get_required_variable_names()
+            if rv not in scopeVariables
+        ]
+        if missingRequiredVariableNames:
+            missingStr = ', '.join(missingRequiredVariableNames)
+            visibleStr = ', '.join('"{0}"'.format(k) \
+                for k in scopeVariables.keys())
+            raise ValueError('Line %d: Command "%s" requires variables ' \
+                '"%s", but they are not provided on the current scope ' \
+                '"%s". Visible variables are %s (formula "%s")' % \
+                (self._currentLineno, command.get_name(), missingStr,
+                    currentScope, visibleStr, self._formulaFile))
+
+    def _expand_module_patterns(self, program):
+        """Expand the module blocks of module patterns in a compiled program.
+
+        The block of a module whose name is a pattern (cf.
+        TargetDirectoryIndex) is repeated for each matching module. To this
+        end, the program is flattened into a sequence of scope transitions
+        and instructions, in which the repeated blocks are delimited by the
+        transitions that enter and exit them. Programs without module patterns
+        are returned as is.
+        """
+
+        if not any(isinstance(command, _ModuleCommand) and \
+            TargetDirectoryIndex.is_pattern(argumentValues['moduleName'])
+            for _, command, argumentValues, _, _, _ in program):
+            return program
+
+        events = []
+        for instruction in program:
+            events.extend(instruction[3])
+            events.append(instruction)
+            events.extend(instruction[5])
+        return self._pack_events(self._expand_events(events))
+
+    def _expand_events(self, events):
+        """Expand the module patterns in a flattened program.
+
+        Scope transitions are (scope, outer scope) tuples, whereas
+        instructions are longer tuples.
+        """
+
+        expanded = []
+        position = 0
+        while position < len(events):
+            event = events[position]
+            if len(event) == 2 or not isinstance(event[1], _ModuleCommand) or \
+                not TargetDirectoryIndex.is_pattern(event[2]['moduleName']):
+                expanded.append(event)
+                position += 1
+                continue
+
+            # The module's block starts with the transition that enters the
+            # module and ends with the transition that exits it
+            (lineno, command, argumentValues, _, scope, _) = event
+            entry = expanded.pop()
+            exitPosition = self._block_exit_position(events, position)
+            body = self._expand_events(events[position+1:exitPosition])
+
+            pattern = argumentValues['moduleName']
+            modules = self._targetIndex.match_modules(pattern)
+            if not modules:
+                raise ValueError('Line %d: Module pattern "%s" does not ' \
+                    'match any module in target directory "%s" (formula ' \
+                    '"%s")' % (lineno, pattern, self._targetDirectory,
+                    self._formulaFile))
+            for module in modules:
+                expanded.append(entry)
+                expanded.append((lineno, command,
+                    dict(argumentValues, moduleName=module), (), scope, ()))
+                expanded.extend(body)
+                expanded.append(events[exitPosition])
+            position = exitPosition + 1
+        return expanded
+
+    def _block_exit_position(self, events, position):
+        """Determine the position of the transition that exits the block
+        whose command is at the given position of a flattened program."""
+
+        depth = 1
+        for exitPosition in range(position + 1, len(events)):
+            event = events[exitPosition]
+            if len(event) == 2:
+                depth += 1 if event[1] is not None else -1
+                if depth == 0:
+                    return exitPosition
+        raise ValueError('Block of line %d is not closed' % events[position][0])
+
+    def _pack_events(self, events):
+        """Pack a flattened program into a program.
+
+        Scope transitions are placed before the subsequent instruction or,
+        if there is none, after the last instruction.
+        """
+
+        program = CompiledProgram()
+        transitions = []
+        for event in events:
+            if len(event) == 2:
+                transitions.append(event)
+                continue
+
+            (lineno, command, argumentValues, _, scope, _) = event
+            program.append((lineno, command, argumentValues,
+                tuple(transitions), scope, ()))
+            transitions = []
+
+        if transitions:
+            program[-1] = program[-1][:5] + (tuple(transitions),)
+        return program
+
+    def _line_contexts(self):
+        """Determine the group and module of each line of the program.
+
+        Returns a dict that maps line numbers to (group, module) tuples.
+        Lines outside of groups or modules map to None values.
+        """
+
+        lineContexts = {}
+        blockNames = {CommandScope.GROUP: None, CommandScope.MODULE: None}
+        for (lineno, command, argumentValues, transitionsBefore, _,
+            transitionsAfter) in self._program:
+            for scope, outerScope in transitionsBefore:
+                if outerScope is None:
+                    blockNames[scope] = None
+
+            if isinstance(command, _GroupCommand):
+                blockNames[CommandScope.GROUP] = argumentValues['groupName']
+            elif isinstance(command, _ModuleCommand):
+                blockNames[CommandScope.MODULE] = argumentValues['moduleName']
+            lineContexts[lineno] = (blockNames[CommandScope.GROUP],
+                blockNames[CommandScope.MODULE])
+
+            for scope, outerScope in transitionsAfter:
+                if outerScope is None:
+                    blockNames[scope] = None
+        return lineContexts
+
+    def _iterate_program(self, iterator, jobs=1, workers=None,
+        resumption=None):
+        """Iterate the formula's compiled program.
+
+        This is a template method, whose behavior can be influenced by
+        ExecutionPlanIterator implementations. If jobs is greater than one,
+        consecutive module blocks within a group are iterated in parallel by
+        at most the given number of workers. If a worker pool is given,
+        module blocks within groups are executed by its remote workers
+        instead. A resumption is a tuple of a program index and an iterator.
+        The instructions before the index are iterated by the given iterator
+        to rebuild the variable stacks, before the iteration continues from
+        the index.
+        """
+
+        self._setup_variable_stack()
+
+        # Iterator: Pass formula file and target directory
+        iterator.set_formula_file(self._formulaFile)
+        iterator.set_target_directory(os.path.realpath(self._targetDirectory))
+
+        programIndex = 0
+        if resumption:
+            programIndex, replayIterator = resumption
+            for index in range(programIndex):
+                self._iterate_instruction(replayIterator, self._program[index],
+                    index)
+
+        checkpoints = self._checkpoint_indexes()
+        while programIndex < len(self._program):
+            # Iterator: Pass checkpoint
+            if programIndex in checkpoints:
+                iterator.checkpoint(programIndex)
+
+            moduleBlocks = self._parallel_module_blocks(programIndex) \
+                if jobs > 1 or workers else []
+            if workers and moduleBlocks:
+                self._iterate_module_blocks_remotely(iterator, moduleBlocks,
+                    workers)
+                programIndex = moduleBlocks[-1][1]
+            elif len(moduleBlocks) > 1:
+                self._iterate_module_blocks_in_parallel(iterator, moduleBlocks,
+                    jobs)
+                programIndex = moduleBlocks[-1][1]
+            else:
+                self._iterate_instruction(iterator, self._program[programIndex],
+                    programIndex)
+                programIndex += 1
+
+        # Iterator: Complete pending work
+        iterator.flush()
+        iterator.checkpoint(len(self._program))
+
+    def _checkpoint_indexes(self):
+        """Determine the indexes of the instructions before which no module
+        is open.
+
+        Modules that end before an instruction are exited by the first scope
+        transitions of the instruction.
+        """
+
+        checkpoints = set()
+        openModules = 0
+        for index, (_, _, _, transitionsBefore, _, transitionsAfter) in \
+            enumerate(self._program):
+            for scope, outerScope in transitionsBefore:
+                if scope == CommandScope.MODULE and outerScope is None:
+                    openModules -= 1
+            if not openModules:
+                checkpoints.add(index)
+            for scope, outerScope in transitionsBefore:
+                if scope == CommandScope.MODULE and outerScope is not None:
+                    openModules += 1
+            for scope, outerScope in transitionsAfter:
+                if scope == CommandScope.MODULE and outerScope is None:
+                    openModules -= 1
+        return checkpoints
+
+    def _iterate_instruction(self, iterator, instruction, programIndex):
+        """Iterate a single instruction of the program."""
+
+        (lineno, command, argumentValues, transitionsBefore, scope,
+            transitionsAfter) = instruction
+        # Iterator: Pass program index and line number
+        iterator.set_program_index(programIndex)
+        iterator.set_lineno(lineno)
+
+        # For each command to be iterated, create a fresh instance. That is,
+        # commands are always considered stateless.
+        newCommandInstance = command.new_instance()
+
+        # Iterator: Pass command instance
+        iterator.set_command(newCommandInstance)
+        # Iterator: Pass command's argument values
+        iterator.set_argument_values(argumentValues)
+        # Iterator: Pass current scope
+        iterator.after_scope_set(scope)
+
+        self._apply_scope_transitions(transitionsBefore, iterator)
+        scopeVariables = self._visibleVariables[scope]
+        # Iterator: Pass current scope's variables
+        iterator.after_variable_stack_preparation(scopeVariables)
+
+        # Put provided variables of a command on the current scope's variable
+        # stack
+        for v in newCommandInstance.get_provided_variables():
+            scopeVariables[v.get_name()] = \
+                iterator.get_provided_variable_value(v.get_name())
+
+        iterator.after_provided_variables_on_stack(scopeVariables)
+
+        self._apply_scope_transitions(transitionsAfter, iterator)
+
+    def _parallel_module_blocks(self, programIndex):
+        """Determine the module blocks that may be iterated in parallel.
+
+        Module blocks are candidates for parallel iteration, if they directly
+        follow each other within a group and do not contain further nested
+        blocks. The method returns a list of (start index, end index) tuples
+        of the candidate blocks in the program. End indexes are exclusive.
+        """
+
+        moduleEntry = (CommandScope.MODULE, CommandScope.GROUP)
+        moduleExit = (CommandScope.MODULE, None)
+
+        blocks = []
+        blockStart = programIndex
+        expectedTransitions = (moduleEntry,)
+        while blockStart < len(self._program) and \
+            self._program[blockStart][3] == expectedTransitions:
+            # A module block ends with the next instruction that has scope
+            # transitions, which must start with leaving the module
+            blockEnd = blockStart + 1
+            while blockEnd < len(self._program) and \
+                not self._program[blockEnd][3]:
+                blockEnd += 1
+            if blockEnd < len(self._program) and \
+                self._program[blockEnd][3][0] != moduleExit:
+                break
+
+            blocks.append((blockStart, blockEnd))
+            blockStart = blockEnd
+            expectedTransitions = (moduleExit, moduleEntry)
+        return blocks
+
+    def _iterate_module_blocks_in_parallel(self, iterator, moduleBlocks, jobs):
+        """Iterate the given module blocks in parallel.
+
+        Each worker receives its own copy of the variable stacks, as well as
+        its own copy of the iterator. The output of a module block, including
+        the output of the processes it runs, is buffered and written after the
+        blocks preceding it, so that the output equals that of a sequential
+        iteration. If the iteration of a block fails, the block cancels the
+        remaining blocks, i.e., running blocks stop before their next
+        instruction and queued blocks are not started. The output of the
+        blocks up to the failing one is written and its error is re-raised.
+        """
+
+        # Pending work of the iterator must not be copied to the workers
+        iterator.flush()
+
+        workers = []
+        for blockStart, blockEnd in moduleBlocks:
+            (lineno, command, argumentValues, transitionsBefore, scope,
+                transitionsAfter) = self._program[blockStart]
+            # Enter the module on the main stacks. Workers continue from a copy
+            # of the resulting stacks, so that the transitions must not be
+            # applied again.
+            self._apply_scope_transitions(transitionsBefore, iterator)
+            blockInstructions = [(lineno, command, argumentValues, (), scope,
+                transitionsAfter)]
+            blockInstructions.extend(self._program[blockStart+1:blockEnd])
+            workers.append((self._copy_for_worker(), copy.copy(iterator),
+                blockInstructions, blockStart, io.StringIO()))
+
+        cancelled = threading.Event()
+        # Nested parallel iterations, e.g., within executions on several
+        # target directories, share the output of the outermost iteration
+        redirected = not isinstance(sys.stdout, _ThreadLocalOutput)
+        if redirected:
+            sys.stdout = _ThreadLocalOutput(sys.stdout)
+        output = sys.stdout
+        stream = output.get_thread_stream()
+        try:
+            with ThreadPoolExecutor(max_workers=jobs) as pool:
+                futures = [(pool.submit(worker._iterate_module_block,
+                    workerIterator, blockInstructions, blockStart, buffer,
+                    output, cancelled), buffer)
+                    for worker, workerIterator, blockInstructions, blockStart,
+                    buffer in workers]
+                for future, buffer in futures:
+                    try:
+                        future.result()
+                    except BaseException:
+                        cancelled.set()
+                        for f, _ in futures:
+                            f.cancel()
+                        raise
+                    finally:
+                        stream.write(buffer.getvalue())
+                        stream.flush()
+        finally:
+            if redirected:
+                sys.stdout = output.get_stream()
+
+    def _iterate_module_blocks_remotely(self, iterator, moduleBlocks, workers):
+        """Execute the given module blocks on the workers of a worker pool.
+
+        Each block is sent with the variables that are visible within its
+        module, so that the workers need not know the rest of the program.
+        Variables provided within the blocks are only visible within their
+        modules. Hence, they need not be put on the variable stacks, but are
+        only passed to the iterator.
+        """
+
+        # Pending work of the iterator must be completed before the blocks
+        iterator.flush()
+
+        blocks = []
+        for blockStart, blockEnd in moduleBlocks:
+            (_, _, argumentValues, transitionsBefore, _, _) = \
+                self._program[blockStart]
+            self._apply_scope_transitions(transitionsBefore, iterator)
+            blocks.append((argumentValues['moduleName'],
+                dict(self._visibleVariables[CommandScope.MODULE]),
+                [(lineno, command.get_name(), argumentValues)
+                    for (lineno, command, argumentValues, _, _, _)
+                    in self._program[blockStart:blockEnd]]))
+        providedVariables = workers.execute_blocks(self._formulaFile, blocks)
+
+        # Iterator: Pass the variables provided by the remotely executed
+        # commands
+        for (blockStart, blockEnd), blockVariables in zip(moduleBlocks,
+            providedVariables):
+            for index in range(blockStart, blockEnd):
+                lineno, command = self._program[index][:2]
+                iterator.set_program_index(index)
+                iterator.set_lineno(lineno)
+                iterator.after_remote_execution(command.get_name(),
+                    {v.get_name(): blockVariables.get(v.get_name())
+                    for v in command.get_provided_variables()})
+
+        # Blocks that end the formula also close the enclosing scopes
+        self._apply_scope_transitions(self._program[moduleBlocks[-1][1] - 1][5],
+            iterator)
+
+    def _copy_for_worker(self):
+        """Copy the execution plan for a worker of a parallel iteration.
+
+        The copy shares the compiled program, but has its own variable stack.
+        Variables of outer scopes are shared, as they are only read from
+        within module blocks (cf. ScopeVariables).
+        """
+
+        worker = copy.copy(self)
+        worker._visibleVariables = dict(self._visibleVariables)
+        return worker
+
+    def _iterate_module_block(self, iterator, blockInstructions, blockStart,
+        buffer, output, cancelled):
+        """Iterate the instructions of a module block within a worker.
+
+        The block starts at the given index of the program. If the iteration
+        fails, the other blocks are cancelled.
+        """
+
+        output.redirect_thread(buffer)
+        try:
+            for index, instruction in enumerate(blockInstructions, blockStart):
+                if cancelled.is_set():
+                    iterator.discard()
+                    return
+                self._iterate_instruction(iterator, instruction, index)
+            iterator.flush()
+        except BaseException:
+            cancelled.set()
+            iterator.discard()
+            raise
+
+    def _setup_variable_stack(self):
+        """Setup variable stack per possible scope."""
+
+        self._visibleVariables = {
+            CommandScope.GLOBAL: ScopeVariables(),
+            CommandScope.GROUP: ScopeVariables(),
+            CommandScope.MODULE: ScopeVariables()
+        }
+
+    def _apply_scope_transitions(self, transitions, iterator=None):
+        """Apply scope transitions to the variable stack.
+
+        Entering a scope layers a fresh variable stack on the variables of the
+        outer scope. Exiting a scope removes its variables from the stack.
+        """
+
+        for scope, outerScope in transitions:
+            if outerScope is not None:
+                self._visibleVariables[scope] = ScopeVariables(
+                    self._visibleVariables[outerScope]
+                )
+            else:
+                self._visibleVariables[scope] = ScopeVariables()
+                # Iterator: Pass exited scope
+                if iterator is not None:
+                    iterator.after_scope_exit(scope)
+
+    def execute(self, jobs=1, batch=False, options=None, workspace=None,
+        workers=None, journal=None, resume=False, skipApplied=True,
+        sharedPrefix=None):
+        """Execute the execution plan.
+
+        The jobs argument determines the number of module blocks within a
+        group that may be executed in parallel. The batch flag enables batched
+        execution of commands that support it (cf. Command.batch_key()). The
+        options are passed to each command (cf. Command.get_option()). The
+        workspace determines how commands access files and run processes
+        (default: directly). Its changes are committed after a successful
+        execution and rolled back after a failed one. If a worker pool is
+        given, module blocks within groups are executed by its workers on
+        their own target directories. Their changes are committed or rolled
+        back by the workers per module block.
+
+        If a journal is given, the completed lines are recorded in it, and
+        the changes are committed at checkpoints between modules. A failed
+        execution then only rolls back the changes since the last checkpoint
+        and may be resumed from it.
+
+        If skipApplied is True, commands whose effect is already applied are
+        skipped (cf. Command.is_applied()).
+
+        If a shared prefix is given (cf. execute_interactive_prefix()), its
+        instructions are not executed again, but their recorded provided
+        variables are restored. A shared prefix cannot be combined with a
+        journal.
+        """
+
+        resumption = None
+        if journal and resume:
+            resumption = self._resume_journal(journal)
+        elif journal:
+            journal.start(self._journal_header())
+        elif sharedPrefix:
+            prefixEnd, entries = sharedPrefix
+            replayIterator = _JournalReplayIterator(entries)
+            replayIterator.set_formula_file(self._formulaFile)
+            resumption = (prefixEnd, replayIterator)
+
+        with _trace(self._tracer, 'preflight'):
+            self._preflight(resumption[0] if resumption else 0)
+
+        workspace = workspace or Workspace()
+        try:
+            self._iterate_program(ExecutionPlanExecutor(batch, options,
+                workspace, self._tracer, self._targetIndex, journal,
+                skipApplied), jobs, workers, resumption)
+        except BaseException as e:
+            if _is_successful_exit(e):
+                workspace.commit()
+            else:
+                workspace.rollback()
+            raise
+        workspace.commit()
+
+    def execute_interactive_prefix(self, options=None):
+        """Execute the interactive commands at the start of the program once
+        for the execution on several target directories.
+
+        Interactive commands read from the standard input (cf.
+        Command.is_interactive()), which the concurrent executions on several
+        target directories cannot share. Hence, the interactive commands
+        before the first other line of the formula, e.g., ask_for_version, are
+        executed only once, and the target directories share their provided
+        variables. Returns the shared prefix for execute() as a tuple of the
+        number of executed instructions and the recorded provided variables per
+        instruction. Raises a ValueError, if there are interactive commands
+        after the prefix.
+        """
+
+        prefixEnd = 0
+        while prefixEnd < len(self._program) and \
+            self._program[prefixEnd][4] == CommandScope.GLOBAL and \
+            self._program[prefixEnd][1].is_interactive():
+            prefixEnd += 1
+        for lineno, command, _, _, _, _ in self._program[prefixEnd:]:
+            if command.is_interactive():
+                raise ValueError('Line %d: Command "%s" reads from the ' \
+                    'standard input and must precede all other lines, when ' \
+                    'the formula is executed on several target directories ' \
+                    '(formula "%s")' % (lineno, command.get_name(),
+                    self._formulaFile))
+
+        self._setup_variable_stack()
+        iterator = ExecutionPlanExecutor(options=options)
+        iterator.set_formula_file(self._formulaFile)
+        iterator.set_target_directory(None)
+        globalVariables = self._visibleVariables[CommandScope.GLOBAL]
+        entries = {}
+        for index, instruction in enumerate(self._program[:prefixEnd]):
+            self._iterate_instruction(iterator, instruction, index)
+            entries[index] = {'variables': {v.get_name():
+                globalVariables[v.get_name()]
+                for v in instruction[1].get_provided_variables()}}
+        iterator.flush()
+        return (prefixEnd, entries)
+
+    def _journal_header(self):
+        """Determine the header of the journal of the execution plan.
+
+        The header identifies the program and the target directory.
+        """
+
+        programHash = hashlib.sha256(json.dumps([(lineno, command.get_name(),
+            argumentValues) for lineno, command, argumentValues, _, _, _
+            in self._program]).encode('utf-8')).hexdigest()
+        return {'version': _VERSION, 'program': programHash,
+            'targetDirectory': os.path.realpath(self._targetDirectory)}
+
+    def _resume_journal(self, journal):
+        """Resume the given journal.
+
+        Returns the resumption for the iteration of the program (cf.
+        _iterate_program()).
+        """
+
+        resumeIndex, entries = journal.resume(self._journal_header())
+        if resumeIndex >= len(self._program):
+            print('Journal "%s" records a completed execution. Nothing to ' \
+                'resume.' % journal.get_file())
+        elif resumeIndex > 0:
+            print('Resuming from line %d.' % self._program[resumeIndex][0])
+        replayIterator = _JournalReplayIterator(entries)
+        replayIterator.set_formula_file(self._formulaFile)
+        return (resumeIndex, replayIterator)
+
+    def _preflight(self, startIndex=0):
+        """Check that the module directories and the files required by the
+        commands exist (cf. Command.required_files()).
+
+        The check is based on the target directory index and starts at the
+        given program index, before which no module may be open. It raises a
+        ValueError that lists all missing directories and files. Repeated
+        blocks of module patterns are reported once.
+        """
+
+        targetDirectory = os.path.realpath(self._targetDirectory)
+        modules = []
+        missingModules = set()
+        missing = []
+        for (lineno, command, argumentValues, transitionsBefore, _,
+            transitionsAfter) in self._program[startIndex:]:
+            self._exit_modules(modules, transitionsBefore)
+            if isinstance(command, _ModuleCommand):
+                module = argumentValues['moduleName']
+                modules.append(module)
+                if not self._targetIndex.is_directory(os.path.join(
+                    targetDirectory, module)):
+                    missingModules.add(module)
+                    missing.append('Line %d: Module directory "%s" does ' \
+                        'not exist' % (lineno, module))
+            elif not modules or modules[-1] not in missingModules:
+                missing.extend('Line %d: Command "%s" requires file "%s", ' \
+                    'which does not exist' % (lineno, command.get_name(),
+                    os.path.relpath(os.path.join(targetDirectory, f),
+                        targetDirectory))
+                    for f in self._missing_required_files(command,
+                        argumentValues, targetDirectory, modules))
+            self._exit_modules(modules, transitionsAfter)
+
+        if missing:
+            raise ValueError('Preflight check of target directory "%s" ' \
+                'failed: %s (formula "%s")' % (self._targetDirectory,
+                '; '.join(dict.fromkeys(missing)), self._formulaFile))
+
+    def _exit_modules(self, modules, transitions):
+        """Remove exited modules from a stack of module names.
+
+        Modules that were entered before the start of the check are not on
+        the stack.
+        """
+
+        for scope, outerScope in transitions:
+            if scope == CommandScope.MODULE and outerScope is None and modules:
+                modules.pop()
+
+    def _missing_required_files(self, command, argumentValues,
+        targetDirectory, modules):
+        """Determine the files required by a command that do not exist."""
+
+        command = command.new_instance()
+        command.set_target_directory(targetDirectory)
+        command.set_target_index(self._targetIndex)
+        scopeVariables = ScopeVariables()
+        if modules:
+            scopeVariables['module'] = modules[-1]
+        command.set_scope_variables(scopeVariables)
+        return [f for f in command.required_files(argumentValues)
+            if not self._targetIndex.is_file(os.path.join(targetDirectory, f))]
+
+    @classmethod
+    def for_module_block(cls, commands, formulaFile, targetDirectory, lines,
+        targetIndex=None):
+        """Create an execution plan for a module block of another plan.
+
+        The lines of the block are (line number, command name, argument values
+        dict) tuples, starting with the module command. The block is expected
+        to have been validated as part of the other plan. The index of the
+        target directory may be shared by several plans.
+        """
+
+        plan = cls.__new__(cls)
+        plan._commands = commands
+        plan._formulaFile = formulaFile
+        plan._targetDirectory = targetDirectory
+        plan._targetIndex = targetIndex or TargetDirectoryIndex(
+            targetDirectory)
+        plan._tracer = None
+        plan._program = CompiledProgram()
+        for lineno, commandName, argumentValues in lines:
+            try:
+                command = commands.get_command(commandName)
+            except KeyError:
+                raise ValueError('Line %d: Unkown command "%s" (formula ' \
+                    '"%s")' % (lineno, commandName, formulaFile))
+            plan._program.append((lineno, command, argumentValues, (),
+                CommandScope.MODULE, ()))
+        return plan
+
+    def execute_module_block(self, variables, batch=False, options=None,
+        workspace=None, skipApplied=True):
+        """Execute an execution plan for a module block.
+
+        The given variables are those visible within the module in the other
+        plan. Returns the variables provided by the commands of the block and
+        their values.
+        """
+
+        self._preflight()
+
+        workspace = workspace or Workspace()
+        iterator = ExecutionPlanExecutor(batch, options, workspace,
+            targetIndex=self._targetIndex, skipApplied=skipApplied)
+        iterator.set_formula_file(self._formulaFile)
+        iterator.set_target_directory(os.path.realpath(self._targetDirectory))
+
+        self._setup_variable_stack()
+        self._visibleVariables[CommandScope.GROUP].update(variables)
+        self._apply_scope_transitions([(CommandScope.MODULE,
+            CommandScope.GROUP)])
+        try:
+            for index, instruction in enumerate(self._program):
+                self._iterate_instruction(iterator, instruction, index)
+            iterator.flush()
+        except BaseException as e:
+            if _is_successful_exit(e):
+                workspace.commit()
+            else:
+                workspace.rollback()
+            raise
+        workspace.commit()
+
+        moduleVariables = self._visibleVariables[CommandScope.MODULE]
+        return {v.get_name(): moduleVariables[v.get_name()]
+            for _, command, _, _, _, _ in self._program
+            for v in command.get_provided_variables()}
+
+class MultiTargetExecution:
+    """Executes an execution plan on several target directories.
+
+    The plan is compiled once and copied for each target directory (cf.
+    ExecutionPlan.for_target_directory()). Target directories are executed
+    concurrently by a bounded number of threads, each with its own workspace.
+    A failing target directory rolls back its own changes, but does not
+    affect the others. The output of each target directory is buffered and
+    written in the order of the target directories.
+    """
+
+    def __init__(self, plan, targetDirectories):
+        """Constructor."""
+
+        self._plan = plan
+        self._targetDirectories = targetDirectories
+
+    def execute(self, targetJobs=1, jobs=1, batch=False, options=None,
+        dryRun=False, skipApplied=True):
+        """Execute the plan on all target directories.
+
+        At most targetJobs target directories are executed at the same time.
+        The other arguments apply to the execution on each target directory
+        (cf. ExecutionPlan.execute()). Interactive commands at the start of
+        the formula are executed once beforehand (cf.
+        ExecutionPlan.execute_interactive_prefix()). Returns a list of (target
+        directory, error message, exit code) tuples in the order of the target
+        directories.
+        """
+
+        sharedPrefix = self._plan.execute_interactive_prefix(options)
+        redirected = not isinstance(sys.stdout, _ThreadLocalOutput)
+        if redirected:
+            sys.stdout = _ThreadLocalOutput(sys.stdout)
+        output = sys.stdout
+        stream = output.get_thread_stream()
+        results = []
+        try:
+            with ThreadPoolExecutor(max_workers=targetJobs) as pool:
+                futures = [(pool.submit(self._execute_target, targetDirectory,
+                    buffer, output, jobs, batch, options, dryRun, skipApplied,
+                    sharedPrefix), targetDirectory, buffer)
+                    for targetDirectory, buffer in ((t, io.StringIO())
+                    for t in self._targetDirectories)]
+                for future, targetDirectory, buffer in futures:
+                    error, exitCode = future.result()
+                    stream.write('=== Target directory "%s" ===\n%s' % \
+                        (targetDirectory, buffer.getvalue()))
+                    stream.flush()
+                    results.append((targetDirectory, error, exitCode))
+        finally:
+            if redirected:
+                sys.stdout = output.get_stream()
+        return results
+
+    def _execute_target(self, targetDirectory, buffer, output, jobs, batch,
+        options, dryRun, skipApplied, sharedPrefix):
+        """Execute the plan on a target directory within a thread.
+
+        Returns the error message and the exit code of the execution.
+        """
+
+        output.redirect_thread(buffer)
+        if dryRun:
+            workspace = DryRunWorkspace(targetDirectory)
+        else:
+            workspace = TransactionalWorkspace()
+        try:
+            plan = self._plan.for_target_directory(targetDirectory)
+            plan.execute(jobs, batch, options, workspace,
+                skipApplied=skipApplied, sharedPrefix=sharedPrefix)
+            if dryRun:
+                workspace.print_changes()
+        except SystemExit as e:
+            if dryRun and _is_successful_exit(e):
+                workspace.print_changes()
+            return (None, e.code)
+        except Exception as e:
+            return ('An unexpected error occurred: %s.' % \
+                (str(e) or type(e).__name__), None)
+        return (None, None)
+
+    def print_summary(self, results):
+        """Print a summary of the results of an execution.
+
+        Returns True, if the execution succeeded on all target directories.
+        """
+
+        print('Summary of %d target directories:' % len(results))
+        succeeded = True
+        for targetDirectory, error, exitCode in results:
+            if error:
+                status = 'FAILED (%s)' % error
+            elif exitCode:
+                status = 'FAILED (exit code %s)' % exitCode
+            elif exitCode is not None:
+                status = 'STOPPED'
+            else:
+                status = 'DONE'
+            succeeded = succeeded and not error and not exitCode
+            print('  %s: %s' % (targetDirectory, status))
+        return succeeded
+
+class ExecutionPlanCache:
+    """Persistent cache for compiled execution plans.
+
+    Cached plans are keyed by the content of their formula, a hash of the
+    available commands, and the version and a hash of the source code of
+    corollary. Hence, a plan is reused only if its parsing and validation
+    would yield the same result.
+    """
+
+    # Version of the compiled program structure. Needs to be increased, when
+    # the structure or the placement of scope transitions changes.
+    _FORMAT_VERSION = 2
+
+    def __init__(self, cacheDirectory, commands):
+        """Constructor."""
+
+        self._cacheDirectory = cacheDirectory
+        self._commands = commands
+        self._commandsHash = commands.get_registry_hash()
+        self._sourceHash = _source_hash()
+
+    def _cache_file(self, formula):
+        """Determine the cache file for the given formula."""
+
+        key = '%s\n%s\n%d\n%s\n%s\n%s' % (_NAME, _VERSION,
+            self._FORMAT_VERSION, self._sourceHash, self._commandsHash,
+            formula.get_content_hash())
+        keyHash = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return os.path.join(self._cacheDirectory, keyHash + '.json')
+
+    def load(self, formula):
+        """Load the cached program of the execution plan for the given formula.
+
+        Returns None, if there is no usable cached program.
+        """
+
+        try:
+            with open(self._cache_file(formula), 'r') as fd:
+                cachedProgram = json.load(fd)
+            return CompiledProgram((lineno, self._commands.get_command(name),
+                argumentValues, self._load_transitions(transitionsBefore),
+                CommandScope[scope], self._load_transitions(transitionsAfter))
+                for lineno, name, argumentValues, transitionsBefore, scope,
+                    transitionsAfter in cachedProgram)
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _load_transitions(self, transitions):
+        """Load cached scope transitions."""
+
+        return tuple((CommandScope[scope],
+            CommandScope[outerScope] if outerScope else None)
+            for scope, outerScope in transitions)
+
+    def store(self, formula, program):
+        """Store the program of the execution plan for the given formula.
+
+        Failures to store the program are ignored, as the cache is optional.
+        """
+
+        cachedProgram = [(lineno, command.get_name(), argumentValues,
+            self._store_transitions(transitionsBefore), scope.name,
+            self._store_transitions(transitionsAfter))
+            for lineno, command, argumentValues, transitionsBefore, scope,
+                transitionsAfter in program]
+        cacheFile = self._cache_file(formula)
+        try:
+            os.makedirs(self._cacheDirectory, exist_ok=True)
+            temporaryFile = '%s.%d.tmp' % (cacheFile, os.getpid())
+            with open(temporaryFile, 'w') as fd:
+                json.dump(cachedProgram, fd)
+            os.replace(temporaryFile, cacheFile)
+        except OSError as e:
+            logging.getLogger().warning('Could not cache execution plan in ' \
+                '"%s": %s' % (cacheFile, str(e)))
+
+    def _store_transitions(self, transitions):
+        """Prepare scope transitions for caching."""
+
+        return [(scope.name, outerScope.name if outerScope else None)
+            for scope, outerScope in transitions]
+
+class ExecutionPlanMemoryCache:
+    """In-memory cache for compiled execution plans of a long-running process
+    (cf. ExecutionDaemon).
+
+    Cached plans are keyed by the file and content of their formula. The
+    cache must be cleared when the commands change. Cached programs are
+    shared, as compiled programs are not modified after their compilation.
+    """
+
+    def __init__(self):
+        """Constructor."""
+
+        self._programs = {}
+
+    def _key(self, formula):
+        """Determine the key of the given formula."""
+
+        return (os.path.realpath(formula.get_file()),
+            formula.get_content_hash())
+
+    def load(self, formula):
+        """Load the cached program of the execution plan for the given formula.
+
+        Returns None, if there is no cached program.
+        """
+
+        return self._programs.get(self._key(formula))
+
+    def store(self, formula, program):
+        """Store the program of the execution plan for the given formula."""
+
+        self._programs[self._key(formula)] = program
+
+    def clear(self):
+        """Remove all cached programs."""
+
+        self._programs = {}
+
+class TargetDirectoryIndex:
+    """Index of the directories and files within a target directory.
+
+    The index is built by a single walk of the target directory on first use.
+    It lets an execution plan expand module patterns and check for required
+    files, and commands query modules' files, without scattered calls to
+    os.stat() (cf. Command.get_target_index()). The index reflects the target
+    directory before the execution of a formula.
+
+    Module patterns use slashes as separators and may contain the wildcards
+    "*" (any characters within a path segment), "?" (any single character),
+    "[...]" (any of the given characters), and "**" (any number of path
+    segments). Directories that match a pattern are modules. If the last
+    segment of a pattern is a literal file name, e.g., "**/pom.xml", the
+    directories of the matching files are modules, too. Hidden directories
+    and files, i.e., those whose names start with a dot, never match.
+    """
+
+    _WILDCARD_REGEX = re.compile('[*?[]')
+
+    _MANIFEST = 'META-INF/MANIFEST.MF'
+
+    def __init__(self, targetDirectory):
+        """Constructor."""
+
+        self._targetDirectory = targetDirectory
+        self._realTargetDirectory = os.path.realpath(targetDirectory)
+        self._paths = None
+        self._entries = None
+        self._moduleFiles = None
+
+    @classmethod
+    def is_pattern(cls, moduleName):
+        """Check if a module name is a pattern."""
+
+        return cls._WILDCARD_REGEX.search(moduleName) is not None
+
+    def get_entries(self):
+        """Get the indexed entries of the target directory that are not
+        hidden.
+
+        Returns a sorted list of (relative path, is directory) tuples. Paths
+        are separated by slashes.
+        """
+
+        if self._entries is None:
+            self._entries = sorted((path, isDirectory)
+                for path, isDirectory in self._get_paths().items()
+                if not any(s.startswith('.') for s in path.split('/')))
+        return self._entries
+
+    def _get_paths(self):
+        """Get a dict that maps the indexed relative paths to flags, which
+        tell whether the paths are directories."""
+
+        if self._paths is None:
+            self._paths = self._walk()
+        return self._paths
+
+    def _walk(self):
+        """Walk the target directory with os.scandir().
+
+        Hidden directories and symbolic links to directories are indexed, but
+        not walked. Directories that cannot be read are skipped.
+        """
+
+        paths = {}
+        directories = ['']
+        while directories:
+            directory = directories.pop()
+            try:
+                with os.scandir(os.path.join(self._targetDirectory,
+                    directory)) as directoryEntries:
+                    for entry in directoryEntries:
+                        path = directory + entry.name
+                        isDirectory = entry.is_dir()
+                        paths[path] = isDirectory
+                        if isDirectory and not entry.is_symlink() and \
+                            not entry.name.startswith('.'):
+                            directories.append(path + '/')
+            except OSError:
+                continue
+        return paths
+
+    def _relative_path(self, path):
+        """Determine the indexed relative path of a path.
+
+        Relative paths are resolved against the target directory. Returns
+        None, if the path cannot be indexed, e.g., because it lies outside of
+        the target directory or within a hidden directory.
+        """
+
+        relativePath = os.path.relpath(os.path.join(self._realTargetDirectory,
+            path), self._realTargetDirectory).replace(os.sep, '/')
+        if relativePath == os.curdir:
+            return relativePath
+
+        segments = relativePath.split('/')
+        if segments[0] == os.pardir or \
+            any(s.startswith('.') for s in segments[:-1]):
+            return None
+        return relativePath
+
+    def is_directory(self, path):
+        """Check if a path is a directory."""
+
+        relativePath = self._relative_path(path)
+        if relativePath is None:
+            return os.path.isdir(os.path.join(self._targetDirectory, path))
+        return relativePath == os.curdir or \
+            self._get_paths().get(relativePath) is True
+
+    def is_file(self, path):
+        """Check if a path is a file."""
+
+        relativePath = self._relative_path(path)
+        if relativePath is None:
+            return os.path.isfile(os.path.join(self._targetDirectory, path))
+        return self._get_paths().get(relativePath) is False
+
+    def get_module_files(self, moduleDirectory):
+        """Get the well-known files of a module.
+
+        Well-known files are POMs (pom.xml), OSGi manifests
+        (META-INF/MANIFEST.MF), and properties files (*.properties). Returns a
+        sorted list of the files' paths relative to the module directory.
+        """
+
+        relativePath = self._relative_path(moduleDirectory)
+        if relativePath is None:
+            return self._scan_module_files(os.path.join(self._targetDirectory,
+                moduleDirectory))
+
+        if self._moduleFiles is None:
+            self._moduleFiles = self._map_module_files()
+        return self._moduleFiles.get(relativePath, [])
+
+    def _map_module_files(self):
+        """Map the relative paths of directories to their well-known files."""
+
+        moduleFiles = {}
+        for path, isDirectory in self._get_paths().items():
+            if isDirectory:
+                continue
+
+            directory, _, name = path.rpartition('/')
+            if path == self._MANIFEST or path.endswith('/' + self._MANIFEST):
+                directory = directory.rpartition('/')[0]
+                name = self._MANIFEST
+            elif not self._is_module_file(name):
+                continue
+            moduleFiles.setdefault(directory or os.curdir, []).append(name)
+
+        for files in moduleFiles.values():
+            files.sort()
+        return moduleFiles
+
+    def _scan_module_files(self, moduleDirectory):
+        """Determine the well-known files of a module that is not indexed."""
+
+        try:
+            with os.scandir(moduleDirectory) as directoryEntries:
+                moduleFiles = [e.name for e in directoryEntries
+                    if self._is_module_file(e.name) and e.is_file()]
+        except OSError:
+            return []
+        if os.path.isfile(os.path.join(moduleDirectory, self._MANIFEST)):
+            moduleFiles.append(self._MANIFEST)
+        return sorted(moduleFiles)
+
+    def _is_module_file(self, name):
+        """Check if a file name is that of a well-known file directly within
+        module directories."""
+
+        return name == 'pom.xml' or name.endswith('.properties')
+
+    def match_modules(self, pattern):
+        """Get the sorted relative paths of the modules matching a pattern."""
+
+        segments = [s for s in pattern.split('/') if s and s != os.curdir]
+        regex = self._pattern_regex(segments)
+        includeFiles = bool(segments) and not self.is_pattern(segments[-1])
+
+        modules = set()
+        for path, isDirectory in self.get_entries():
+            if not regex.fullmatch(path):
+                continue
+            elif isDirectory:
+                modules.add(path)
+            elif includeFiles:
+                modules.add(path.rpartition('/')[0] or os.curdir)
+        return sorted(modules)
+
+    def _pattern_regex(self, segments):
+        """Translate the segments of a module pattern into a regex."""
+
+        regex = ''
+        for i, segment in enumerate(segments):
+            lastSegment = i == len(segments) - 1
+            if segment == '**':
+                regex += '.*' if lastSegment else '(?:[^/]+/)*'
+                continue
+
+            position = 0
+            while position < len(segment):
+                char = segment[position]
+                position += 1
+                if char == '*':
+                    regex += '[^/]*'
+                elif char == '?':
+                    regex += '[^/]'
+                elif char == '[' and ']' in segment[position+1:]:
+                    end = segment.index(']', position + 1)
+                    characters = segment[position:end]
+                    if characters.startswith('!'):
+                        characters = '^' + characters[1:]
+                    regex += '[%s]' % characters.replace('\\', '\\\\')
+                    position = end + 1
+                else:
+                    regex += re.escape(char)
+            if not lastSegment:
+                regex += '/'
+        return re.compile(regex)
+
+class ExecutionPlanIterator(ABC):
+    """Abstract baseclass for execution plan iterators."""
+
+    def after_scope_set(self, currentScope):
+        """Callback: Current scope was determined."""
+
+        pass
+
+    def after_variable_stack_preparation(self, scopeVariables):
+        """Callback: The variable stack for the current scope was prepared."""
+
+        pass
+
+    def get_provided_variable_value(self, variableName):
+        """Get the value of a provided variable."""
+
+        return None
+
+    def after_provided_variables_on_stack(self, scopeVariables):
+        """Callback: Provided variable values were put on the stack."""
+
+        pass
+
+    def after_scope_exit(self, scope):
+        """Callback: The given scope was exited."""
+
+        pass
+
+    def flush(self):
+        """Callback: Complete pending work, e.g., deferred executions.
+
+        Invoked after the last entry of the execution plan was iterated, after
+        a module block was iterated in parallel, and before module blocks are
+        iterated in parallel.
+        """
+
+        pass
+
+    def discard(self):
+        """Callback: Discard pending work.
+
+        Invoked after the iteration of a module block in parallel failed or
+        was cancelled.
+        """
+
+        pass
+
+    def checkpoint(self, programIndex):
+        """Callback: No module is open before the entry at the given index of
+        the program.
+
+        Invoked with the length of the program after the last entry of the
+        execution plan was iterated and flushed.
+        """
+
+        pass
+
+    def after_remote_execution(self, commandName, providedValues):
+        """Callback: The current entry was executed by a remote worker, which
+        provided the given variable values."""
+
+        pass
+
+    def set_formula_file(self, formulaFile):
+        """Set the execution plan's formula file."""
+
+        self._formulaFile = formulaFile
+
+    def get_formula_file(self):
+        """Get the execution plan's formula file."""
+
+        return self._formulaFile
+
+    def set_program_index(self, programIndex):
+        """Set the program index of the current entry."""
+
+        self._programIndex = programIndex
+
+    def get_program_index(self):
+        """Get the program index of the current entry."""
+
+        return self._programIndex
+
+    def set_lineno(self, lineno):
+        """Set current line number."""
+
+        self._lineno = lineno
+
+    def get_lineno(self):
+        """Get current line number."""
+
+        return self._lineno
+
+    def set_command(self, command):
+        """Set current command."""
+
+        self._command = command
+
+    def get_command(self):
+        """Get current command."""
+
+        return self._command
+
+    def set_argument_values(self, argumentValues):
+        """Set current command's argument values as a dict."""
+
+        self._argumentValues = argumentValues
+
+    def get_argument_values(self):
+        """Get current command's argument values."""
+
+        return self._argumentValues
+
+    def set_target_directory(self, targetDirectory):
+        """Set target directory passed to corollary."""
+
+        self._targetDirectory = targetDirectory
+
+    def get_target_directory(self):
+        """Get the target directory."""
+
+        return self._targetDirectory
+
+class ExecutionPlanExecutor(ExecutionPlanIterator):
+    """An execution plan iterator for command execution."""
+
+    def __init__(self, batch=False, options=None, workspace=None, tracer=None,
+        targetIndex=None, journal=None, skipApplied=True):
+        """Constructor.
+
+        If skipApplied is True, commands whose effect is already applied are
+        skipped (cf. Command.is_applied()).
+        """
+
+        self._batchMode = batch
+        self._skipApplied = skipApplied
+        self._options = options or {}
+        self._workspace = workspace or Workspace()
+        self._tracer = tracer
+        self._targetIndex = targetIndex
+        self._journal = journal
+        self._pendingBatchKey = None
+        self._pendingBatch = None
+        self._pendingBatchLineno = None
+
+    def after_variable_stack_preparation(self, scopeVariables):
+        """Execute the current command."""
+
+        command = self.get_command()
+        command.set_scope_variables(scopeVariables)
+        command.set_target_directory(self.get_target_directory())
+        command.set_options(self._options)
+        command.set_workspace(self._workspace)
+        command.set_target_index(self._targetIndex)
+        argumentValues = self.get_argument_values()
+
+        with _trace(self._tracer, 'execute', self.get_lineno(),
+            command.get_name()):
+            self._execute(command, argumentValues)
+
+    def _execute(self, command, argumentValues):
+        """Execute the given command, unless it is already applied or its
+        execution is deferred."""
+
+        # Skip commands whose effect is already in place, e.g., when a formula
+        # is run again after a failure. Commands are not probed while a batch
+        # is pending, as the batched commands may change the probed files.
+        if self._skipApplied and not self._pendingBatch and \
+            not command.get_provided_variables() and \
+            command.is_applied(argumentValues):
+            print('%s (line %d): Already applied [SKIPPED]' % \
+                (command.get_name(), self.get_lineno()))
+            self._return_values = {}
+            return
+
+        # In batch mode, the execution of the command may be deferred
+        if self._batchMode and self._add_to_batch(command, argumentValues):
+            self._return_values = {}
+            return
+
+        # Execute the command. Built-in commands do not have side effects, so
+        # that they need not wait for the pending batch.
+        if not isinstance(command, BuiltinCommand):
+            self._execute_pending_batch()
+        self._return_values = command.execute(argumentValues) or {}
+
+        # Validate the correct execution of the command based on its
+        # specification
+        self._validate_return_values_type()
+        self._validate_return_and_provided_values_consistency()
+        self._validate_missing_return_values()
+
+    def _add_to_batch(self, command, argumentValues):
+        """Add the execution of a command to the pending batch, if possible.
+
+        Returns True, if the command's execution was deferred.
+        """
+
+        if command.get_provided_variables():
+            return False
+
+        batchKey = command.batch_key(argumentValues)
+        if batchKey is None:
+            return False
+
+        batchKey = (command.get_classname(), batchKey)
+        if self._pendingBatch and self._pendingBatchKey == batchKey:
+            self._pendingBatch.append((command, argumentValues))
+        else:
+            self._execute_pending_batch()
+            self._pendingBatchKey = batchKey
+            self._pendingBatch = [(command, argumentValues)]
+            self._pendingBatchLineno = self.get_lineno()
+        return True
+
+    def _execute_pending_batch(self):
+        """Execute the pending batch of deferred command executions."""
+
+        if not self._pendingBatch:
+            return
+
+        batch = self._pendingBatch
+        self._pendingBatchKey = None
+        self._pendingBatch = None
+        with _trace(self._tracer, 'execute batch', self._pendingBatchLineno,
+            batch[0][0].get_name()) as details:
+            details['batchSize'] = len(batch)
+            batch[0][0].execute_batch(batch)
+
+    def after_provided_variables_on_stack(self, scopeVariables):
+        """Record the completed execution of the current command in the
+        journal."""
+
+        if self._journal:
+            self._journal.add_entry(self.get_program_index(),
+                self.get_lineno(), self.get_command().get_name(),
+                self._return_values, self._workspace.pop_touched_files())
+
+    def after_remote_execution(self, commandName, providedValues):
+        """Record the remote execution of the current command in the
+        journal."""
+
+        if self._journal:
+            self._journal.add_entry(self.get_program_index(),
+                self.get_lineno(), commandName, providedValues, [])
+
+    def checkpoint(self, programIndex):
+        """Commit the changes of the completed modules and record a
+        checkpoint in the journal.
+
+        No checkpoint is recorded while a batch is pending, because the
+        batched commands were not executed yet.
+        """
+
+        if not self._journal or self._pendingBatch:
+            return
+
+        self._workspace.commit()
+        self._journal.checkpoint(programIndex,
+            self._workspace.pop_touched_files())
+
+    def after_scope_exit(self, scope):
+        """Write the documents modified within an exited module."""
+
+        if scope == CommandScope.MODULE:
+            self._workspace.flush_documents()
+
+    def flush(self):
+        """Execute deferred command executions and write modified documents."""
+
+        self._execute_pending_batch()
+        self._workspace.flush_documents()
+
+    def discard(self):
+        """Discard deferred command executions and modified documents.
+
+        Documents that are held by the current thread are released, so that
+        other threads need not wait for them.
+        """
+
+        self._pendingBatchKey = None
+        self._pendingBatch = None
+        self._workspace.discard_documents()
+
+    def _validate_return_values_type(self):
+        """Validate the type of a command's return value.
+
+        Commands are required to return a dict in the form
+        "provided variable name:variable value". That is, a command's return
+        values are equivalent to the variables it specified to provide.
+        """
+
+        if not isinstance(self._return_values, dict):
+            command = self.get_command()
+            raise ValueError('Line %d: Command "%s" is expected to return ' \
+                'provided variables and their values as a dictionary, but ' \
+                'instead returned "%s" of type %s (formula "%s")' % \
+                (self.get_lineno(), command.get_name(), self._return_values,
+                    type(self._return_values).__name__,
+                    self.get_formula_file()))
+
+    def _validate_return_and_provided_values_consistency(self):
+        """Validate consistency of command specification and return values.
+
+        A command must not return more values than it specified to provide
+        variables.
+        """
+
+        command = self.get_command()
+        if self._return_values and not command.get_provided_variables():
+            returnValuesStr = ', '.join(['"%s" (value = %s)' % (str(k), str(v))
+                for k, v in self._return_values.items()])
+            raise ValueError('Line %d: Command "%s" did not promise to ' \
+                'provide variables, but instead returned variables %s ' \
+                '(formula "%s")' % (self.get_lineno(), command.get_name(),
+                returnValuesStr, self.get_formula_file()))
+
+    def _validate_missing_return_values(self):
+        """Validate that no return value is missing.
+
+        A command must return a value for each provided variable it
+        specified.
+        """
+
+        command = self.get_command()
+        missingReturnValues = [v.get_name()
+            for v in command.get_provided_variables()
+            if v.get_name() not in self._return_values
+        ]
+        if missingReturnValues:
+            missingReturnValuesStr = ', '.join('"{0}"'.format(v)
+                for v in missingReturnValues)
+            raise ValueError('Line %d: Command "%s" promised to provide ' \
+                'values for variables %s, but failed to do so ' \
+                '(formula "%s")' % (self.get_lineno(), command.get_name(),
+                missingReturnValuesStr, self.get_formula_file()))
+
+    def get_provided_variable_value(self, variableName):
+        """Get the value of the given provided variable."""
+
+        return self._return_values[variableName]
+
+class _JournalReplayIterator(ExecutionPlanIterator):
+    """An execution plan iterator that replays the provided variable values
+    recorded in a journal, or for a shared prefix of several target
+    directories, instead of executing commands."""
+
+    def __init__(self, entries):
+        """Constructor.
+
+        The entries map program indexes to the recorded journal entries.
+        """
+
+        self._entries = entries
+
+    def get_provided_variable_value(self, variableName):
+        """Get the recorded value of the given provided variable."""
+
+        entry = self._entries.get(self.get_program_index())
+        if entry is None or variableName not in entry['variables']:
+            raise ValueError('Line %d: Journal does not record the value of ' \
+                'variable "%s" provided by command "%s" (formula "%s")' % \
+                (self.get_lineno(), variableName, self.get_command().get_name(),
+                self.get_formula_file()))
+        return entry['variables'][variableName]
+
+class ExecutionJournal:
+    """Journal of the completed lines of an execution plan.
+
+    The journal is a file of JSON records, one per line. The first record
+    identifies the execution plan and its target directory. Each completed
+    line is recorded with its program index, line number, command, provided
+    variable values, and touched files. Lines are written at checkpoints, i.e.,
+    when no module is open and the changes of all completed lines were
+    committed. A checkpoint record stores the program index at which the
+    execution continues and the hashes of the touched files, so that a resumed
+    execution can detect files that were modified in the meantime.
+    """
+
+    def __init__(self, journalFile):
+        """Constructor."""
+
+        self._journalFile = journalFile
+        self._fd = None
+        self._pendingEntries = []
+        self._pendingFiles = set()
+        self._lock = threading.Lock()
+
+    def get_file(self):
+        """Get the journal file."""
+
+        return self._journalFile
+
+    def start(self, header):
+        """Start a new journal with the given header."""
+
+        self._open([{'header': header}])
+
+    def _open(self, records):
+        """Atomically replace the journal file by the given records and open
+        it for appending."""
+
+        self.close()
+        temporaryFile = self._journalFile + '.tmp'
+        with open(temporaryFile, 'w') as fd:
+            for record in records:
+                fd.write(json.dumps(record) + '\n')
+            fd.flush()
+            os.fsync(fd.fileno())
+        os.replace(temporaryFile, self._journalFile)
+        self._fd = open(self._journalFile, 'a')
+
+    def resume(self, header):
+        """Resume the journal of an execution plan with the given header.
+
+        Returns the program index of the last checkpoint and a dict that maps
+        the program indexes of the lines before the checkpoint to their
+        entries. Lines recorded after the last checkpoint are discarded. If
+        the journal does not exist, a new journal is started.
+        """
+
+        if not os.path.exists(self._journalFile):
+            self.start(header)
+            return (0, {})
+
+        records = self._read_records()
+        if not records or records[0].get('header') != header:
+            raise ValueError('Journal "%s" does not belong to the execution ' \
+                'of the formula on target directory "%s". Note that the ' \
+                'formula must not change between executions.' % \
+                (self._journalFile, header['targetDirectory']))
+
+        checkpointIndex = 0
+        checkpointRecords = 1
+        entries = {}
+        fileHashes = {}
+        for recordIndex, record in enumerate(records[1:], 1):
+            if 'checkpoint' in record:
+                checkpointIndex = record['checkpoint']
+                checkpointRecords = recordIndex + 1
+                fileHashes.update(record['files'])
+        for record in records[1:checkpointRecords]:
+            if 'index' in record:
+                entries[record['index']] = record
+
+        modifiedFiles = [filepath for filepath, fileHash in fileHashes.items()
+            if self._hash_file(filepath) != fileHash]
+        if modifiedFiles:
+            raise ValueError('Journal "%s" cannot be resumed, because ' \
+                'files changed since they were recorded: %s' % \
+                (self._journalFile, ', '.join('"%s"' % f
+                for f in sorted(modifiedFiles))))
+
+        self._open(records[:checkpointRecords])
+        return (checkpointIndex, entries)
+
+    def _read_records(self):
+        """Read the records of the journal file.
+
+        A truncated last record, e.g., of an interrupted write, is ignored.
+        """
+
+        records = []
+        with open(self._journalFile, 'r') as fd:
+            lines = fd.read().splitlines()
+        for lineIndex, line in enumerate(lines):
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                if lineIndex < len(lines) - 1:
+                    raise ValueError('Journal "%s" is corrupt in line %d' % \
+                        (self._journalFile, lineIndex + 1))
+        return records
+
+    def _hash_file(self, filepath):
+        """Hash the content of a file. Returns None for missing files."""
+
+        try:
+            with open(filepath, 'rb') as fd:
+                return hashlib.sha256(fd.read()).hexdigest()
+        except FileNotFoundError:
+            return None
+
+    def add_entry(self, programIndex, lineno, commandName, providedValues,
+        touchedFiles):
+        """Add the entry of a completed line.
+
+        The entry is written with the next checkpoint.
+        """
+
+        with self._lock:
+            self._pendingEntries.append({'index': programIndex,
+                'line': lineno, 'command': commandName,
+                'variables': providedValues, 'files': touchedFiles})
+            self._pendingFiles.update(touchedFiles)
+
+    def checkpoint(self, programIndex, touchedFiles=None):
+        """Write the pending entries and a checkpoint at the given program
+        index.
+
+        The given touched files are those that were not attributed to a
+        line, e.g., because they were written by batched commands. The
+        changes of all touched files must have been committed.
+        """
+
+        with self._lock:
+            self._pendingFiles.update(touchedFiles or [])
+            if not self._pendingEntries and not self._pendingFiles:
+                return
+
+            records = sorted(self._pendingEntries, key=lambda e: e['index'])
+            records.append({'checkpoint': programIndex,
+                'files': {f: self._hash_file(f) for f in sorted(
+                self._pendingFiles)}})
+            try:
+                self._fd.write(''.join(json.dumps(record) + '\n'
+                    for record in records))
+            except TypeError as ex:
+                raise ValueError('Journal "%s" cannot record the values of ' \
+                    'provided variables: %s' % (self._journalFile, ex))
+            self._fd.flush()
+            os.fsync(self._fd.fileno())
+            self._pendingEntries = []
+            self._pendingFiles = set()
+
+    def close(self):
+        """Close the journal file."""
+
+        if self._fd is not None:
+            self._fd.close()
+            self._fd = None
+
+class ExecutionTracer:
+    """Records the durations of parsing, validating, and executing the lines
+    of an execution plan.
+
+    For each phase of a line, the tracer records the wall time and the CPU
+    time of the executing thread. The records can be written in the Chrome
+    Trace Event format, e.g., to inspect them in Perfetto.
+    """
+
+    def __init__(self):
+        """Constructor."""
+
+        self._start = time.perf_counter()
+        self._records = []
+        self._lineContexts = {}
+
+    @contextlib.contextmanager
+    def trace(self, phase, lineno=None, commandName=None):
+        """Record the duration of a phase of the given line.
+
+        The context yields a dict of details for the record, which may be
+        complemented within the context.
+        """
+
+        details = {'command': commandName}
+        wallStart = time.perf_counter()
+        cpuStart = time.thread_time()
+        try:
+            yield details
+        finally:
+            cpuEnd = time.thread_time()
+            wallEnd = time.perf_counter()
+            thread = threading.current_thread()
+            self._records.append((phase, lineno, details, thread.ident,
+                thread.name, wallStart, wallEnd, cpuStart, cpuEnd))
+
+    def set_line_contexts(self, lineContexts):
+        """Set the group and module of each line.
+
+        The line contexts are a dict that maps line numbers to (group, module)
+        tuples (cf. ExecutionPlan._line_contexts()).
+        """
+
+        self._lineContexts = lineContexts
+
+    def write(self, traceFile):
+        """Write the records as Chrome Trace Event JSON to the given file."""
+
+        pid = os.getpid()
+        events = []
+        threadNames = {}
+        for (phase, lineno, details, tid, threadName, wallStart, wallEnd,
+            cpuStart, cpuEnd) in self._records:
+            group, module = self._lineContexts.get(lineno, (None, None))
+            arguments = dict(details, line=lineno, group=group,
+                module=module, cpuTimeMs=(cpuEnd - cpuStart) * 1e3)
+            name = details['command'] or phase
+            if module:
+                name += ' (%s)' % module
+            events.append({'name': name, 'cat': phase, 'ph': 'X', 'pid': pid,
+                'tid': tid, 'ts': (wallStart - self._start) * 1e6,
+                'dur': (wallEnd - wallStart) * 1e6, 'tts': cpuStart * 1e6,
+                'tdur': (cpuEnd - cpuStart) * 1e6, 'args': arguments})
+            threadNames[tid] = threadName
+
+        events.extend({'name': 'thread_name', 'ph': 'M', 'pid': pid,
+            'tid': tid, 'args': {'name': threadName}}
+            for tid, threadName in threadNames.items())
+        with open(traceFile, 'w') as fd:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, fd)
+
+def _trace(tracer, phase, lineno=None, commandName=None):
+    """Record the duration of a phase with the given tracer, if any."""
+
+    if tracer is None:
+        return contextlib.nullcontext({})
+    return tracer.trace(phase, lineno, commandName)
+
+def _is_successful_exit(error):
+    """Check if an error is an exit with a zero return code.
+
+    Commands exit this way if the user decides to stop at a prompt. The changes
+    made until then are kept.
+    """
+
+    return isinstance(error, SystemExit) and error.code in (0, None)
+
+class Workspace:
+    """Access to files and processes for commands.
+
+    Commands should access files and run processes by means of the workspace,
+    so that they also support dry runs (cf. DryRunWorkspace). The default
+    workspace accesses files and runs processes directly.
+
+    Moreover, the workspace caches parsed documents, so that commands that
+    modify the same file need to parse and serialize it only once (cf.
+    get_document()). The document cache is shared by all threads, e.g., by
+    module blocks executed in parallel. A thread that gets a document holds
+    it until the thread flushes its documents. Other threads that access the
+    document's file wait until then, so that they operate on the modified
+    file.
+
+    The files that commands modify are tracked per thread (cf.
+    pop_touched_files()).
+    """
+
+    def __init__(self):
+        """Constructor."""
+
+        self._threadDocuments = threading.local()
+        # The document cache maps file keys to lists of the parsed document,
+        # the parse function, and the serialize function of modified
+        # documents. Cached documents are held by the thread that got them.
+        self._documents = {}
+        self._documentHolders = {}
+        self._waitingThreads = {}
+        self._documentsCondition = threading.Condition()
+
+    def _key(self, filepath):
+        """Key of a file in caches."""
+
+        return os.path.abspath(filepath)
+
+    def _acquire_document(self, key, hold=True):
+        """Wait until no other thread holds the document of the given file.
+
+        If hold is True, the current thread holds the document afterwards.
+        Threads that wait for each other's documents would wait forever.
+        Hence, the thread that would close such a cycle fails instead. The
+        caller must hold the condition of the document cache.
+        """
+
+        thread = threading.get_ident()
+        holder = self._documentHolders.get(key, thread)
+        while holder != thread:
+            waitingThread = holder
+            while waitingThread in self._waitingThreads:
+                waitingThread = self._documentHolders.get(
+                    self._waitingThreads[waitingThread])
+                if waitingThread == thread:
+                    raise ValueError('File "%s" is used by module blocks ' \
+                        'that are executed in parallel and wait for each ' \
+                        'other\'s files. Execute them with fewer jobs.' % key)
+
+            self._waitingThreads[thread] = key
+            try:
+                self._documentsCondition.wait()
+            finally:
+                del self._waitingThreads[thread]
+            holder = self._documentHolders.get(key, thread)
+
+        if hold:
+            self._documentHolders[key] = thread
+
+    def _held_documents(self):
+        """Get the keys of the documents held by the current thread.
+
+        The caller must hold the condition of the document cache.
+        """
+
+        thread = threading.get_ident()
+        return [key for key, holder in self._documentHolders.items()
+            if holder == thread]
+
+    def _release_documents(self, keys):
+        """Remove the given documents from the cache and release them."""
+
+        with self._documentsCondition:
+            for key in keys:
+                self._documents.pop(key, None)
+                self._documentHolders.pop(key, None)
+            self._documentsCondition.notify_all()
+
+    def _touched_files(self):
+        """Get the set of the files touched by the current thread."""
+
+        try:
+            return self._threadDocuments.touchedFiles
+        except AttributeError:
+            self._threadDocuments.touchedFiles = set()
+            return self._threadDocuments.touchedFiles
+
+    def pop_touched_files(self):
+        """Get and reset the sorted keys of the files that the current thread
+        modified or removed since the last call."""
+
+        touchedFiles = self._touched_files()
+        self._threadDocuments.touchedFiles = set()
+        return sorted(touchedFiles)
+
+    def get_document(self, filepath, parse):
+        """Get the parsed document of a file from the document cache.
+
+        The parse function receives the file's content as bytes and returns
+        the parsed document. It is only invoked, if the document of the file
+        is not cached or was parsed by another function. Modifications of the
+        document must be reported by update_document().
+        """
+
+        key = self._key(filepath)
+        with self._documentsCondition:
+            self._acquire_document(key)
+            entry = self._documents.get(key)
+
+        if entry is None or entry[1] != parse:
+            if entry is not None:
+                self._write_document(key, entry)
+            entry = [parse(self._read_file(filepath)), parse, None]
+            with self._documentsCondition:
+                self._documents[key] = entry
+        return entry[0]
+
+    def update_document(self, filepath, serialize):
+        """Report the modification of a cached document.
+
+        The serialize function receives the document and returns its content
+        as bytes. Modified documents are written by flush_documents().
+        """
+
+        key = self._key(filepath)
+        with self._documentsCondition:
+            entry = self._documents.get(key)
+            if entry is None or key not in self._held_documents():
+                raise ValueError('Document of file "%s" is not cached.' % \
+                    filepath)
+        entry[2] = serialize
+        self._touched_files().add(key)
+
+    def flush_documents(self):
+        """Write the modified documents of the current thread and release
+        them."""
+
+        with self._documentsCondition:
+            keys = self._held_documents()
+        try:
+            for key in keys:
+                self._write_document(key, self._documents[key])
+        finally:
+            self._release_documents(keys)
+
+    def discard_documents(self):
+        """Discard the documents of the current thread without writing them,
+        e.g., after a failure."""
+
+        with self._documentsCondition:
+            keys = self._held_documents()
+        self._release_documents(keys)
+
+    def _write_document(self, key, entry):
+        """Write a cached document, if it was modified."""
+
+        document, _, serialize = entry
+        if serialize is not None:
+            self._write_file(key, serialize(document))
+            entry[2] = None
+
+    def read_file(self, filepath):
+        """Read the content of a file as bytes."""
+
+        key = self._key(filepath)
+        with self._documentsCondition:
+            self._acquire_document(key, hold=False)
+            entry = self._documents.get(key)
+        if entry is not None:
+            self._write_document(key, entry)
+        return self._read_file(filepath)
+
+    def _read_file(self, filepath):
+        """Read the content of a file from the file system."""
+
+        with open(filepath, 'rb') as fd:
+            return fd.read()
+
+    def read_text(self, filepath):
+        """Read the content of a file as text.
+
+        Like for files opened in text mode, the default encoding applies and
+        newlines are translated.
+        """
+
+        return io.TextIOWrapper(io.BytesIO(self.read_file(filepath))).read()
+
+    def write_file(self, filepath, content):
+        """Write the given bytes to a file.
+
+        A cached document of the file is discarded.
+        """
+
+        self._discard_document(self._key(filepath))
+        self._touched_files().add(self._key(filepath))
+        self._write_file(filepath, content)
+
+    def _write_file(self, filepath, content):
+        """Write the given bytes to a file in the file system."""
+
+        with open(filepath, 'wb') as fd:
+            fd.write(content)
+
+    def write_text(self, filepath, text):
+        """Write the given text to a file.
+
+        Like for files opened in text mode, the default encoding applies and
+        newlines are translated.
+        """
+
+        buffer = io.BytesIO()
+        textBuffer = io.TextIOWrapper(buffer)
+        textBuffer.write(text)
+        textBuffer.flush()
+        self.write_file(filepath, buffer.getvalue())
+
+    def create_temporary_file(self, directory, prefix, suffix, content):
+        """Create a temporary file with the given bytes in a directory.
+
+        Returns the path of the created file.
+        """
+
+        fd, filepath = tempfile.mkstemp(prefix=prefix, suffix=suffix,
+            dir=directory)
+        with os.fdopen(fd, 'wb') as temporaryFd:
+            temporaryFd.write(content)
+        return filepath
+
+    def remove_file(self, filepath):
+        """Remove a file.
+
+        A cached document of the file is discarded.
+        """
+
+        self._discard_document(self._key(filepath))
+        self._touched_files().add(self._key(filepath))
+        self._remove_file(filepath)
+
+    def _discard_document(self, key):
+        """Discard the cached document of the given file, if any."""
+
+        with self._documentsCondition:
+            self._acquire_document(key, hold=False)
+            cached = key in self._documents
+        if cached:
+            self._release_documents([key])
+
+    def _remove_file(self, filepath):
+        """Remove a file from the file system."""
+
+        os.remove(filepath)
+
+    def exists(self, filepath):
+        """Check if a file or directory exists."""
+
+        return os.path.lexists(filepath)
+
+    def is_directory(self, path):
+        """Check if a directory exists."""
+
+        return os.path.isdir(path)
+
+    def run(self, arguments, cwd):
+        """Run a process with the given arguments in the given directory.
+
+        Modified documents are written before, so that the process operates on
+        the current files. Returns the process' return code, or None, if the
+        process was not run.
+        """
+
+        self.flush_documents()
+        return self._run(arguments, cwd)
+
+    def _run(self, arguments, cwd):
+        """Run a process.
+
+        If the output of the current thread is buffered (cf.
+        _ThreadLocalOutput), the output of the process is captured and written
+        to the buffer, so that it does not interleave with the output of other
+        threads.
+        """
+
+        output = sys.stdout
+        if not isinstance(output, _ThreadLocalOutput) or \
+            not output.is_thread_redirected():
+            return subprocess.run(arguments, cwd=cwd).returncode
+
+        process = subprocess.run(arguments, cwd=cwd, stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT)
+        output.write(process.stdout.decode(errors='replace'))
+        return process.returncode
+
+    def commit(self):
+        """Commit the changes of a successful run."""
+
+        self.flush_documents()
+        self._commit()
+
+    def _commit(self):
+        """Commit written files."""
+
+        pass
+
+    def rollback(self):
+        """Roll back the changes of a failed run."""
+
+        with self._documentsCondition:
+            self._documents.clear()
+            self._documentHolders.clear()
+            self._documentsCondition.notify_all()
+        self._rollback()
+
+    def _rollback(self):
+        """Roll back written files."""
 
-    def _internal_execution_instructions(self, command):
-        """Determine the internal execution instructions of a command.
+        pass
 
-        Internal execution instructions may only originate from a built-in
-        command. This method returns a tuple. Its first element determines
-        execution instructions to be executed _before_ the command. Its second
-        element determines instructions to be executed _after_ the command.
-        """
+class OverlayWorkspace(Workspace):
+    """Workspace that keeps file changes in memory.
 
-        if not self._commands.is_builtin_command(command.get_name()):
-            return (None, None)
+    The workspace overlays the file system with the contents of written and
+    removed files. Accesses to other files read through to the file system.
+    """
 
-        if command.get_name() == _GroupCommand.NAME:
-            return (self._GROUP_ENTRY, self._GROUP_EXIT)
-        elif command.get_name() == _ModuleCommand.NAME:
-            return (self._MODULE_ENTRY, self._MODULE_EXIT)
-        else:
-            return (None, None)
+    _REMOVED = None
 
-    def _insert_before_execution_instruction_into_plan(self, executionPlan,
-        instrBefore):
-        """Insert before execution instructions into the execution plan."""
-
-        executionPlan[self._currentLineno][0].append(instrBefore)
-
-    def _insert_after_execution_instruction_into_plan(self, executionPlan,
-        nestingLevel, yamlEntries, instrsAfter):
-        """Insert after execution instructions into the execution plan."""
-
-        # After execution instructions are executed when the command ends, i.e.,
-        # at a line number whose nesting level is lesser or equal to the nesting
-        # level of the command. For example, after execution instructions of a
-        # group are inserted into the execution plan when the group is left.
-        nextLinenos = [l for l in sorted(yamlEntries.keys())
-            if l > self._currentLineno]
-        for nextLineno in nextLinenos:
-            lineLevel = yamlEntries[nextLineno][1]
-            if lineLevel <= nestingLevel:
-                # After instructions become the first instructions to be
-                # executed at the same or next lower nesting level
-                executionPlan[nextLineno] = ([instrsAfter], None, [], [])
-                return
+    def __init__(self):
+        """Constructor."""
 
-        # There are not line numbers following the current one, i.e., the
-        # command is the last one of the current formula. In this case, the
-        # after execution instructions become the instructions to be executed
-        # after the command, instead of before the command on the next nesting
-        # level (see above).
-        executionPlan[self._currentLineno][2].append(instrsAfter)
+        super().__init__()
+        self._overlay = {}
+        self._lock = threading.Lock()
 
-    def _validate_scoping(self):
-        """Validate scoping within the formula."""
+    def _read_file(self, filepath):
+        """Read the content of a file from the overlay or the file system."""
 
-        self._iterate_execution_plan(ExecutionPlanScopingValidator())
+        with self._lock:
+            content = self._overlay.get(self._key(filepath), False)
+        if content is self._REMOVED:
+            raise FileNotFoundError('No such file: \'%s\'' % filepath)
+        elif content is not False:
+            return content
+        return super()._read_file(filepath)
 
-    def _iterate_execution_plan(self, iterator):
-        """Iterate the formula's execution plan.
+    def _write_file(self, filepath, content):
+        """Write the given bytes to the overlay."""
 
-        This is a template method, whose behavior can be influenced by
-        ExecutionPlanIterator implementations.
+        if not os.path.isdir(os.path.dirname(self._key(filepath))):
+            raise FileNotFoundError('No such directory: \'%s\'' % \
+                os.path.dirname(filepath))
+
+        with self._lock:
+            self._overlay[self._key(filepath)] = bytes(content)
+
+    def create_temporary_file(self, directory, prefix, suffix, content):
+        """Create a temporary file with the given bytes in the overlay."""
+
+        with self._lock:
+            filepath = os.path.join(directory, '%s%d%s' % (prefix,
+                len(self._overlay), suffix))
+        self.write_file(filepath, content)
+        return filepath
+
+    def _remove_file(self, filepath):
+        """Mark a file as removed in the overlay."""
+
+        if not self.exists(filepath):
+            raise FileNotFoundError('No such file: \'%s\'' % filepath)
+
+        with self._lock:
+            key = self._key(filepath)
+            if key in self._overlay and not os.path.lexists(key):
+                # The file was created during the dry run
+                del self._overlay[key]
+            else:
+                self._overlay[key] = self._REMOVED
+
+    def exists(self, filepath):
+        """Check if a file exists in the overlay or the file system."""
+
+        with self._lock:
+            content = self._overlay.get(self._key(filepath), False)
+        if content is False:
+            return super().exists(filepath)
+        return content is not self._REMOVED
+
+    def is_directory(self, path):
+        """Check if a directory exists in the file system.
+
+        Files in the overlay are not directories.
         """
 
-        self._setup_scope()
-        self._setup_variable_stack()
+        with self._lock:
+            if self._key(path) in self._overlay:
+                return False
+        return super().is_directory(path)
 
-        # Iterator: Pass formula file
-        iterator.set_formula_file(self._formulaFile)
+class DryRunWorkspace(OverlayWorkspace):
+    """Workspace that keeps file changes in memory and does not run processes.
 
-        for self._current_lineno, commandInfo in self._executionPlan:
-            # Iterator: Pass line number
-            iterator.set_lineno(self._current_lineno)
+    Processes are recorded instead of being run. After a dry run,
+    print_changes() reports the recorded processes and a unified diff of the
+    changed files.
+    """
 
-            (instrsBefore, command, argumentValues, instrsAfter) = commandInfo
-            # For each command to be iterated, create a fresh instance. That is,
-            # commands are always considered stateless.
-            newCommandInstance = command.new_instance()
+    def __init__(self, baseDirectory):
+        """Constructor.
 
-            # Iterator: Pass command instance
-            iterator.set_command(newCommandInstance)
-            # Iterator: Pass target directory
-            iterator.set_target_directory(
-                os.path.realpath(self._targetDirectory)
-            )
-            # Iterator: Pass command's argument values
-            iterator.set_argument_values(argumentValues)
+        Changed files are reported relative to the base directory.
+        """
 
-            self._determine_current_scope(instrsBefore)
-            # Iterator: Pass current scope
-            iterator.after_scope_set(self._currentScope)
+        super().__init__()
+        self._baseDirectory = os.path.abspath(baseDirectory)
+        self._processes = []
 
-            self._execute_instruction_on_variable_stack(instrsBefore)
-            # Iterator: Pass current scope's variables
-            iterator.after_variable_stack_preparation(
-                self._visibleVariables[self._currentScope]
-            )
+    def _run(self, arguments, cwd):
+        """Record the process instead of running it."""
 
-            # Put provided variables of a command on the current scope's
-            # variable stack
-            for v in newCommandInstance.get_provided_variables():
-                providedValue = iterator.get_provided_variable_value(
-                    v.get_name()
-                )
-                self._put_value_on_variable_stack(v, providedValue)
+        with self._lock:
+            self._processes.append((arguments, cwd))
+        return None
 
-            iterator.after_provided_variables_on_stack(
-                self._visibleVariables[self._currentScope]
-            )
+    def print_changes(self):
+        """Print the recorded processes and a diff of the changed files."""
+
+        for arguments, cwd in self._processes:
+            print('Would run in "%s": %s' % (cwd, ' '.join(arguments)))
+
+        for filepath in sorted(self._overlay):
+            try:
+                original = Workspace._read_file(self, filepath)
+            except FileNotFoundError:
+                original = None
+            changed = self._overlay[filepath]
+            if changed == original:
+                continue
+
+            relativePath = os.path.relpath(filepath, self._baseDirectory)
+            sys.stdout.writelines(difflib.unified_diff(
+                self._diff_lines(original), self._diff_lines(changed),
+                '/dev/null' if original is None else 'a/' + relativePath,
+                '/dev/null' if changed is None else 'b/' + relativePath))
+
+    def _diff_lines(self, content):
+        """Split file content into lines for a diff."""
+
+        if content is None:
+            return []
+
+        lines = content.decode(errors='replace').splitlines(keepends=True)
+        if lines and not lines[-1].endswith('\n'):
+            lines[-1] += '\n\\ No newline at end of file\n'
+        return lines
+
+class TransactionalWorkspace(OverlayWorkspace):
+    """Workspace that stages file changes and commits them at once.
+
+    File changes are staged in memory and committed at the end of a successful
+    run, or before a process is run, so that the process operates on the
+    current files. A commit writes every staged file to a temporary file next
+    to it and flushes it to disk, atomically renames the temporary files into
+    place, and then flushes the directories of the renamed and removed files
+    to disk, so that the renames are durable, too. The original
+    contents of committed files are kept, so that a failed run rolls back all
+    staged and committed changes. Changes made by processes are not rolled
+    back.
+    """
+
+    _TEMPORARY_SUFFIX = '.corollary-tmp'
 
-            self._execute_instruction_on_variable_stack(instrsAfter)
-            self._determine_current_scope(instrsAfter)
+    def __init__(self):
+        """Constructor."""
 
-    def _setup_scope(self):
-        """Setup scope stack."""
+        super().__init__()
+        self._originals = {}
+        self._temporaryFiles = set()
 
-        self._currentScope = CommandScope.GLOBAL
-        self._scopeStack = [self._currentScope]
+    def create_temporary_file(self, directory, prefix, suffix, content):
+        """Create a temporary file with the given bytes in a directory.
 
-    def _setup_variable_stack(self):
-        """Setup variable stack per possible scope."""
+        Temporary files are not staged, because processes may need them.
+        """
 
-        self._visibleVariables = {
-            CommandScope.GLOBAL: {},
-            CommandScope.GROUP: {},
-            CommandScope.MODULE: {}
-        }
+        filepath = Workspace.create_temporary_file(self, directory, prefix,
+            suffix, content)
+        with self._lock:
+            self._temporaryFiles.add(self._key(filepath))
+        return filepath
 
-    def _determine_current_scope(self, executionInstructions):
-        """Determine current scope from the given execution instructions.
+    def _remove_file(self, filepath):
+        """Stage the removal of a file.
 
-        This method also manipulates the scope stack depending on the given
-        execution instructions.
+        Temporary files are removed immediately.
         """
 
-        for instruction in executionInstructions:
-            if instruction == self._GROUP_ENTRY:
-                self._currentScope = CommandScope.GROUP
-                self._scopeStack.insert(0, self._currentScope)
-            elif instruction == self._GROUP_EXIT:
-                self._currentScope = self._scopeStack.pop(0)
-            elif instruction == self._MODULE_ENTRY:
-                self._currentScope = CommandScope.MODULE
-                self._scopeStack.insert(0, self._currentScope)
-            elif instruction == self._MODULE_EXIT:
-                self._currentScope = self._scopeStack.pop(0)
+        with self._lock:
+            isTemporaryFile = self._key(filepath) in self._temporaryFiles
+            self._temporaryFiles.discard(self._key(filepath))
+        if isTemporaryFile:
+            Workspace._remove_file(self, filepath)
+        else:
+            super()._remove_file(filepath)
+
+    def _run(self, arguments, cwd):
+        """Commit the staged changes and run a process."""
+
+        with self._lock:
+            self._commit_staged_changes()
+        return super()._run(arguments, cwd)
 
-    def _execute_instruction_on_variable_stack(self, executionInstructions):
-        """Execute internal execution instructions on the variable stack.
+    def _commit(self):
+        """Commit the staged changes of a successful run.
 
-        The execution instructions may impact the variable stacks of more than
-        one scope.
+        If the commit fails, all changes are rolled back.
         """
 
-        globalVars = self._visibleVariables[CommandScope.GLOBAL]
-        for instruction in executionInstructions:
-            # A group was entered. Copy the variables from preceding global
-            # scope.
-            if instruction == self._GROUP_ENTRY:
-                self._copy_variables(globalVars.keys(), CommandScope.GLOBAL,
-                    CommandScope.GROUP)
-            # A group was exited. Remove its variables from the stack.
-            elif instruction == self._GROUP_EXIT:
-                self._visibleVariables[CommandScope.GROUP] = {}
-            # A module. was entered. Copy the variables from preceding global
-            # and group scope. Group variables may overwrite global variables,
-            # if a module is contained in a group.
-            elif instruction == self._MODULE_ENTRY:
-                groupVars = self._visibleVariables[CommandScope.GROUP].keys()
-                globalNonGroup = [g for g in globalVars if g not in groupVars]
-                self._copy_variables(globalNonGroup, CommandScope.GLOBAL,
-                    CommandScope.MODULE)
-                self._copy_variables(groupVars, CommandScope.GROUP,
-                    CommandScope.MODULE)
-            # A module was exited. Remove its variables from the stack.
-            elif instruction == self._MODULE_EXIT:
-                self._visibleVariables[CommandScope.MODULE] = {}
+        try:
+            with self._lock:
+                self._commit_staged_changes()
+                self._originals = {}
+        except BaseException:
+            self.rollback()
+            raise
+
+    def _rollback(self):
+        """Discard the staged changes and restore all committed files."""
+
+        with self._lock:
+            self._overlay = {filepath: original
+                for filepath, original in self._originals.items()}
+            if self._overlay:
+                print('Rolling back changes to %d file(s).' % \
+                    len(self._overlay))
+            self._commit_staged_changes()
+            self._originals = {}
+
+    def _commit_staged_changes(self):
+        """Commit the staged changes to the file system.
+
+        The caller must hold the workspace's lock.
+        """
 
-    def _copy_variables(self, variableNames, fromScope, toScope):
-        """Copy variable values from a scope to another scope.
+        stagedChanges = self._overlay
+        self._overlay = {}
+        temporaryFiles = {}
+        try:
+            # Write staged contents to temporary files next to their targets
+            for filepath, content in stagedChanges.items():
+                if filepath not in self._originals:
+                    try:
+                        self._originals[filepath] = \
+                            Workspace._read_file(self, filepath)
+                    except FileNotFoundError:
+                        self._originals[filepath] = self._REMOVED
+
+                if content is not self._REMOVED:
+                    temporaryFiles[filepath] = self._write_temporary_file(
+                        filepath, content)
+
+            for filepath, content in stagedChanges.items():
+                if content is not self._REMOVED:
+                    os.replace(temporaryFiles[filepath], filepath)
+                    del temporaryFiles[filepath]
+                elif os.path.lexists(filepath):
+                    os.remove(filepath)
+
+            # Make sure that the renames and removals reached the disk
+            self._sync_directories({os.path.dirname(filepath)
+                for filepath in stagedChanges})
+        finally:
+            for temporaryFile in temporaryFiles.values():
+                os.remove(temporaryFile)
+
+    def _write_temporary_file(self, filepath, content):
+        """Write content to a temporary file next to the given file.
+
+        The temporary file gets the permissions of the given file, if it
+        exists. It is flushed to disk, so that it can replace the given file.
+        """
 
-        Copying is deep.
+        try:
+            mode = os.stat(filepath).st_mode & 0o7777
+        except FileNotFoundError:
+            mode = 0o666
+        temporaryFile = '%s.%d%s' % (filepath, os.getpid(),
+            self._TEMPORARY_SUFFIX)
+        fd = os.open(temporaryFile, os.O_WRONLY | os.O_CREAT | os.O_TRUNC,
+            mode)
+        with os.fdopen(fd, 'wb') as temporaryFd:
+            temporaryFd.write(content)
+            temporaryFd.flush()
+            os.fsync(temporaryFd.fileno())
+        return temporaryFile
+
+    def _sync_directories(self, directories):
+        """Flush the entries of the given directories to disk.
+
+        Directories cannot be flushed on all platforms, e.g., not on Windows.
+        There, the renames are left to the file system.
         """
 
-        scopeVars = self._visibleVariables[fromScope]
-        toCopy = [v for v in scopeVars if v in variableNames]
-        for varName in toCopy:
-            value = scopeVars[varName]
-            self._visibleVariables[toScope][varName] = copy.deepcopy(value)
+        if os.name != 'posix':
+            return
 
-    def _put_value_on_variable_stack(self, variable, value):
-        """Put a variable value on the current scope's variable stack."""
+        for directory in sorted(directories):
+            fd = os.open(directory, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
 
-        self._visibleVariables[self._currentScope][variable.get_name()] = value
+class _ThreadLocalOutput:
+    """Output stream that redirects writes of worker threads to buffers.
 
-    def execute(self):
-        """Execute the execution plan."""
+    Writes of threads that did not redirect their output go to the wrapped
+    stream.
+    """
 
-        self._iterate_execution_plan(ExecutionPlanExecutor())
+    def __init__(self, stream):
+        """Constructor."""
 
-class ExecutionPlanIterator(ABC):
-    """Abstract baseclass for execution plan iterators."""
+        self._stream = stream
+        self._local = threading.local()
 
-    def after_scope_set(self, currentScope):
-        """Callback: Current scope was determined."""
+    def redirect_thread(self, buffer):
+        """Redirect the output of the current thread to the given buffer."""
 
-        pass
+        self._local.buffer = buffer
 
-    def after_variable_stack_preparation(self, scopeVariables):
-        """Callback: The variable stack for the current scope was prepared."""
+    def get_stream(self):
+        """Get the wrapped stream."""
 
-        pass
+        return self._stream
 
-    def get_provided_variable_value(self, variableName):
-        """Get the value of a provided variable."""
+    def is_thread_redirected(self):
+        """Check if the current thread redirected its output."""
 
-        return None
+        return hasattr(self._local, 'buffer')
 
-    def after_provided_variables_on_stack(self, scopeVariables):
-        """Callback: Provided variable values were put on the stack."""
+    def get_thread_stream(self):
+        """Get the current thread's buffer or, if the thread did not redirect
+        its output, the wrapped stream."""
 
-        pass
+        return getattr(self._local, 'buffer', self._stream)
 
-    def set_formula_file(self, formulaFile):
-        """Set the execution plan's formula file."""
+    def write(self, s):
+        """Write to the current thread's buffer or the wrapped stream."""
 
-        self._formulaFile = formulaFile
+        return getattr(self._local, 'buffer', self._stream).write(s)
 
-    def get_formula_file(self):
-        """Get the execution plan's formula file."""
+    def flush(self):
+        """Flush the current thread's buffer or the wrapped stream."""
 
-        return self._formulaFile
+        getattr(self._local, 'buffer', self._stream).flush()
 
-    def set_lineno(self, lineno):
-        """Set current line number."""
+    def __getattr__(self, name):
+        """Delegate all other attribute accesses to the wrapped stream."""
 
-        self._lineno = lineno
+        return getattr(self._stream, name)
 
-    def get_lineno(self):
-        """Get current line number."""
+def _send_message(sock, message):
+    """Send a message to a socket.
 
-        return self._lineno
+    Messages are JSON objects, which are prefixed by their length in bytes.
+    """
 
-    def set_command(self, command):
-        """Set current command."""
+    data = json.dumps(message).encode('utf-8')
+    sock.sendall(struct.pack('>I', len(data)) + data)
 
-        self._command = command
+def _receive_message(sock, maxSize=None):
+    """Receive a message from a socket.
 
-    def get_command(self):
-        """Get current command."""
+    Returns None, if the connection was closed before a message was received.
+    Messages larger than the given maximum size in bytes, if any, are
+    rejected.
+    """
 
-        return self._command
+    header = _receive_bytes(sock, 4)
+    if header is None:
+        return None
+    size = struct.unpack('>I', header)[0]
+    if maxSize is not None and size > maxSize:
+        raise ValueError('Message of %d bytes exceeds the maximum size of ' \
+            '%d bytes' % (size, maxSize))
+    data = _receive_bytes(sock, size)
+    if data is None:
+        raise ConnectionError('Connection closed within a message')
+    return json.loads(data.decode('utf-8'))
+
+def _receive_bytes(sock, count):
+    """Receive the given number of bytes from a socket.
+
+    Returns None, if the connection was closed before all bytes were received.
+    """
+
+    chunks = []
+    while count > 0:
+        chunk = sock.recv(min(count, 65536))
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        count -= len(chunk)
+    return b''.join(chunks)
+
+def _format_address(address):
+    """Format a (host, port) tuple."""
+
+    return '%s:%d' % address
+
+def _authentication_code(secret, challenge):
+    """Compute the code by which a coordinator proves to a worker that it
+    knows their shared secret."""
+
+    return hmac.new(secret, challenge.encode('utf-8'),
+        hashlib.sha256).hexdigest()
+
+class WorkerPool:
+    """Connections of a coordinator to workers that execute module blocks.
+
+    The coordinator sends each module block with the variables visible within
+    its module, its module path relative to the target directory, and its
+    lines. A worker executes the block on its own target directory (cf.
+    ExecutionWorker) and returns the block's output, the variables provided by
+    the block, and, if the execution failed, the error. Several connections to
+    the same worker let it execute several blocks in parallel.
+
+    Each connection starts with a challenge of the worker, which the
+    coordinator answers with an authentication code derived from their shared
+    secret. Messages are not encrypted.
+    """
+
+    def __init__(self, addresses, commands, secret, batch=False, options=None,
+        dryRun=False, skipApplied=True):
+        """Constructor.
+
+        Connects to the workers at the given (host, port) addresses, which
+        share the given secret (bytes) with the coordinator. The workers must
+        have loaded the same commands and execute the module blocks in batch
+        mode, with the given command options, as dry run, and skipping applied
+        commands, as requested.
+        """
 
-    def set_argument_values(self, argumentValues):
-        """Set current command's argument values."""
+        self._secret = secret
+        self._connections = []
+        self._idleConnections = queue.Queue()
+        session = {'type': 'session', 'version': _VERSION,
+            'registryHash': commands.get_registry_hash(), 'batch': batch,
+            'options': options or {}, 'dryRun': dryRun,
+            'skipApplied': skipApplied}
+        try:
+            for address in addresses:
+                self._connect(address, session)
+        except BaseException:
+            self.close()
+            raise
 
-        self._argumentValues = argumentValues
+    def _connect(self, address, session):
+        """Connect to a worker and start a session."""
 
-    def get_argument_values(self):
-        """Get current command's argument values."""
+        try:
+            sock = socket.create_connection(address)
+            self._connections.append(sock)
+            challenge = _receive_message(sock)
+            if challenge is not None:
+                _send_message(sock, dict(session,
+                    authentication=_authentication_code(self._secret,
+                        challenge['challenge'])))
+                reply = _receive_message(sock)
+        except OSError as e:
+            raise ValueError('Could not connect to worker %s: %s' % \
+                (_format_address(address), e))
+        if challenge is None:
+            raise ValueError('Worker %s closed the connection' % \
+                _format_address(address))
+        if reply is None or reply['error']:
+            raise ValueError('Worker %s rejected the session: %s' % \
+                (_format_address(address), reply['error'] if reply else
+                    'connection closed'))
+        self._idleConnections.put((address, sock))
+
+    def execute_blocks(self, formulaFile, blocks):
+        """Execute module blocks on the workers.
+
+        The blocks are (module path, variables, lines) tuples (cf.
+        ExecutionPlan.for_module_block()). Their output is written in the
+        given order. If the execution of a block fails, the blocks that were
+        not yet sent are cancelled. The output of the blocks up to the failing
+        one is written and its error is re-raised. Returns the variables
+        provided by each block.
+        """
 
-        return self._argumentValues
+        cancelled = threading.Event()
+        providedVariables = []
+        with ThreadPoolExecutor(max_workers=len(self._connections)) as pool:
+            futures = [pool.submit(self._execute_block, formulaFile, block,
+                cancelled) for block in blocks]
+            for future, (module, _, lines) in zip(futures, blocks):
+                try:
+                    result = future.result()
+                    if result is None:
+                        # The block was cancelled by a subsequent block, whose
+                        # error is re-raised
+                        continue
+                    sys.stdout.write(result['output'])
+                    sys.stdout.flush()
+                    self._raise_error(result, lines[0][0], module, formulaFile)
+                except BaseException:
+                    cancelled.set()
+                    for f in futures:
+                        f.cancel()
+                    raise
+                providedVariables.append(result['variables'])
+        return providedVariables
+
+    def _execute_block(self, formulaFile, block, cancelled):
+        """Execute a module block on the next idle worker.
+
+        Returns None, if the block was cancelled. If the block fails, the
+        blocks that were not yet sent are cancelled.
+        """
 
-    def set_target_directory(self, targetDirectory):
-        """Set target directory passed to corollary."""
+        module, variables, lines = block
+        address, sock = self._idleConnections.get()
+        try:
+            if cancelled.is_set():
+                return None
+            _send_message(sock, {'type': 'block', 'formula': formulaFile,
+                'module': module, 'variables': variables, 'lines': lines})
+            result = _receive_message(sock)
+            if result is None or result['error'] or \
+                result['exitCode'] is not None:
+                cancelled.set()
+        except TypeError as e:
+            cancelled.set()
+            raise ValueError('Line %d: Variables of module "%s" cannot be ' \
+                'sent to worker %s: %s (formula "%s")' % (lines[0][0], module,
+                _format_address(address), e, formulaFile))
+        except OSError as e:
+            cancelled.set()
+            raise ValueError('Line %d: Connection to worker %s failed while ' \
+                'executing module "%s": %s (formula "%s")' % (lines[0][0],
+                _format_address(address), module, e, formulaFile))
+        finally:
+            self._idleConnections.put((address, sock))
+
+        if result is None:
+            raise ValueError('Line %d: Worker %s closed the connection while ' \
+                'executing module "%s" (formula "%s")' % (lines[0][0],
+                _format_address(address), module, formulaFile))
+        return result
+
+    def _raise_error(self, result, lineno, module, formulaFile):
+        """Re-raise the error of a failed module block, if any."""
+
+        if result['exitCode'] is not None:
+            sys.exit(result['exitCode'])
+        elif result['error']:
+            raise ValueError('Line %d: Execution of module "%s" failed on ' \
+                'worker: %s' % (lineno, module, result['error']))
+
+    def close(self):
+        """Close the connections to the workers."""
+
+        for sock in self._connections:
+            sock.close()
+        self._connections = []
+
+class ExecutionWorker:
+    """Executes the module blocks sent by coordinators (cf. WorkerPool).
+
+    Each connection of a coordinator is served by its own thread. Module
+    blocks are executed transactionally, i.e., the changes of a failing block
+    are rolled back.
+
+    A coordinator can change any file that the worker's user may write to,
+    e.g., by sending blocks whose commands write files outside of their
+    modules. Hence, workers only serve coordinators that know their secret and
+    reject modules outside of the target directory.
+    """
+
+    # Maximum size in bytes of a session message, which is received before the
+    # coordinator is authenticated
+    _MAX_SESSION_SIZE = 65536
+
+    def __init__(self, commands, targetDirectory, secret):
+        """Constructor.
+
+        Coordinators must know the given secret (bytes).
+        """
 
+        self._commands = commands
         self._targetDirectory = targetDirectory
+        self._realTargetDirectory = os.path.realpath(targetDirectory)
+        self._secret = secret
+        self._registryHash = commands.get_registry_hash()
 
-    def get_target_directory(self):
-        """Get the target directory."""
+    def serve(self, address):
+        """Serve coordinators on the given (host, port) address until
+        interrupted.
 
-        return self._targetDirectory
+        Without a host, the worker only listens on the loopback interface.
+        The commands are loaded in advance, as the threads that serve the
+        coordinators must not load them concurrently.
+        """
 
-class ExecutionPlanScopingValidator(ExecutionPlanIterator):
-    """An execution plan iterator to validate a plan's scoping."""
+        self._commands.preload()
+        if not address[0]:
+            address = ('127.0.0.1', address[1])
+        output = _ThreadLocalOutput(sys.stdout)
+        sys.stdout = output
+        try:
+            with _WorkerServer(address, self, output) as server:
+                print('Worker listening on %s' % \
+                    _format_address(server.server_address[:2]), flush=True)
+                server.serve_forever()
+        finally:
+            sys.stdout = output.get_stream()
+
+    def handle_connection(self, sock, output):
+        """Handle a connection of a coordinator."""
+
+        challenge = os.urandom(32).hex()
+        _send_message(sock, {'type': 'challenge', 'challenge': challenge})
+        session = _receive_message(sock, self._MAX_SESSION_SIZE)
+        if session is None:
+            return
 
-    def after_scope_set(self, currentScope):
-        """Validate the current command's scope."""
+        code = session.get('authentication') \
+            if isinstance(session, dict) else None
+        if not isinstance(code, str) or not hmac.compare_digest(
+            code.encode('utf-8'), _authentication_code(self._secret,
+                challenge).encode('utf-8')):
+            _send_message(sock, {'type': 'session', 'error': 'Coordinator ' \
+                'does not know the secret of the worker'})
+            raise ValueError('Coordinator does not know the secret of the ' \
+                'worker')
+
+        error = None
+        if session['version'] != _VERSION:
+            error = 'Coordinator runs %s %s, but worker runs %s %s' % \
+                (_NAME, session['version'], _NAME, _VERSION)
+        elif session['registryHash'] != self._registryHash:
+            error = 'Coordinator and worker loaded different commands'
+        _send_message(sock, {'type': 'session', 'error': error})
+        if error:
+            return
 
-        self._currentScope = currentScope
-        commandScope = self.get_command().get_maximum_scope()
-        if commandScope.value < currentScope.value:
-            raise ValueError('Line %d: Maximum scope of command "%s" is ' \
-                '"%s", but the current scope is "%s" (formula "%s")' % \
-                (self.get_lineno(), self.get_command().get_name(), commandScope,
-                    self._currentScope, self.get_formula_file()))
+        # The blocks of a session share the index of the target directory,
+        # which reflects the target directory at the start of the session. Like
+        # on the coordinator, it only serves the checks before the execution of
+        # the blocks, while commands query files via their workspaces.
+        targetIndex = TargetDirectoryIndex(self._targetDirectory)
+        block = _receive_message(sock)
+        while block is not None:
+            buffer = io.StringIO()
+            output.redirect_thread(buffer)
+            result = self._execute_block(session, block, targetIndex)
+            result['output'] = buffer.getvalue()
+            _send_message(sock, result)
+            block = _receive_message(sock)
+
+    def _execute_block(self, session, block, targetIndex):
+        """Execute a module block within a session."""
+
+        result = {'type': 'result', 'variables': {}, 'error': None,
+            'exitCode': None}
+        if session['dryRun']:
+            workspace = DryRunWorkspace(self._targetDirectory)
+        else:
+            workspace = TransactionalWorkspace()
 
-    def after_provided_variables_on_stack(self, scopeVariables):
-        """Validate variable scopes."""
+        try:
+            self._check_modules(block)
+            plan = ExecutionPlan.for_module_block(self._commands,
+                block['formula'], self._targetDirectory, block['lines'],
+                targetIndex)
+            result['variables'] = plan.execute_module_block(
+                block['variables'], session['batch'], session['options'],
+                workspace, session['skipApplied'])
+            if session['dryRun']:
+                workspace.print_changes()
+        except SystemExit as e:
+            if session['dryRun'] and _is_successful_exit(e):
+                workspace.print_changes()
+            result['exitCode'] = e.code
+        except Exception as e:
+            result['error'] = str(e) or type(e).__name__
+        return result
+
+    def _check_modules(self, block):
+        """Check that the modules of a module block are within the target
+        directory."""
+
+        modules = [block['module']] + [argumentValues['moduleName']
+            for _, commandName, argumentValues in block['lines']
+            if commandName == _ModuleCommand.NAME]
+        for module in modules:
+            moduleDirectory = os.path.realpath(os.path.join(
+                self._realTargetDirectory, module))
+            if os.path.commonpath([moduleDirectory,
+                self._realTargetDirectory]) != self._realTargetDirectory:
+                raise ValueError('Module "%s" is outside of the target ' \
+                    'directory "%s"' % (module, self._targetDirectory))
+
+class _WorkerServer(socketserver.ThreadingTCPServer):
+    """TCP server of an execution worker."""
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address, worker, output):
+        """Constructor."""
 
-        command = self.get_command()
-        missingRequiredVariableNames = [ rv
-            for rv in command.get_required_variable_names()
-            if rv not in scopeVariables
-        ]
-        if missingRequiredVariableNames:
-            missingStr = ', '.join(missingRequiredVariableNames)
-            visibleStr = ', '.join('"{0}"'.format(k) \
-                for k in scopeVariables.keys())
-            raise ValueError('Line %d: Command "%s" requires variables ' \
-                '"%s", but they are not provided on the current scope ' \
-                '"%s". Visible variables are %s (formula "%s")' % \
-                (self.get_lineno(), command.get_name(), missingStr,
-                    self._currentScope, visibleStr, self.get_formula_file()))
+        self.worker = worker
+        self.output = output
+        super().__init__(address, _WorkerRequestHandler)
 
-class ExecutionPlanExecutor(ExecutionPlanIterator):
-    """An execution plan iterator for command execution."""
+class _WorkerRequestHandler(socketserver.BaseRequestHandler):
+    """Handles a connection of a coordinator to an execution worker."""
 
-    def after_variable_stack_preparation(self, scopeVariables):
-        """Execute the current command."""
+    def handle(self):
+        """Handle the connection."""
 
-        # Execute the command
-        command = self.get_command()
-        command.set_scope_variables(scopeVariables)
-        command.set_target_directory(self.get_target_directory())
-        argumentValues = self.get_argument_values()
-        argumentValuesDict = self._argument_values_as_dict(argumentValues)
-        self._return_values = command.execute(argumentValuesDict) or {}
+        try:
+            self.server.worker.handle_connection(self.request,
+                self.server.output)
+        except (OSError, ValueError, KeyError) as e:
+            logging.getLogger().error('Connection of coordinator %s ' \
+                'failed: %s' % (_format_address(self.client_address[:2]), e))
+
+class ExecutionDaemon:
+    """Long-running server that executes formulas sent by clients (cf.
+    DaemonClient).
+
+    The daemon keeps the commands loaded and caches compiled execution plans
+    in memory, so that short executions need not pay for interpreter startup
+    and command discovery. Submodules of commands whose files changed are
+    reloaded before a formula is executed. Requests are served one after
+    another, as commands write to the process-wide output streams.
+    """
+
+    def __init__(self, commands):
+        """Constructor."""
 
-        # Validate the correct execution of the command based on its
-        # specification
-        self._validate_return_values_type()
-        self._validate_return_and_provided_values_consistency()
-        self._validate_missing_return_values()
+        self._commands = commands
+        self._planCache = ExecutionPlanMemoryCache()
+
+    def serve(self, socketFile):
+        """Serve clients on the Unix domain socket at the given file until
+        interrupted."""
+
+        self._commands.preload()
+        self._remove_socket_file(socketFile)
+        try:
+            with _DaemonServer(socketFile, self) as server:
+                print('Daemon listening on %s' % socketFile, flush=True)
+                server.serve_forever()
+        finally:
+            self._remove_socket_file(socketFile)
 
-    def _argument_values_as_dict(self, argumentValues):
-        """Transform argument values to a dict.
+    def _remove_socket_file(self, socketFile):
+        """Remove the socket file, e.g., of a previous daemon, if any.
 
-        The dict representation is used to pass argument values in the form
-        "argument name:argument value" to the command.
+        Other files at the socket file's path are kept, so that binding the
+        socket fails instead of deleting them.
         """
 
-        command = self.get_command()
-        argumentNames = [a.get_name() for a in command.get_arguments()]
-        return {argumentNames[i]:argumentValues[i]
-            for i in range(len(argumentNames))}
+        try:
+            if stat.S_ISSOCK(os.lstat(socketFile).st_mode):
+                os.remove(socketFile)
+        except FileNotFoundError:
+            pass
 
-    def _validate_return_values_type(self):
-        """Validate the type of a command's return value.
+    def handle_connection(self, sock):
+        """Handle a connection of a client.
 
-        Commands are required to return a dict in the form
-        "provided variable name:variable value". That is, a command's return
-        values are equivalent to the variables it specified to provide.
+        The output of the requested execution is streamed to the client,
+        followed by the result.
         """
 
-        if not isinstance(self._return_values, dict):
-            command = self.get_command()
-            raise ValueError('Line %d: Command "%s" is expected to return ' \
-                'provided variables and their values as a dictionary, but ' \
-                'instead returned "%s" of type %s (formula "%s")' % \
-                (self.get_lineno(), command.get_name(), self._return_values,
-                    type(self._return_values).__name__,
-                    self.get_formula_file()))
+        request = _receive_message(sock)
+        if request is None:
+            return
 
-    def _validate_return_and_provided_values_consistency(self):
-        """Validate consistency of command specification and return values.
+        result = {'type': 'result', 'error': None, 'exitCode': None}
+        if request['version'] != _VERSION:
+            result['error'] = 'Client runs %s %s, but daemon runs %s %s' % \
+                (_NAME, request['version'], _NAME, _VERSION)
+            _send_message(sock, result)
+            return
 
-        A command must not return more values than it specified to provide
-        variables.
-        """
+        output = _SocketOutput(sock)
+        stdin, stdout = sys.stdin, sys.stdout
+        sys.stdin = io.StringIO(request['input'] or '')
+        sys.stdout = output
+        try:
+            self._execute_request(request, result)
+        finally:
+            sys.stdin, sys.stdout = stdin, stdout
+            output.flush()
+        _send_message(sock, result)
 
-        command = self.get_command()
-        if self._return_values and not command.get_provided_variables():
-            returnValuesStr = ', '.join(['"%s" (value = %s)' % (str(k), str(v))
-                for k, v in self._return_values.items()])
-            raise ValueError('Line %d: Command "%s" did not promise to ' \
-                'provide variables, but instead returned variables %s ' \
-                '(formula "%s")' % (self.get_lineno(), command.get_name(),
-                returnValuesStr, self.get_formula_file()))
+    def _execute_request(self, request, result):
+        """Execute the formula of a request and fill in the result."""
 
-    def _validate_missing_return_values(self):
-        """Validate that no return value is missing.
+        try:
+            formula = Formula(request['formula'], self._commands)
+        except FileNotFoundError:
+            result['error'] = 'Could not load formula "%s". Does the file ' \
+                'exist?' % request['formula']
+            return
 
-        A command must return a value for each provided variable it
-        specified.
-        """
+        try:
+            if self._commands.reload_changed_submodules():
+                self._planCache.clear()
+            plan = ExecutionPlan(self._commands, formula,
+                request['targetDirectory'], self._planCache)
+            if request['dryRun']:
+                workspace = DryRunWorkspace(request['targetDirectory'])
+            else:
+                workspace = TransactionalWorkspace()
+            plan.execute(request['jobs'], request['batch'], request['options'],
+                workspace, skipApplied=request['skipApplied'])
+            if request['dryRun']:
+                workspace.print_changes()
+        except SystemExit as e:
+            if request['dryRun'] and _is_successful_exit(e):
+                workspace.print_changes()
+            result['exitCode'] = e.code
+        except yaml.parser.ParserError as e:
+            result['error'] = 'Error while parsing formula "%s": %s.' % \
+                (request['formula'], e)
+        except Exception as e:
+            result['error'] = 'An unexpected error occurred: %s.' % \
+                (str(e) or type(e).__name__)
+
+class _SocketOutput(io.TextIOBase):
+    """Output stream that sends written lines to a socket."""
+
+    def __init__(self, sock):
+        """Constructor."""
 
-        command = self.get_command()
-        missingReturnValues = [v.get_name()
-            for v in command.get_provided_variables()
-            if v.get_name() not in self._return_values
-        ]
-        if missingReturnValues:
-            missingReturnValuesStr = ', '.join('"{0}"'.format(v)
-                for v in missingReturnValues)
-            raise ValueError('Line %d: Command "%s" promised to provide ' \
-                'values for variables %s, but failed to do so ' \
-                '(formula "%s")' % (self.get_lineno(), command.get_name(),
-                missingReturnValuesStr, self.get_formula_file()))
+        super().__init__()
+        self._sock = sock
+        self._buffer = []
 
-    def get_provided_variable_value(self, variableName):
-        """Get the value of the given provided variable."""
+    def writable(self):
+        """The stream is writable."""
 
-        return self._return_values[variableName]
+        return True
+
+    def write(self, s):
+        """Write to the stream. Complete lines are sent immediately."""
+
+        self._buffer.append(s)
+        if '\n' in s:
+            self.flush()
+        return len(s)
+
+    def flush(self):
+        """Send the written text."""
+
+        if self._buffer:
+            text = ''.join(self._buffer)
+            self._buffer = []
+            _send_message(self._sock, {'type': 'output', 'text': text})
+
+class _DaemonServer(socketserver.UnixStreamServer):
+    """Unix domain socket server of an execution daemon."""
+
+    def __init__(self, socketFile, daemon):
+        """Constructor."""
+
+        self.executionDaemon = daemon
+        super().__init__(socketFile, _DaemonRequestHandler)
+
+    def server_bind(self):
+        """Bind the socket, so that only the daemon's user may connect to
+        it."""
+
+        umask = os.umask(0o177)
+        try:
+            super().server_bind()
+        finally:
+            os.umask(umask)
+        os.chmod(self.server_address, 0o600)
+
+class _DaemonRequestHandler(socketserver.BaseRequestHandler):
+    """Handles a connection of a client to an execution daemon."""
+
+    def handle(self):
+        """Handle the connection."""
+
+        try:
+            self.server.executionDaemon.handle_connection(self.request)
+        except (OSError, ValueError, KeyError) as e:
+            logging.getLogger().error('Connection of client failed: %s' % e)
+
+class DaemonClient:
+    """Client that lets an execution daemon execute a formula.
+
+    The client does not load commands. It sends the formula, the target
+    directory, the execution settings, and its standard input, e.g., values
+    requested by commands such as ask_for_version, to the daemon and prints
+    the output of the execution.
+    """
+
+    def __init__(self, socketFile):
+        """Constructor."""
+
+        self._socketFile = socketFile
+
+    def execute(self, formulaFile, targetDirectory, jobs=1, batch=False,
+        options=None, dryRun=False, skipApplied=True):
+        """Execute a formula on a target directory by the daemon.
+
+        Returns the error message and the exit code of the execution.
+        """
+
+        request = {'version': _VERSION,
+            'formula': os.path.abspath(formulaFile),
+            'targetDirectory': os.path.abspath(targetDirectory),
+            'jobs': jobs, 'batch': batch, 'options': options or {},
+            'dryRun': dryRun, 'skipApplied': skipApplied,
+            'input': None if sys.stdin.isatty() else sys.stdin.read()}
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(self._socketFile)
+            _send_message(sock, request)
+            message = _receive_message(sock)
+            while message is not None and message['type'] == 'output':
+                sys.stdout.write(message['text'])
+                sys.stdout.flush()
+                message = _receive_message(sock)
+
+        if message is None:
+            raise ConnectionError('Connection closed by daemon')
+        return (message['error'], message['exitCode'])
 
 def _error_and_exit(message, error=None, suffix=' Exiting.'):
     """Log an error message and exit corollary with a non-zero return code."""
@@ -1191,9 +5123,33 @@ if __name__ == '__main__':
     commandline = Commandline()
     commandline.parse_arguments()
 
-    if not os.path.isdir(commandline.target_directory):
-        _error_and_exit('Target directory "%s" does not exist.' % \
-            commandline.target_directory)
+    for targetDirectory in commandline.target_directories:
+        if not os.path.isdir(targetDirectory):
+            _error_and_exit('Target directory "%s" does not exist.' % \
+                targetDirectory)
+
+    if commandline.jobs < 1:
+        _error_and_exit('Number of jobs must be at least 1 (was %d).' % \
+            commandline.jobs)
+
+    if commandline.target_jobs < 1:
+        _error_and_exit('Number of target jobs must be at least 1 (was %d).' % \
+            commandline.target_jobs)
+
+    # Let a daemon execute the formula, if requested
+    if commandline.daemon:
+        try:
+            error, exitCode = DaemonClient(commandline.daemon).execute(
+                commandline.formula, commandline.target_directory,
+                commandline.jobs, commandline.batch,
+                commandline.command_options, commandline.dry_run,
+                commandline.skip_applied)
+        except OSError as e:
+            _error_and_exit('Could not connect to daemon "%s": %s.' % \
+                (commandline.daemon, e), e)
+        if error:
+            _error_and_exit(error)
+        sys.exit(exitCode)
 
     # Retrieve commands
     try:
@@ -1204,21 +5160,101 @@ if __name__ == '__main__':
     except ValueError as e:
         _error_and_exit('An unexpected error occurred: %s.' % str(e), e)
 
-    # Parse formula.
+    # Serve module blocks of coordinators, if requested
+    if commandline.serve_worker:
+        try:
+            ExecutionWorker(commands, commandline.target_directory,
+                commandline.worker_secret).serve(commandline.serve_worker)
+        except OSError as e:
+            _error_and_exit('Could not serve on %s: %s.' % \
+                (_format_address(commandline.serve_worker), e), e)
+        except KeyboardInterrupt:
+            pass
+        sys.exit(0)
+
+    # Serve formula executions of clients, if requested
+    if commandline.serve_daemon:
+        try:
+            ExecutionDaemon(commands).serve(commandline.serve_daemon)
+        except OSError as e:
+            _error_and_exit('Could not serve on "%s": %s.' % \
+                (commandline.serve_daemon, e), e)
+        except KeyboardInterrupt:
+            pass
+        sys.exit(0)
+
+    # Load formula
     try:
         formula = Formula(commandline.formula, commands)
     except FileNotFoundError as e:
         _error_and_exit('Could not load formula "%s". Does the file exist?' %
             commandline.formula, e)
+
+    # Parse formula into execution plan, or reuse a cached plan. A plan for
+    # several target directories is expanded for each of them.
+    tracer = ExecutionTracer() if commandline.trace_file else None
+    planCache = None
+    if commandline.plan_cache_directory:
+        planCache = ExecutionPlanCache(commandline.plan_cache_directory,
+            commands)
+    severalTargets = len(commandline.target_directories) > 1
+    try:
+        plan = ExecutionPlan(commands, formula,
+            None if severalTargets else commandline.target_directory,
+            planCache, tracer)
     except yaml.parser.ParserError as e:
         _error_and_exit('Error while parsing formula "%s": %s.' %
             (commandline.formula, e), e, suffix='\nExiting.')
     except ValueError as e:
         _error_and_exit('An unexpected error occurred: %s.' % str(e), e)
 
+    # Execute plan on several target directories, if requested
+    if severalTargets:
+        execution = MultiTargetExecution(plan, commandline.target_directories)
+        try:
+            results = execution.execute(commandline.target_jobs,
+                commandline.jobs, commandline.batch,
+                commandline.command_options, commandline.dry_run,
+                commandline.skip_applied)
+        except ValueError as e:
+            _error_and_exit('An unexpected error occurred: %s.' % str(e), e)
+        sys.exit(0 if execution.print_summary(results) else 4)
+
+    # Connect to workers, if module blocks shall be distributed
+    workers = None
+    if commandline.workers:
+        try:
+            workers = WorkerPool(commandline.workers, commands,
+                commandline.worker_secret, commandline.batch,
+                commandline.command_options, commandline.dry_run,
+                commandline.skip_applied)
+        except ValueError as e:
+            _error_and_exit('An unexpected error occurred: %s.' % str(e), e)
+
     # Execute plan
+    workspace = TransactionalWorkspace()
+    if commandline.dry_run:
+        workspace = DryRunWorkspace(commandline.target_directory)
+    journal = None
+    if commandline.journal:
+        journal = ExecutionJournal(commandline.journal)
     try:
-        plan = ExecutionPlan(commands, formula, commandline.target_directory)
-        plan.execute()
+        plan.execute(commandline.jobs, commandline.batch,
+            commandline.command_options, workspace, workers, journal,
+            commandline.resume, commandline.skip_applied)
+    except SystemExit as e:
+        if commandline.dry_run and _is_successful_exit(e):
+            workspace.print_changes()
+        raise
     except ValueError as e:
-        _error_and_exit('An unexpected error occurred: %s.' % str(e), e)
\ No newline at end of file
+        _error_and_exit('An unexpected error occurred: %s.' % str(e), e)
+    finally:
+        if tracer:
+            tracer.write(commandline.trace_file)
+        if workers:
+            workers.close()
+        if journal:
+            journal.close()
+
+    if commandline.dry_run:
+        workspace.print_changes()
\ No newline at end of file
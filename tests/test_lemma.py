@@ -0,0 +1,98 @@
+"""Tests for the LEMMA commands."""
+
+import os
+import sys
+
+import pytest
+
+_REPOSITORY_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(
+    __file__)), os.pardir)
+sys.path.insert(0, _REPOSITORY_DIRECTORY)
+import corollary
+
+_PARENT_POM = b'''<?xml version="1.0" encoding="UTF-8"?>
+<!-- Licensed under the MIT License -->
+<project xmlns="http://maven.apache.org/POM/4.0.0">
+    <modelVersion>4.0.0</modelVersion>
+    <groupId>org.example</groupId>
+    <artifactId>parent</artifactId>
+    <version>%(version)s</version>
+    <packaging>pom</packaging>
+    <modules>
+        <module>child</module>
+    </modules>
+</project>
+'''
+
+_CHILD_POM = b'''<?xml version="1.0" encoding="UTF-8"?>
+<project xmlns="http://maven.apache.org/POM/4.0.0">
+    <modelVersion>4.0.0</modelVersion>
+    <parent>
+        <groupId>org.example</groupId>
+        <artifactId>parent</artifactId>
+        <version>%(version)s</version>
+    </parent>
+    <artifactId>child</artifactId>
+    <version>%(version)s</version>
+</project>
+'''
+
+def _commands(monkeypatch):
+    """Load the commands of the repository's command directory."""
+
+    monkeypatch.chdir(_REPOSITORY_DIRECTORY)
+    return corollary.Commands('commands')
+
+def _execute(commands, directory, formulaContent, targetDirectory):
+    """Execute a formula on a target directory."""
+
+    formulaFile = directory / 'formula.yaml'
+    formulaFile.write_text(formulaContent)
+    formula = corollary.Formula(str(formulaFile), commands)
+    plan = corollary.ExecutionPlan(commands, formula, str(targetDirectory))
+    plan.execute(workspace=corollary.TransactionalWorkspace())
+
+def _setup_poms(targetDirectory):
+    """Write a parent and a child POM of version 1.0.0 and a properties file
+    of version 2.0.0."""
+
+    (targetDirectory / 'parent' / 'child').mkdir(parents=True)
+    (targetDirectory / 'version.properties').write_text(
+        'major=2\nminor=0\npatch=0\n')
+    parentPom = targetDirectory / 'parent' / 'pom.xml'
+    childPom = targetDirectory / 'parent' / 'child' / 'pom.xml'
+    parentPom.write_bytes(_PARENT_POM % {b'version': b'1.0.0'})
+    childPom.write_bytes(_CHILD_POM % {b'version': b'1.0.0'})
+    return parentPom, childPom
+
+def test_raw_set_version_keeps_the_formatting_of_poms(tmp_path, monkeypatch):
+    commands = _commands(monkeypatch)
+    targetDirectory = tmp_path / 'target'
+    parentPom, childPom = _setup_poms(targetDirectory)
+
+    _execute(commands, tmp_path, '- read_version_from "version.properties"\n'
+        '- group "group":\n'
+        '  - module parent:\n'
+        '    - mvn_tycho_set_version_raw\n', targetDirectory)
+
+    assert parentPom.read_bytes() == _PARENT_POM % {b'version': b'2.0.0'}
+    assert childPom.read_bytes() == _CHILD_POM % {b'version': b'2.0.0'}
+
+def test_stopping_at_the_continuation_prompt_keeps_changes(tmp_path,
+    monkeypatch):
+    commands = _commands(monkeypatch)
+    targetDirectory = tmp_path / 'target'
+    parentPom, childPom = _setup_poms(targetDirectory)
+    monkeypatch.setattr('builtins.input', lambda prompt: 'n')
+
+    with pytest.raises(SystemExit) as exitInfo:
+        _execute(commands, tmp_path, '- read_version_from ' \
+            '"version.properties"\n'
+            '- group "group":\n'
+            '  - module parent:\n'
+            '    - mvn_tycho_set_version_raw\n'
+            '- ask_for_continuation "version"\n', targetDirectory)
+
+    assert exitInfo.value.code == 0
+    assert parentPom.read_bytes() == _PARENT_POM % {b'version': b'2.0.0'}
+    assert childPom.read_bytes() == _CHILD_POM % {b'version': b'2.0.0'}
@@ -0,0 +1,143 @@
+"""Tests for the construction of execution plans."""
+
+import os
+import sys
+
+_REPOSITORY_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(
+    __file__)), os.pardir)
+sys.path.insert(0, _REPOSITORY_DIRECTORY)
+import corollary
+from benchmarks.plan_construction import generate_formula
+
+def _commands(monkeypatch):
+    """Load the commands of the repository's command directory."""
+
+    monkeypatch.chdir(_REPOSITORY_DIRECTORY)
+    return corollary.Commands('commands')
+
+def _write_formula(directory, moduleCount):
+    """Write a generated formula with the given number of modules."""
+
+    formulaFile = directory / ('formula-%d.yaml' % moduleCount)
+    formulaFile.write_text(generate_formula(moduleCount))
+    return str(formulaFile)
+
+def _compile(commands, formulaFile):
+    """Parse and compile a formula into a program."""
+
+    plan = corollary.ExecutionPlan(commands,
+        corollary.Formula(formulaFile, commands), None, build=False)
+    return plan.compile(plan.parse())
+
+def _executed_lines_per_module(commands, directory, moduleCount):
+    """Number of executed lines of corollary per module to parse and compile a
+    generated formula.
+
+    Unlike times, the number of executed lines is deterministic.
+    """
+
+    formulaFile = _write_formula(directory, moduleCount)
+    formula = corollary.Formula(formulaFile, commands)
+    formula.get_unpacked_entries()
+    plan = corollary.ExecutionPlan(commands, formula, None, build=False)
+
+    executedLines = 0
+    def trace_lines(frame, event, arg):
+        nonlocal executedLines
+        if event == 'line':
+            executedLines += 1
+        return trace_lines
+    def trace_calls(frame, event, arg):
+        if frame.f_code.co_filename == corollary.__file__:
+            return trace_lines
+        return None
+
+    sys.settrace(trace_calls)
+    try:
+        plan.compile(plan.parse())
+    finally:
+        sys.settrace(None)
+    return executedLines / moduleCount
+
+def _describe(program):
+    """Describe the line numbers, commands, scope transitions, and scopes of
+    a program in the terms of the formula's blocks."""
+
+    def transition(scope, outerScope):
+        return '%s %s' % (scope.name, 'EXIT' if outerScope is None else \
+            'ENTRY')
+
+    return [(lineno, command.get_name(), [transition(*t) for t in before],
+        scope.name, [transition(*t) for t in after])
+        for lineno, command, _, before, scope, after in program]
+
+def test_separate_phases_build_the_same_program(tmp_path, monkeypatch):
+    commands = _commands(monkeypatch)
+    formulaFile = _write_formula(tmp_path, 250)
+
+    formula = corollary.Formula(formulaFile, commands)
+    planCache = corollary.ExecutionPlanMemoryCache()
+    corollary.ExecutionPlan(commands, formula, None, planCache)
+
+    assert list(_compile(commands, formulaFile)) == \
+        list(planCache.load(formula))
+
+def test_plan_construction_scales_linearly(tmp_path, monkeypatch):
+    commands = _commands(monkeypatch)
+    smallCount = _executed_lines_per_module(commands, tmp_path, 10000)
+    largeCount = _executed_lines_per_module(commands, tmp_path, 20000)
+
+    # Quadratic construction would double the lines per module
+    assert largeCount < smallCount * 1.05, 'Executed lines per module grew ' \
+        'from %.1f to %.1f' % (smallCount, largeCount)
+
+def test_scope_transitions_are_placed_where_blocks_end(tmp_path,
+    monkeypatch):
+    commands = _commands(monkeypatch)
+    formulaFile = tmp_path / 'formula.yaml'
+    formulaFile.write_text('- read_version_from "version.properties"\n'
+        '- group "g1":\n'
+        '  - module a:\n'
+        '    - update_properties_file "p" "version" version\n'
+        '  - module b:\n'
+        '    - update_properties_file "p" "version" version\n'
+        '- module c:\n'
+        '  - update_properties_file "p" "version" version\n'
+        '- group "g2":\n'
+        '  - module d:\n'
+        '    - update_properties_file "p" "version" version\n')
+
+    # Exits are placed before the line at which the nesting returns to the
+    # level of the exited block, or after the last line of the formula.
+    # Several blocks may end at the same line.
+    assert _describe(_compile(commands, str(formulaFile))) == [
+        (1, 'read_version_from', [], 'GLOBAL', []),
+        (2, 'group', ['GROUP ENTRY'], 'GROUP', []),
+        (3, 'module', ['MODULE ENTRY'], 'MODULE', []),
+        (4, 'update_properties_file', [], 'MODULE', []),
+        (5, 'module', ['MODULE EXIT', 'MODULE ENTRY'], 'MODULE', []),
+        (6, 'update_properties_file', [], 'MODULE', []),
+        (7, 'module', ['MODULE EXIT', 'GROUP EXIT', 'MODULE ENTRY'], 'MODULE',
+            []),
+        (8, 'update_properties_file', [], 'MODULE', []),
+        (9, 'group', ['MODULE EXIT', 'GROUP ENTRY'], 'GROUP', []),
+        (10, 'module', ['MODULE ENTRY'], 'MODULE', []),
+        (11, 'update_properties_file', [], 'MODULE',
+            ['MODULE EXIT', 'GROUP EXIT'])]
+
+def test_scope_transitions_at_the_end_of_a_formula(tmp_path, monkeypatch):
+    commands = _commands(monkeypatch)
+    formulaFile = tmp_path / 'formula.yaml'
+    formulaFile.write_text('- group "g":\n'
+        '  - module a:\n'
+        '    - update_properties_file "p" "version" version\n'
+        '- module b:\n'
+        '  - update_properties_file "p" "version" version\n')
+
+    assert _describe(_compile(commands, str(formulaFile))) == [
+        (1, 'group', ['GROUP ENTRY'], 'GROUP', []),
+        (2, 'module', ['MODULE ENTRY'], 'MODULE', []),
+        (3, 'update_properties_file', [], 'MODULE', []),
+        (4, 'module', ['MODULE EXIT', 'GROUP EXIT', 'MODULE ENTRY'], 'MODULE',
+            []),
+        (5, 'update_properties_file', [], 'MODULE', ['MODULE EXIT'])]
@@ -0,0 +1,127 @@
+"""Tests for the distribution of module blocks to workers."""
+
+import contextlib
+import os
+import subprocess
+import sys
+
+_REPOSITORY_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(
+    __file__)), os.pardir)
+sys.path.insert(0, _REPOSITORY_DIRECTORY)
+from benchmarks.suite import generate_formula, generate_target_tree
+
+_COMMAND_DIRECTORY = 'benchmarks.benchmark_commands'
+
+def _corollary(*arguments):
+    """Command line that runs corollary with the given arguments."""
+
+    return [sys.executable, os.path.join(_REPOSITORY_DIRECTORY,
+        'corollary.py'), '-c', _COMMAND_DIRECTORY] + list(arguments)
+
+def _run(*arguments):
+    """Run corollary and return the completed process."""
+
+    return subprocess.run(_corollary(*arguments), cwd=_REPOSITORY_DIRECTORY,
+        stdin=subprocess.DEVNULL, capture_output=True, text=True)
+
+@contextlib.contextmanager
+def _workers(count, targetDirectory, secretFile):
+    """Start local workers on free ports and yield their addresses."""
+
+    processes = []
+    try:
+        addresses = []
+        for _ in range(count):
+            process = subprocess.Popen(_corollary('-t', targetDirectory,
+                '--serve_worker', ':0', '--worker_secret_file', secretFile),
+                cwd=_REPOSITORY_DIRECTORY, stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE, text=True)
+            processes.append(process)
+            line = process.stdout.readline()
+            assert line.startswith('Worker listening on '), line
+            addresses.append(line.split()[-1])
+        yield addresses
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+            process.stdout.close()
+
+def _read_tree(directory):
+    """Read the files of a directory tree into a dict."""
+
+    files = {}
+    for root, _, filenames in os.walk(directory):
+        for filename in filenames:
+            filepath = os.path.join(root, filename)
+            with open(filepath, 'rb') as fd:
+                files[os.path.relpath(filepath, directory)] = fd.read()
+    return files
+
+def _setup(directory, *targetNames):
+    """Write a formula, a secret file, and matching target directories."""
+
+    formulaFile = str(directory / 'formula.yaml')
+    with open(formulaFile, 'w') as fd:
+        fd.write(generate_formula(2, 3))
+    secretFile = str(directory / 'secret')
+    with open(secretFile, 'w') as fd:
+        fd.write('secret\n')
+    targetDirectories = []
+    for targetName in targetNames:
+        targetDirectory = str(directory / targetName)
+        os.makedirs(targetDirectory)
+        generate_target_tree(targetDirectory, 2, 3)
+        targetDirectories.append(targetDirectory)
+    return formulaFile, secretFile, targetDirectories
+
+def test_workers_produce_the_result_of_a_local_run(tmp_path):
+    formulaFile, secretFile, (localDirectory, distributedDirectory) = \
+        _setup(tmp_path, 'local', 'distributed')
+    originalFiles = _read_tree(localDirectory)
+
+    local = _run('-f', formulaFile, '-t', localDirectory)
+    with _workers(2, distributedDirectory, secretFile) as addresses:
+        distributed = _run('-f', formulaFile, '-t', distributedDirectory,
+            '-w', addresses[0], '-w', addresses[1], '-w', addresses[0],
+            '--worker_secret_file', secretFile)
+
+    assert local.returncode == 0, local.stderr
+    assert distributed.returncode == 0, distributed.stderr
+    assert distributed.stdout == local.stdout
+    localFiles = _read_tree(localDirectory)
+    assert localFiles != originalFiles
+    assert _read_tree(distributedDirectory) == localFiles
+
+def test_workers_reject_coordinators_without_the_secret(tmp_path):
+    formulaFile, secretFile, (targetDirectory,) = _setup(tmp_path, 'target')
+    wrongSecretFile = str(tmp_path / 'wrong-secret')
+    with open(wrongSecretFile, 'w') as fd:
+        fd.write('wrong\n')
+    originalFiles = _read_tree(targetDirectory)
+
+    with _workers(1, targetDirectory, secretFile) as addresses:
+        coordinator = _run('-f', formulaFile, '-t', targetDirectory, '-w',
+            addresses[0], '--worker_secret_file', wrongSecretFile)
+
+    assert coordinator.returncode != 0
+    assert 'does not know the secret' in coordinator.stderr
+    assert _read_tree(targetDirectory) == originalFiles
+
+def test_workers_reject_modules_outside_of_the_target_directory(tmp_path):
+    formulaFile, secretFile, (targetDirectory, outsideDirectory) = \
+        _setup(tmp_path, 'target', 'outside')
+    with open(formulaFile, 'w') as fd:
+        fd.write('- group "group":\n' \
+            '  - module ../outside/group0/module0:\n' \
+            '    - update_properties_file "gradle.properties" "version" ' \
+            '"9.9.9"\n')
+    originalFiles = _read_tree(outsideDirectory)
+
+    with _workers(1, targetDirectory, secretFile) as addresses:
+        coordinator = _run('-f', formulaFile, '-t', targetDirectory, '-w',
+            addresses[0], '--worker_secret_file', secretFile)
+
+    assert coordinator.returncode != 0
+    assert 'is outside of the target directory' in coordinator.stderr
+    assert _read_tree(outsideDirectory) == originalFiles